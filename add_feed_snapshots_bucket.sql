@@ -0,0 +1,47 @@
+-- Public Storage bucket for the static race-feed snapshots (feed_snapshots.py)
+-- Run this in the Supabase SQL Editor. The frontend reads
+--     <SUPABASE_URL>/storage/v1/object/public/feeds/upcoming.json.gz
+-- plus manifest.json.gz and the history/YYYY-MM-DD-<hash>.json.gz files it
+-- lists, so reads need no policy; the scraper uploads with the same key it
+-- uses for the tables, so it needs insert/update rights on those names, and
+-- delete rights on history files to remove ones a republished day superseded.
+--
+-- WARNING: like the table policies in fix_rls.sql, these writes are granted
+-- to the anon role, whose key is public (it is embedded in index.html). They
+-- are limited to the files the scraper writes, but anyone with the anon key
+-- can still overwrite upcoming.json.gz and manifest.json.gz or delete history
+-- files. To close this, give the scraper the service_role key (which bypasses
+-- these policies) and drop the insert/update/delete policies below.
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('feeds', 'feeds', true)
+ON CONFLICT (id) DO UPDATE SET public = true;
+
+CREATE POLICY "Allow feed snapshot uploads"
+    ON storage.objects FOR INSERT
+    TO anon
+    WITH CHECK (
+        bucket_id = 'feeds'
+        AND (name IN ('upcoming.json.gz', 'manifest.json.gz') OR name LIKE 'history/%.json.gz')
+    );
+
+CREATE POLICY "Allow feed snapshot updates"
+    ON storage.objects FOR UPDATE
+    TO anon
+    USING (
+        bucket_id = 'feeds'
+        AND (name IN ('upcoming.json.gz', 'manifest.json.gz') OR name LIKE 'history/%.json.gz')
+    )
+    WITH CHECK (
+        bucket_id = 'feeds'
+        AND (name IN ('upcoming.json.gz', 'manifest.json.gz') OR name LIKE 'history/%.json.gz')
+    );
+
+CREATE POLICY "Allow feed snapshot reads"
+    ON storage.objects FOR SELECT
+    USING (bucket_id = 'feeds');
+
+CREATE POLICY "Allow feed snapshot deletes"
+    ON storage.objects FOR DELETE
+    TO anon
+    USING (bucket_id = 'feeds' AND name LIKE 'history/%.json.gz');
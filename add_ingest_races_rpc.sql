@@ -0,0 +1,169 @@
+-- Bulk race ingestion RPC
+-- Replaces the per-race delete/insert round trips in upsert_race_data with one
+-- call per chunk of races. Run add_provider_race_ids.sql first, then run this
+-- in the Supabase SQL Editor.
+--
+-- payload is a JSON array of races, each with its runners:
+--   [{"provider_race_id": ..., "puntersedge_race_id": ..., "meeting_name": ...,
+--     "meeting_url": ..., "race_number": ..., "race_time": ...,
+--     "distance_meters": ..., "status": ..., "active_runner_count": ...,
+--     "runners": [{"dog_name": ..., "box_number": ..., "ghr_odds": ...,
+--                  "sportsbet_odds": ..., "is_scratched": ...}, ...]}, ...]
+--
+-- Races are matched on provider_race_id, falling back to the natural key
+-- (meeting_name, race_number, Sydney race date) for rows that predate it, and
+-- are updated in place so race and runner ids stay stable across runs. Rows
+-- are only rewritten when a value actually changed. Each race runs in its own
+-- savepoint: its runners change atomically, and a failure is reported for that
+-- race without rolling back the rest of the chunk.
+
+CREATE OR REPLACE FUNCTION ingest_races(payload JSONB)
+RETURNS TABLE (
+    item_index INTEGER,
+    race_id BIGINT,
+    result TEXT,
+    error TEXT
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    item JSONB;
+    idx INTEGER;
+    v_race_id BIGINT;
+    v_provider_id TEXT;
+    v_race_time TIMESTAMPTZ;
+    v_race_date DATE;
+    v_status TEXT;
+BEGIN
+    FOR item, idx IN
+        SELECT value, (ordinality - 1)::INTEGER
+        FROM jsonb_array_elements(payload) WITH ORDINALITY
+    LOOP
+        BEGIN
+            v_provider_id := NULLIF(item->>'provider_race_id', '');
+            v_race_time := (item->>'race_time')::TIMESTAMPTZ;
+            v_race_date := (v_race_time AT TIME ZONE 'Australia/Sydney')::DATE;
+            v_race_id := NULL;
+
+            IF v_provider_id IS NOT NULL THEN
+                SELECT r.id INTO v_race_id
+                FROM races r
+                WHERE r.provider_race_id = v_provider_id;
+            END IF;
+
+            IF v_race_id IS NULL THEN
+                SELECT r.id INTO v_race_id
+                FROM races r
+                WHERE r.meeting_name = item->>'meeting_name'
+                  AND r.race_number = (item->>'race_number')::INTEGER
+                  AND (r.race_time AT TIME ZONE 'Australia/Sydney')::DATE = v_race_date
+                  AND (r.provider_race_id IS NULL OR v_provider_id IS NULL)
+                ORDER BY r.id DESC
+                LIMIT 1;
+            END IF;
+
+            -- A card never moves a race that has closed or been settled back
+            -- to 'upcoming' (e.g. a stale card replayed from the write journal).
+            v_status := COALESCE(item->>'status', 'upcoming');
+            IF v_race_id IS NOT NULL AND v_status = 'upcoming' THEN
+                SELECT COALESCE(NULLIF(r.status, 'upcoming'), v_status) INTO v_status
+                FROM races r
+                WHERE r.id = v_race_id;
+            END IF;
+
+            IF v_race_id IS NULL THEN
+                INSERT INTO races (
+                    provider_race_id, puntersedge_race_id, meeting_name, meeting_url,
+                    race_number, race_time, distance_meters, status, active_runner_count
+                )
+                VALUES (
+                    v_provider_id,
+                    item->>'puntersedge_race_id',
+                    item->>'meeting_name',
+                    item->>'meeting_url',
+                    (item->>'race_number')::INTEGER,
+                    v_race_time,
+                    (item->>'distance_meters')::INTEGER,
+                    v_status,
+                    (item->>'active_runner_count')::INTEGER
+                )
+                RETURNING id INTO v_race_id;
+                result := 'inserted';
+            ELSE
+                UPDATE races r SET
+                    provider_race_id = COALESCE(v_provider_id, r.provider_race_id),
+                    puntersedge_race_id = COALESCE(item->>'puntersedge_race_id', r.puntersedge_race_id),
+                    meeting_name = item->>'meeting_name',
+                    meeting_url = COALESCE(item->>'meeting_url', r.meeting_url),
+                    race_number = (item->>'race_number')::INTEGER,
+                    race_time = v_race_time,
+                    distance_meters = (item->>'distance_meters')::INTEGER,
+                    status = v_status,
+                    active_runner_count = (item->>'active_runner_count')::INTEGER
+                WHERE r.id = v_race_id
+                  AND (
+                    r.provider_race_id, r.puntersedge_race_id, r.meeting_name, r.meeting_url,
+                    r.race_number, r.race_time, r.distance_meters, r.status, r.active_runner_count
+                  ) IS DISTINCT FROM (
+                    COALESCE(v_provider_id, r.provider_race_id),
+                    COALESCE(item->>'puntersedge_race_id', r.puntersedge_race_id),
+                    item->>'meeting_name',
+                    COALESCE(item->>'meeting_url', r.meeting_url),
+                    (item->>'race_number')::INTEGER,
+                    v_race_time,
+                    (item->>'distance_meters')::INTEGER,
+                    v_status,
+                    (item->>'active_runner_count')::INTEGER
+                  );
+                result := 'updated';
+            END IF;
+
+            -- Runners are keyed on (race_id, box_number) and updated in place.
+            INSERT INTO runners AS existing (
+                race_id, dog_name, box_number, ghr_odds, sportsbet_odds, is_scratched
+            )
+            SELECT DISTINCT ON (x.box_number)
+                v_race_id, x.dog_name, x.box_number, x.ghr_odds, x.sportsbet_odds,
+                COALESCE(x.is_scratched, FALSE)
+            FROM jsonb_to_recordset(COALESCE(item->'runners', '[]'::JSONB)) AS x(
+                dog_name TEXT,
+                box_number INTEGER,
+                ghr_odds DECIMAL(10, 2),
+                sportsbet_odds DECIMAL(10, 2),
+                is_scratched BOOLEAN
+            )
+            ORDER BY x.box_number
+            ON CONFLICT (race_id, box_number) DO UPDATE SET
+                dog_name = EXCLUDED.dog_name,
+                ghr_odds = EXCLUDED.ghr_odds,
+                sportsbet_odds = EXCLUDED.sportsbet_odds,
+                is_scratched = EXCLUDED.is_scratched
+            WHERE (
+                existing.dog_name, existing.ghr_odds, existing.sportsbet_odds, existing.is_scratched
+            ) IS DISTINCT FROM (
+                EXCLUDED.dog_name, EXCLUDED.ghr_odds, EXCLUDED.sportsbet_odds, EXCLUDED.is_scratched
+            );
+
+            -- Boxes that are no longer in the field (e.g. a reserve withdrawn).
+            DELETE FROM runners r
+            WHERE r.race_id = v_race_id
+              AND r.box_number NOT IN (
+                SELECT (runner->>'box_number')::INTEGER
+                FROM jsonb_array_elements(COALESCE(item->'runners', '[]'::JSONB)) AS runner
+              );
+
+            item_index := idx;
+            race_id := v_race_id;
+            error := NULL;
+            RETURN NEXT;
+        EXCEPTION WHEN OTHERS THEN
+            item_index := idx;
+            race_id := NULL;
+            result := 'error';
+            error := SQLERRM;
+            RETURN NEXT;
+        END;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,27 @@
+-- Stable provider identity for races
+-- Races are keyed on the PointsBet raceId (and the PuntersEdge race id where a
+-- price race was matched) so ingestion can update rows in place instead of
+-- deleting and re-inserting them. Run this, then re-run add_ingest_races_rpc.sql.
+
+ALTER TABLE races ADD COLUMN IF NOT EXISTS provider_race_id TEXT;
+ALTER TABLE races ADD COLUMN IF NOT EXISTS puntersedge_race_id TEXT;
+
+-- Recover the raceId from the synthetic PointsBet URLs written by older runs.
+UPDATE races
+SET provider_race_id = substring(meeting_url FROM 'raceIds=([0-9]+)')
+WHERE provider_race_id IS NULL
+  AND meeting_url LIKE '%api.au.pointsbet.com/api/racing/v3/races?raceIds=%';
+
+-- Keep the newest row if older runs left duplicates of the same race.
+DELETE FROM races older
+USING races newer
+WHERE older.provider_race_id = newer.provider_race_id
+  AND older.id < newer.id;
+
+-- meeting_url is reserved for real form-guide URLs again.
+UPDATE races
+SET meeting_url = NULL
+WHERE meeting_url LIKE '%api.au.pointsbet.com/api/racing/v3/races?raceIds=%';
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_races_provider_race_id ON races(provider_race_id);
+CREATE INDEX IF NOT EXISTS idx_races_puntersedge_race_id ON races(puntersedge_race_id);
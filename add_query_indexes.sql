@@ -0,0 +1,28 @@
+-- Indexes for the queries the scraper, backfills and frontend actually run
+-- Run this in the Supabase SQL Editor after add_provider_race_ids.sql.
+-- Check the plans locally with: python verify_query_plans.py <database-url>
+
+-- ingest_races fallback match for rows without a provider_race_id. The
+-- expression must match the one in add_ingest_races_rpc.sql exactly to be
+-- used. (The name/number/race_time candidate lookup in settle_race_results is
+-- already served by the UNIQUE (meeting_name, race_number, race_time) index.)
+CREATE INDEX IF NOT EXISTS idx_races_meeting_number_sydney_date
+    ON races (meeting_name, race_number, ((race_time AT TIME ZONE 'Australia/Sydney')::DATE));
+
+-- settle_race_results looks races up by meeting_url AND race_number; the
+-- composite also serves meeting_url-only lookups, so it replaces the
+-- single-column index from add_meeting_url.sql.
+CREATE INDEX IF NOT EXISTS idx_races_meeting_url_number ON races (meeting_url, race_number);
+DROP INDEX IF EXISTS idx_races_meeting_url;
+
+-- Status scans (analyze_closed_races, unresulted races in a date window).
+CREATE INDEX IF NOT EXISTS idx_races_status_time ON races (status, race_time);
+
+-- Frontend six-runner history: active_runner_count = 6, settled races only,
+-- newest first.
+CREATE INDEX IF NOT EXISTS idx_races_settled_count_time
+    ON races (active_runner_count, race_time DESC)
+    WHERE top_2_in_top_2 IS NOT NULL;
+
+ANALYZE races;
+ANALYZE runners;
@@ -0,0 +1,54 @@
+-- Bulk results settlement RPC
+-- Replaces the per-runner select/update round trips in update_race_results
+-- with one call per batch of races (typically a whole meeting). Run this in
+-- the Supabase SQL Editor.
+--
+-- The scraper resolves race and runner ids itself, so payload only carries
+-- the values to write:
+--   [{"race_id": ..., "status": ..., "top_2_in_top_2": ...,
+--     "runners": [{"id": ..., "starting_price": ..., "finishing_position": ...},
+--                 ...]}, ...]
+--
+-- All updates in a call are applied in one transaction.
+
+CREATE OR REPLACE FUNCTION settle_races(payload JSONB)
+RETURNS TABLE (
+    race_id BIGINT,
+    runners_updated INTEGER
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+    UPDATE runners r SET
+        starting_price = x.starting_price,
+        finishing_position = x.finishing_position
+    FROM (
+        SELECT runner.*
+        FROM jsonb_array_elements(payload) AS race,
+             jsonb_to_recordset(COALESCE(race->'runners', '[]'::JSONB)) AS runner(
+                 id BIGINT,
+                 starting_price DECIMAL(6, 2),
+                 finishing_position INTEGER
+             )
+    ) AS x
+    WHERE r.id = x.id
+      AND (r.starting_price, r.finishing_position)
+          IS DISTINCT FROM (x.starting_price, x.finishing_position);
+
+    UPDATE races r SET
+        status = x.status,
+        top_2_in_top_2 = x.top_2_in_top_2
+    FROM jsonb_to_recordset(payload) AS x(
+        race_id BIGINT,
+        status TEXT,
+        top_2_in_top_2 BOOLEAN
+    )
+    WHERE r.id = x.race_id
+      AND (r.status, r.top_2_in_top_2) IS DISTINCT FROM (x.status, x.top_2_in_top_2);
+
+    RETURN QUERY
+    SELECT x.race_id, jsonb_array_length(COALESCE(x.runners, '[]'::JSONB))
+    FROM jsonb_to_recordset(payload) AS x(race_id BIGINT, runners JSONB);
+END;
+$$;
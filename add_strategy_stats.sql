@@ -0,0 +1,151 @@
+-- Precomputed strategy statistics for the Stats and 6 Runners Stats views
+-- Run this in the Supabase SQL Editor, then fill the tables once with:
+--     python strategy_stats.py
+-- After that the scraper keeps them current as races are settled.
+--
+-- race_strategy_stats holds each settled race's contribution per strategy
+-- (computed by strategy_stats.py from its runners); strategy_stats sums those
+-- per day, track, distance, field size and strategy, which is what the
+-- frontend reads instead of every race with every runner.
+--
+-- Strategies:
+--   favourite / short_favourite          race-level: races, wins, bets, profit,
+--                                        top_2_in_top_2 (box_number = 0)
+--   favourite_box / short_favourite_box  per favourite's box: bets, wins, profit
+--   long_tail / three_short /            6-runner patterns: races and the
+--   ml_top3_srm / ml_top4_srm            top3_in_top3 / top3_in_top4 /
+--                                        top4_in_top4 hit counts
+-- short_* only count races whose favourite's SP is under $2.00. distance_meters
+-- is 0 when unknown. smart marks races passing the frontend's Smart Filter.
+
+CREATE TABLE IF NOT EXISTS race_strategy_stats (
+    race_id BIGINT NOT NULL REFERENCES races(id) ON DELETE CASCADE,
+    strategy TEXT NOT NULL,
+    box_number INTEGER NOT NULL DEFAULT 0,
+    race_date DATE NOT NULL,
+    meeting_name TEXT NOT NULL,
+    distance_meters INTEGER NOT NULL DEFAULT 0,
+    active_runner_count INTEGER NOT NULL,
+    smart BOOLEAN NOT NULL DEFAULT FALSE,
+    races INTEGER NOT NULL DEFAULT 0,
+    bets INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    profit DECIMAL(10, 2) NOT NULL DEFAULT 0,
+    top_2_in_top_2 INTEGER NOT NULL DEFAULT 0,
+    top3_in_top3 INTEGER NOT NULL DEFAULT 0,
+    top3_in_top4 INTEGER NOT NULL DEFAULT 0,
+    top4_in_top4 INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (race_id, strategy, box_number)
+);
+
+CREATE INDEX IF NOT EXISTS idx_race_strategy_stats_date ON race_strategy_stats(race_date);
+
+CREATE TABLE IF NOT EXISTS strategy_stats (
+    race_date DATE NOT NULL,
+    meeting_name TEXT NOT NULL,
+    distance_meters INTEGER NOT NULL,
+    active_runner_count INTEGER NOT NULL,
+    smart BOOLEAN NOT NULL,
+    strategy TEXT NOT NULL,
+    box_number INTEGER NOT NULL,
+    races INTEGER NOT NULL,
+    bets INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    profit DECIMAL(12, 2) NOT NULL,
+    top_2_in_top_2 INTEGER NOT NULL,
+    top3_in_top3 INTEGER NOT NULL,
+    top3_in_top4 INTEGER NOT NULL,
+    top4_in_top4 INTEGER NOT NULL,
+    PRIMARY KEY (race_date, meeting_name, distance_meters, active_runner_count, smart, strategy, box_number)
+);
+
+CREATE INDEX IF NOT EXISTS idx_strategy_stats_strategy_date ON strategy_stats(strategy, race_date);
+
+-- Replace the stat rows of the given races (a race with no rows in stat_rows
+-- just has its old rows removed, e.g. after its results were cleared), then
+-- re-sum every day those races fall on, before and after. One transaction.
+-- Calls touching the same day are serialised by a per-day advisory lock
+-- (taken in date order), so concurrent re-sums cannot both insert a day.
+CREATE OR REPLACE FUNCTION store_race_strategy_stats(race_ids BIGINT[], stat_rows JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    touched DATE[];
+BEGIN
+    SELECT array_agg(DISTINCT d) INTO touched FROM (
+        SELECT s.race_date AS d FROM race_strategy_stats s WHERE s.race_id = ANY (race_ids)
+        UNION
+        SELECT x.race_date FROM jsonb_to_recordset(stat_rows) AS x(race_date DATE)
+    ) AS dates;
+
+    PERFORM pg_advisory_xact_lock(hashtext('strategy_stats'), day - DATE '2000-01-01')
+    FROM (SELECT unnest(touched) AS day ORDER BY 1) AS days;
+
+    DELETE FROM race_strategy_stats WHERE race_id = ANY (race_ids);
+
+    INSERT INTO race_strategy_stats
+    SELECT * FROM jsonb_populate_recordset(NULL::race_strategy_stats, stat_rows);
+
+    DELETE FROM strategy_stats WHERE race_date = ANY (touched);
+
+    INSERT INTO strategy_stats
+    SELECT race_date, meeting_name, distance_meters, active_runner_count, smart, strategy, box_number,
+           SUM(races), SUM(bets), SUM(wins), SUM(profit), SUM(top_2_in_top_2),
+           SUM(top3_in_top3), SUM(top3_in_top4), SUM(top4_in_top4)
+    FROM race_strategy_stats
+    WHERE race_date = ANY (touched)
+    GROUP BY race_date, meeting_name, distance_meters, active_runner_count, smart, strategy, box_number;
+
+    RETURN COALESCE(array_length(touched, 1), 0);
+END;
+$$;
+
+-- strategy_stats summed over a date window (race_date >= since, < until; NULL
+-- bounds are open), so the frontend's row count doesn't grow with the window.
+CREATE OR REPLACE FUNCTION strategy_stats_window(
+    strategies TEXT[],
+    since DATE DEFAULT NULL,
+    until DATE DEFAULT NULL
+)
+RETURNS TABLE (
+    meeting_name TEXT,
+    distance_meters INTEGER,
+    active_runner_count INTEGER,
+    smart BOOLEAN,
+    strategy TEXT,
+    box_number INTEGER,
+    races BIGINT,
+    bets BIGINT,
+    wins BIGINT,
+    profit DECIMAL(12, 2),
+    top_2_in_top_2 BIGINT,
+    top3_in_top3 BIGINT,
+    top3_in_top4 BIGINT,
+    top4_in_top4 BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT s.meeting_name, s.distance_meters, s.active_runner_count, s.smart, s.strategy, s.box_number,
+           SUM(s.races), SUM(s.bets), SUM(s.wins), SUM(s.profit), SUM(s.top_2_in_top_2),
+           SUM(s.top3_in_top3), SUM(s.top3_in_top4), SUM(s.top4_in_top4)
+    FROM strategy_stats s
+    WHERE s.strategy = ANY (strategies)
+      AND (since IS NULL OR s.race_date >= since)
+      AND (until IS NULL OR s.race_date < until)
+    GROUP BY s.meeting_name, s.distance_meters, s.active_runner_count, s.smart, s.strategy, s.box_number;
+$$;
+
+ALTER TABLE race_strategy_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE strategy_stats ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow all operations on race_strategy_stats"
+    ON race_strategy_stats FOR ALL
+    USING (true)
+    WITH CHECK (true);
+
+CREATE POLICY "Allow all operations on strategy_stats"
+    ON strategy_stats FOR ALL
+    USING (true)
+    WITH CHECK (true);
@@ -1,7 +1,10 @@
 import os
+import sys
 from supabase import create_client, Client
 from collections import Counter
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+from table_stream import stream_rows
 
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
@@ -13,50 +16,93 @@ if not url:
 supabase: Client = create_client(url, key)
 
 def analyze():
-    print("Fetching 'closed' races...")
-    # Fetch all closed races
-    resp = supabase.table('races').select('*').eq('status', 'closed').execute()
-    races = resp.data
-    
-    if not races:
-        print("No 'closed' races found.")
-        return
+    print("Streaming 'closed' races...")
+    # Stream all closed races a page at a time; only the columns used below.
+    races = stream_rows(
+        supabase,
+        'races',
+        'meeting_name, meeting_url, race_time',
+        where=lambda q: q.eq('status', 'closed'),
+    )
 
-    print(f"Found {len(races)} 'closed' races.")
-    
-    # Analyze Dates
-    dates = []
+    total = 0
+    min_date = max_date = None
+    older_than_7_days = 0
+    ctr = Counter()
+    sample_url = None
     for r in races:
+        total += 1
         # race_time is ISO string
         dt = datetime.fromisoformat(r['race_time'].replace('Z', '+00:00'))
-        dates.append(dt)
-        
-    dates.sort()
-    min_date = dates[0]
-    max_date = dates[-1]
+        min_date = dt if min_date is None else min(min_date, dt)
+        max_date = dt if max_date is None else max(max_date, dt)
+        # Check if they fall within typical backfill windows (e.g. last 7 days)
+        if (datetime.now(dt.tzinfo) - dt).days > 7:
+            older_than_7_days += 1
+        ctr[r['meeting_name']] += 1
+        if sample_url is None:
+            sample_url = r['meeting_url']
+
+    report(total, min_date, max_date, older_than_7_days, ctr.most_common(10), sample_url)
+
+
+def analyze_archive(directory: str):
+    """Same report from the local Parquet archive (see history_archive.py)."""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    print(f"Scanning 'closed' races in {directory}...")
+    runners = ds.dataset(directory, partitioning='hive').to_table(
+        columns=['race_id', 'meeting_name', 'meeting_url', 'race_time'],
+        filter=ds.field('status') == 'closed',
+    )
+    # One row per runner; keep each race once.
+    races = runners.group_by(['race_id', 'meeting_name', 'meeting_url', 'race_time']).aggregate([])
+    if not races.num_rows:
+        report(0, None, None, 0, [], None)
+        return
+
+    times = races['race_time']
+    bounds = pc.min_max(times)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=8)
+    older_than_7_days = pc.sum(pc.less_equal(times, cutoff)).as_py()
+    counts = pc.value_counts(races['meeting_name']).to_pylist()
+    counts.sort(key=lambda item: item['counts'], reverse=True)
+    report(
+        races.num_rows,
+        bounds['min'].as_py(),
+        bounds['max'].as_py(),
+        older_than_7_days,
+        [(item['values'], item['counts']) for item in counts[:10]],
+        races['meeting_url'][0].as_py(),
+    )
+
+
+def report(total, min_date, max_date, older_than_7_days, top_meetings, sample_url):
+    if not total:
+        print("No 'closed' races found.")
+        return
+
+    print(f"Found {total} 'closed' races.")
     
     print(f"\nDate Range:")
     print(f"  Oldest: {min_date}")
     print(f"  Newest: {max_date}")
-    
-    # Check if they fall within typical backfill windows (e.g. last 7 days)
-    # Today is Jan 28
-    # 7 days ago = Jan 21
-    
-    older_than_7_days = [d for d in dates if (datetime.now(d.tzinfo) - d).days > 7]
-    print(f"  Older than 7 days: {len(older_than_7_days)}")
+    print(f"  Older than 7 days: {older_than_7_days}")
     
     # Analyze Meetings
-    meetings = [r['meeting_name'] for r in races]
-    ctr = Counter(meetings)
-    
     print("\nTop 10 Meetings stuck in 'closed':")
-    for name, count in ctr.most_common(10):
+    for name, count in top_meetings:
         print(f"  {name}: {count} races")
 
     # Sample URL
     print("\nSample URL for debugging:")
-    print(f"  {races[0]['meeting_url']}")
+    print(f"  {sample_url}")
 
 if __name__ == "__main__":
-    analyze()
+    # --archive [DIR] reads the local Parquet archive instead of Supabase.
+    if '--archive' in sys.argv:
+        position = sys.argv.index('--archive') + 1
+        analyze_archive(sys.argv[position] if position < len(sys.argv) else 'history_archive')
+    else:
+        analyze()
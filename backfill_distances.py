@@ -1,11 +1,15 @@
 
 import os
 import re
+import sys
 import time
 from datetime import datetime, timedelta
+from itertools import groupby
 from typing import List, Dict
 from supabase import create_client
 from scraper import fetch_page, count_active_runners
+from page_snapshots import PAGE_SNAPSHOTS, replay_arg
+from table_stream import stream_rows
 
 # Supabase credentials
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -24,41 +28,24 @@ supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 def backfill_distances():
     print("Starting distance backfill...")
 
-    # Get all races with missing distance OR invalid distance (>1000)
-    # Supabase filter: distance_meters is null OR distance_meters > 1000
-    # Client-side filtering is easier for combined conditions
-    # Fetch all races (or chunked if too many) - for now fetch recent/all
-    print("Fetching races to check...")
-    response = supabase.table('races').select('id, meeting_name, meeting_url, race_number, distance_meters').execute()
-    all_races = response.data
-    
-    races_to_update = [
-        r for r in all_races 
-        if r['distance_meters'] is None or r['distance_meters'] > 1000
-    ]
-    
-    if not races_to_update:
-        print("No races found with missing/invalid distance.")
-        return
-
-    print(f"Found {len(races_to_update)} races with missing or invalid distance (>1000m).")
-
-    # Group by meeting_url to minimize requests
-    meetings = {}
-    for race in races_to_update:
-        url = race.get('meeting_url')
-        if not url:
-            continue
-        
-        if url not in meetings:
-            meetings[url] = []
-        meetings[url].append(race)
-
-    print(f"grouped into {len(meetings)} unique meetings.")
-
-    for i, (url, race_list) in enumerate(meetings.items(), 1):
+    # Stream races with missing distance OR invalid distance (>1000), filtered
+    # server-side and ordered by meeting_url so each meeting's races arrive
+    # together and only one meeting is held in memory at a time.
+    print("Streaming races to check...")
+    races_to_update = stream_rows(
+        supabase,
+        'races',
+        'id, meeting_name, meeting_url, race_number, distance_meters',
+        key=('meeting_url', 'id'),
+        where=lambda q: q.not_.is_('meeting_url', 'null').or_('distance_meters.is.null,distance_meters.gt.1000'),
+    )
+    meetings = ((url, list(races)) for url, races in groupby(races_to_update, key=lambda r: r['meeting_url']))
+
+    processed = 0
+    for i, (url, race_list) in enumerate(meetings, 1):
         meeting_name = race_list[0]['meeting_name']
-        print(f"[{i}/{len(meetings)}] Processing {meeting_name}...")
+        processed += len(race_list)
+        print(f"[{i}] Processing {meeting_name} ({len(race_list)} races with missing/invalid distance)...")
         
         try:
             soup = fetch_page(url)
@@ -120,13 +107,19 @@ def backfill_distances():
             
             print(f"  -> Updated {updates_count} races for {meeting_name}")
             
-            # Rate limit
-            time.sleep(2)
+            # Rate limit (nothing to limit when replaying snapshots)
+            if not PAGE_SNAPSHOTS.replay:
+                time.sleep(2)
 
         except Exception as e:
             print(f"  Error processing {meeting_name}: {e}")
 
-    print("Backfill complete!")
+    if not processed:
+        print("No races found with missing/invalid distance.")
+        return
+    print(f"Backfill complete! Checked {processed} races.")
 
 if __name__ == "__main__":
+    # --replay re-parses the recorded pages instead of fetching them
+    replay_arg(sys.argv[1:])
     backfill_distances()
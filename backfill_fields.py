@@ -10,7 +10,10 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Dict
 from supabase import create_client
 
-from scraper import scrape_meeting_fields, upsert_race_data, AEST
+from scraper import scrape_meeting_fields, upsert_races_bulk, get_writer, AEST
+from race_index import RaceIndex
+from meeting_workers import SCRAPE_WORKERS, scrape_meetings, workers_arg
+from page_snapshots import replay_arg
 
 # Supabase credentials
 SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -36,13 +39,14 @@ def construct_meeting_url(meeting_name: str, race_time: str) -> str:
     return f"https://www.thegreyhoundrecorder.com.au/form-guides/{track_slug}-{date_compact}/fields/"
 
 
-def backfill_fields(days_back: int = 7):
+def backfill_fields(days_back: int = 7, workers: int = SCRAPE_WORKERS):
     """
     Re-scrape form guide fields for races in the past N days.
     Only targets races that have no runners or are missing key data.
 
     Args:
         days_back: Number of days to look back (default: 7)
+        workers: Meetings scraped at once (default: SCRAPE_WORKERS)
     """
     print(f"\n{'='*60}")
     print(f"BACKFILLING FIELDS FOR PAST {days_back} DAYS")
@@ -59,11 +63,8 @@ def backfill_fields(days_back: int = 7):
 
     # Fetch races in the date range - check which ones have no runners
     try:
-        response = supabase.table('races').select(
-            'id, meeting_name, meeting_url, race_time, active_runner_count'
-        ).gte('race_time', start_str).lte('race_time', today_str + 'T23:59:59').execute()
-
-        all_races = response.data
+        index = RaceIndex.load(supabase, start_str, today_str + 'T23:59:59')
+        all_races = list(index)
         print(f"Found {len(all_races)} total races in date range")
 
         # Target races with 0 runners (missing field data)
@@ -91,21 +92,41 @@ def backfill_fields(days_back: int = 7):
 
         print(f"\nWill re-scrape {len(meetings_to_scrape)} unique meetings\n")
 
-        # Scrape and upsert each meeting
+        # Meetings are scraped in parallel with --workers; each upsert is
+        # submitted from this thread and runs on the writer pool while the
+        # next meetings are scraped (submit blocks if writes fall behind).
+        def scrape(meeting_url, meeting_name):
+            print(f"Scraping fields for {meeting_name}...", flush=True)
+            return scrape_meeting_fields(meeting_url, meeting_name)
+
+        writer = get_writer()
+        pending_writes = []
+        for meeting_url, meeting_name, races, error in scrape_meetings(
+            list(meetings_to_scrape.items()), scrape, workers=workers
+        ):
+            if error is not None:
+                print(f"  -> Failed {meeting_name}: {error}")
+            elif races:
+                future = writer.submit(
+                    lambda races=races: upsert_races_bulk(races, index=index),
+                    key=meeting_url,
+                )
+                pending_writes.append((meeting_name, len(races), future))
+                print(f"  -> Queued {len(races)} races for {meeting_name}")
+            else:
+                print(f"  -> No races found for {meeting_name} (page may no longer be available)")
+
         total_races_updated = 0
-        for idx, (meeting_url, meeting_name) in enumerate(meetings_to_scrape.items(), 1):
-            print(f"[{idx}/{len(meetings_to_scrape)}] Scraping fields for {meeting_name}...")
+        for meeting_name, race_count, future in pending_writes:
             try:
-                races = scrape_meeting_fields(meeting_url, meeting_name)
-                if races:
-                    for race in races:
-                        upsert_race_data(race)
-                        total_races_updated += 1
-                    print(f"  -> Upserted {len(races)} races for {meeting_name}")
-                else:
-                    print(f"  -> No races found (page may no longer be available)")
+                written = sum(1 for status in future.result() if status['ok'])
             except Exception as e:
-                print(f"  -> Failed: {e}")
+                print(f"  -> Upsert failed for {meeting_name}: {e}")
+                continue
+            total_races_updated += written
+            if written < race_count:
+                print(f"  -> Upserted {written} of {race_count} races for {meeting_name}")
+        writer.print_summary()
 
         print(f"\n{'='*60}")
         print(f"BACKFILL COMPLETE!")
@@ -119,11 +140,13 @@ def backfill_fields(days_back: int = 7):
 
 
 if __name__ == '__main__':
+    # e.g. python backfill_fields.py 90 --workers 4 [--replay]
+    workers, args = workers_arg(replay_arg(sys.argv[1:]))
     days_back = 7
-    if len(sys.argv) > 1:
+    if args:
         try:
-            days_back = int(sys.argv[1])
+            days_back = int(args[0])
         except ValueError:
-            print(f"Invalid argument: {sys.argv[1]}. Using default of 7 days.")
+            print(f"Invalid argument: {args[0]}. Using default of 7 days.")
 
-    backfill_fields(days_back)
+    backfill_fields(days_back, workers)
@@ -7,6 +7,8 @@ import os
 from datetime import datetime
 from supabase import create_client
 
+from table_stream import stream_rows
+
 # Supabase credentials
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
@@ -47,20 +49,18 @@ def construct_meeting_url(meeting_name: str, race_time: str) -> str:
 def main():
     print("Fetching races without meeting_url...")
     
-    # Fetch all races that don't have a meeting_url
-    response = supabase.table('races').select('id, meeting_name, race_time, meeting_url').execute()
-    races = response.data
-    
-    races_to_update = [r for r in races if not r.get('meeting_url')]
-    
-    print(f"Found {len(races_to_update)} races without meeting_url")
-    
-    if not races_to_update:
-        print("All races already have meeting_url. Nothing to do!")
-        return
+    # Stream races that don't have a meeting_url, a page at a time. Paging is
+    # by id, so rows updated below can't make the stream skip any.
+    races_to_update = stream_rows(
+        supabase,
+        'races',
+        'id, meeting_name, race_time',
+        where=lambda q: q.is_('meeting_url', 'null'),
+    )
     
     # Group by meeting to show progress
     meetings = {}
+    updated = 0
     for race in races_to_update:
         meeting_name = race['meeting_name']
         race_time = race['race_time']
@@ -81,10 +81,15 @@ def main():
         # Update the race
         try:
             supabase.table('races').update({'meeting_url': meeting_url}).eq('id', race['id']).execute()
+            updated += 1
         except Exception as e:
             print(f"Error updating race {race['id']}: {e}")
     
-    print(f"\n✅ Updated {len(races_to_update)} races across {len(meetings)} meetings:")
+    if not meetings:
+        print("All races already have meeting_url. Nothing to do!")
+        return
+    
+    print(f"\n✅ Updated {updated} races across {len(meetings)} meetings:")
     for meeting_key, info in sorted(meetings.items()):
         print(f"  - {info['name']}: {info['count']} races")
         print(f"    URL: {info['url']}")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmark: typed msgspec decoding vs the previous json/dict path.
+
+Builds a synthetic two-day programme shaped like the PointsBet responses
+(meetings payload plus race-card batches, with the extra fields the real API
+returns and the scraper never reads), then measures CPU time and peak Python
+memory for turning the raw bytes into the scraper's race dicts: once with the
+scraper's own decode and build functions, once with the old json/dict path.
+
+Usage: python bench_pointsbet_decode.py [meetings] [races_per_meeting]
+"""
+
+import json
+import re
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import pointsbet_models
+import scraper
+
+# The synthetic races all start on this day; the scraper skips races already run.
+PROGRAMME_START = datetime(2026, 3, 18, tzinfo=timezone.utc)
+LEGACY_FIELDS = ("meeting_name", "race_number", "race_time", "distance_meters", "runners")
+
+
+def build_programme(meetings: int, races_per_meeting: int):
+    """Return (meetings_body, [card_batch_body, ...]) as JSON bytes."""
+    groups = []
+    cards = []
+    race_id = 1_000_000
+    for meeting_index in range(meetings):
+        races = []
+        for number in range(1, races_per_meeting + 1):
+            race_id += 1
+            start = f"2026-03-18T{(number + meeting_index) % 24:02d}:{number * 4 % 60:02d}:00Z"
+            races.append({
+                "raceId": race_id,
+                "raceNumber": number,
+                "advertisedStartDateTimeUtc": start,
+                "raceName": f"Race {number} Maiden Stake",
+                "raceClass": "Maiden",
+                "distance": {"metres": 515, "unit": "m"},
+                "status": "Open",
+                "hasFixedOdds": True,
+                "resultStatus": None,
+                "tags": ["fixed", "tote", "sgm"],
+            })
+            runners = []
+            for box in range(1, 11):
+                runners.append({
+                    "number": box,
+                    "barrier": box,
+                    "runnerName": f"Runner {race_id}-{box}",
+                    "isScratched": box == 3,
+                    "trainerName": f"Trainer {box}",
+                    "silksUrl": f"https://cdn.example.com/silks/{race_id}/{box}.png",
+                    "form": "12345x",
+                    "lastStarts": [{"position": p, "margin": p * 1.25} for p in range(1, 6)],
+                    "fluctuations": {
+                        "current": 2.0 + box,
+                        "open": 3.0 + box,
+                        "history": [2.0 + box + step / 10 for step in range(20)],
+                    },
+                    "outcomeId": f"{race_id}{box:02d}",
+                })
+            cards.append({
+                "raceId": race_id,
+                "venue": f"Venue {meeting_index}",
+                "number": number,
+                "advertisedStartTimeUtc": start,
+                "raceDistance": "515m",
+                "trackCondition": "Good",
+                "weather": "Fine",
+                "comment": "x" * 200,
+                "runners": runners,
+            })
+        groups.append({
+            "date": "2026-03-18",
+            "meetings": [{
+                "meetingId": meeting_index,
+                "racingType": 4,
+                "countryCode": "AUS",
+                "venue": f"Venue {meeting_index}",
+                "name": f"Venue {meeting_index}",
+                "state": "NSW",
+                "races": races,
+            }],
+        })
+    meetings_body = json.dumps(groups).encode()
+    batches = [json.dumps(cards[offset:offset + 20]).encode() for offset in range(0, len(cards), 20)]
+    return meetings_body, batches
+
+
+def _legacy_distance(race: Dict, summary: Dict):
+    for source in (race, summary):
+        for key in ("distance", "distanceMeters", "raceDistance", "raceDistanceMeters"):
+            value = source.get(key)
+            if isinstance(value, dict):
+                value = value.get("metres") or value.get("meters") or value.get("value")
+            if value is None:
+                continue
+            match = re.search(r"\d+", str(value))
+            if match:
+                return int(match.group())
+    return None
+
+
+def dict_path(meetings_body: bytes, batches: List[bytes]) -> List[Dict]:
+    """The pre-typed ingestion path: json.loads, {**race} copies, .get() chains."""
+    payload = json.loads(meetings_body)
+    summaries = {}
+    for group in payload:
+        for meeting in group.get("meetings") or []:
+            if meeting.get("racingType") != 4 or meeting.get("countryCode") != "AUS":
+                continue
+            for race in meeting.get("races") or []:
+                summaries[str(race.get("raceId"))] = {
+                    **race,
+                    "meeting_name": meeting.get("venue") or meeting.get("name"),
+                    "race_number": race.get("raceNumber"),
+                    "race_time": race.get("advertisedStartDateTimeUtc"),
+                }
+    cards = []
+    for body in batches:
+        cards.extend(json.loads(body))
+    races = []
+    for card in cards:
+        summary = summaries.get(str(card.get("raceId")), {})
+        runners = []
+        for runner in card.get("runners") or []:
+            box = int(runner.get("number") or runner.get("barrier"))
+            if not 1 <= box <= 8:
+                continue
+            price = (runner.get("fluctuations") or {}).get("current")
+            runners.append({
+                "dog_name": runner.get("runnerName") or runner.get("name"),
+                "box_number": box,
+                "ghr_odds": float(price) if price is not None else None,
+                "sportsbet_odds": None,
+                "is_scratched": bool(runner.get("isScratched", False)),
+            })
+        races.append({
+            "meeting_name": card.get("venue") or summary.get("meeting_name"),
+            "race_number": int(card.get("number") or summary.get("race_number")),
+            "race_time": card.get("advertisedStartTimeUtc") or summary.get("race_time"),
+            "distance_meters": _legacy_distance(card, summary),
+            "runners": runners,
+        })
+    return races
+
+
+def typed_path(meetings_body: bytes, batches: List[bytes]) -> List[Dict]:
+    """The scraper's own decode and build functions, minus the HTTP fetches."""
+    summaries = scraper._programme_summaries(
+        pointsbet_models.decode_meetings(meetings_body), PROGRAMME_START
+    )
+    cards = [card for body in batches for card in pointsbet_models.decode_race_cards(body)]
+    return scraper._build_races(cards, summaries)
+
+
+def measure(function, meetings_body, batches, repeats: int = 5):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.process_time()
+        function(meetings_body, batches)
+        best = min(best, time.process_time() - started)
+    tracemalloc.start()
+    function(meetings_body, batches)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    meetings = int(sys.argv[1]) if len(sys.argv) > 1 else 45
+    races_per_meeting = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    meetings_body, batches = build_programme(meetings, races_per_meeting)
+    payload_bytes = len(meetings_body) + sum(len(body) for body in batches)
+
+    # The scraper's races carry a few fields the old path never set.
+    typed = [{key: race[key] for key in LEGACY_FIELDS} for race in typed_path(meetings_body, batches)]
+    if dict_path(meetings_body, batches) != typed:
+        raise SystemExit("Typed and dict paths produced different races")
+
+    print(
+        f"Programme: {meetings * races_per_meeting} races, {len(batches)} card batches, "
+        f"{payload_bytes / 1024:.0f} KB of JSON"
+    )
+    for label, function in (("dict (json.loads)", dict_path), ("typed (msgspec)", typed_path)):
+        cpu, peak = measure(function, meetings_body, batches)
+        print(f"  {label:<18} cpu {cpu * 1000:7.1f} ms   peak {peak / 1024 / 1024:6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
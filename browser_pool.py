@@ -0,0 +1,240 @@
+"""
+Shared Playwright browser for the page scrapers.
+
+Starting Playwright and launching Chromium takes seconds, and every scraper
+used to do it for each URL. A BrowserPool launches the browser once and hands
+out pages:
+
+    with get_browser_pool().page() as page:
+        page.goto(url)
+        html = page.content()
+
+Each page opens in a browser context from the pool. A context is reused for
+up to max_uses pages (cookies and cache carry over, like a real visitor) and
+then closed and replaced. A context whose page crashed is dropped
+immediately; if the browser itself dies, it is relaunched on the next page.
+Contexts load pages lean (no images, fonts, ads or analytics; see
+resource_filter.py) unless BROWSER_LEAN=0, and start from the profile's saved
+session, so Cloudflare clearance carries over between contexts, threads and
+runs (see browser_session.py) unless BROWSER_SESSION=0.
+
+The sync Playwright API only works on the thread that started it, so pools
+are per thread (and per profile); close_browser_pools() runs at exit for the
+main thread's pools. Playwright is imported on first use, so modules that
+import this one don't need it installed.
+"""
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from browser_session import BrowserSession
+from resource_filter import LEAN_ENABLED, ResourceFilter
+
+CONTEXT_MAX_USES = int(os.environ.get("BROWSER_CONTEXT_MAX_USES", "20"))
+SESSIONS_ENABLED = os.environ.get("BROWSER_SESSION", "1") != "0"
+SESSION_DIR = os.environ.get(
+    "BROWSER_SESSION_DIR", os.path.join(os.environ.get("INGEST_STATE_DIR", ".ingest_state"), "browser")
+)
+
+# (launch options, context options) per profile.
+PROFILES: Dict[str, Tuple[Dict, Dict]] = {
+    # The runner's genuine Google Chrome in headed mode, with a Sydney
+    # visitor's context; used for form guides behind Cloudflare.
+    "chrome": (
+        {
+            "channel": "chrome",
+            "headless": False,
+            "args": [
+                "--disable-blink-features=AutomationControlled",
+                "--no-sandbox",
+                "--disable-setuid-sandbox",
+                "--disable-dev-shm-usage",
+                "--window-size=1920,1080",
+                "--start-maximized",
+            ],
+        },
+        {
+            "viewport": {"width": 1920, "height": 1080},
+            "locale": "en-AU",
+            "timezone_id": "Australia/Sydney",
+            "has_touch": False,
+            "is_mobile": False,
+            "permissions": ["geolocation"],
+            "geolocation": {"latitude": -33.8688, "longitude": 151.2093},  # Sydney
+        },
+    ),
+    # Playwright's bundled Chromium, for results and archive pages.
+    "chromium": ({"headless": False}, {}),
+}
+
+
+class BrowserPool:
+    """One browser, recycled contexts, one page per use."""
+
+    def __init__(self, launch_options: Dict, context_options: Dict, max_uses: int = CONTEXT_MAX_USES,
+                 resource_filter: Optional[ResourceFilter] = None, session: Optional[BrowserSession] = None):
+        self.launch_options = launch_options
+        self.context_options = context_options
+        self.max_uses = max_uses
+        self.resource_filter = resource_filter
+        self.session = session
+        self._playwright = None
+        self._browser = None
+        self._idle: List[List] = []  # [context, uses, session version]
+        self.launches = 0
+        self.contexts_created = 0
+        self.pages = 0
+        self.crashes = 0
+        self.launch_seconds = 0.0
+
+    def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        if self._browser is not None:
+            # Disconnected: its contexts went with it.
+            self._idle.clear()
+            self._browser = None
+        started = time.perf_counter()
+        if self._playwright is None:
+            from playwright.sync_api import sync_playwright
+            self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(**self.launch_options)
+        self.launches += 1
+        self.launch_seconds += time.perf_counter() - started
+        return self._browser
+
+    def _acquire(self) -> List:
+        browser = self._ensure_browser()
+        if self._idle:
+            slot = self._idle.pop()
+            if self.session is not None and slot[2] != self.session.version:
+                # Another context saved (or expired) the clearance since.
+                slot[0].clear_cookies()
+                slot[0].add_cookies(self.session.cookies())
+                slot[2] = self.session.version
+            return slot
+        self.contexts_created += 1
+        options = dict(self.context_options)
+        version = 0
+        if self.session is not None:
+            version = self.session.version
+            state = self.session.storage_state()
+            if state:
+                options["storage_state"] = state
+        context = browser.new_context(**options)
+        if self.resource_filter is not None:
+            self.resource_filter.attach(context)
+        return [context, 0, version]
+
+    def _release(self, slot: List, healthy: bool) -> None:
+        context, uses = slot[0], slot[1]
+        slot[1] = uses + 1
+        if healthy and slot[1] < self.max_uses and self._browser is not None and self._browser.is_connected():
+            self._idle.append(slot)
+            return
+        try:
+            context.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def page(self):
+        """A fresh page in a pooled context, closed afterwards."""
+        slot = self._acquire()
+        page = slot[0].new_page()
+        self.pages += 1
+        crashed = []
+        page.on("crash", lambda _: crashed.append(True))
+        load = self.resource_filter.watch(page) if self.resource_filter is not None else None
+        clearance = self.session.clearance_value(slot[0]) if self.session is not None else None
+        try:
+            yield page
+        finally:
+            if load is not None:
+                self.resource_filter.finish(load, slot[0])
+            healthy = not crashed
+            if healthy and self.session is not None and self.session.update(slot[0], clearance):
+                slot[2] = self.session.version
+            self.crashes += int(not healthy)
+            try:
+                page.close()
+            except Exception:
+                healthy = False
+            self._release(slot, healthy)
+
+    def close(self) -> None:
+        for context, *_ in self._idle:
+            try:
+                context.close()
+            except Exception:
+                pass
+        self._idle.clear()
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def print_summary(self) -> None:
+        if self.pages:
+            print(
+                f"Browser pool: {self.pages} pages, {self.contexts_created} contexts, "
+                f"{self.launches} launches ({self.launch_seconds:.1f}s), {self.crashes} crashes"
+            )
+        if self.resource_filter is not None:
+            self.resource_filter.print_summary()
+
+
+_pools: Dict[Tuple[int, str], BrowserPool] = {}
+_pools_lock = threading.Lock()
+_sessions: Dict[str, BrowserSession] = {}
+
+
+def get_browser_pool(profile: str = "chrome") -> BrowserPool:
+    """The calling thread's pool for a profile, created on first use."""
+    key = (threading.get_ident(), profile)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            launch_options, context_options = PROFILES[profile]
+            session = None
+            if SESSIONS_ENABLED:
+                session = _sessions.get(profile)
+                if session is None:
+                    session = _sessions[profile] = BrowserSession(
+                        os.path.join(SESSION_DIR, f"{profile}-state.json"))
+            pool = _pools[key] = BrowserPool(
+                launch_options, context_options,
+                resource_filter=ResourceFilter.from_env() if LEAN_ENABLED else None,
+                session=session,
+            )
+        return pool
+
+
+def close_browser_pools(thread_id: Optional[int] = None) -> None:
+    """Close the pools of a thread (default: the calling thread)."""
+    thread_id = threading.get_ident() if thread_id is None else thread_id
+    with _pools_lock:
+        pools = [(key, pool) for key, pool in _pools.items() if key[0] == thread_id]
+        for key, _ in pools:
+            del _pools[key]
+    for _, pool in pools:
+        pool.print_summary()
+        pool.close()
+
+
+def _print_sessions() -> None:
+    for session in list(_sessions.values()):
+        session.print_summary()
+
+
+atexit.register(_print_sessions)
+atexit.register(close_browser_pools)
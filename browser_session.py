@@ -0,0 +1,148 @@
+"""
+Saved browser sessions: Cloudflare clearance that outlives a context.
+
+Cloudflare hands a browser that passes its check a cf_clearance cookie.
+Without it, every fresh context has to visit the homepage and may sit on
+the challenge page first. A BrowserSession keeps a profile's storage state
+(cookies and local storage, as Playwright's storage_state) in a JSON file:
+
+- new contexts start from the saved state, and contexts already in a pool
+  get newer cookies as soon as another context (on any thread) saves them;
+- when a page's context gains a clearance cookie the saved state doesn't
+  have yet, the state is saved again;
+- cookies past their expiry are dropped on load, and expire() drops the
+  clearance when the site challenges a browser that presented it (the
+  server side expired it, or the IP changed between runs).
+
+The files live in BROWSER_SESSION_DIR (default <INGEST_STATE_DIR>/browser,
+which the backfill workflows cache between runs); BROWSER_SESSION=0 turns
+sessions off. They hold site cookies, so they are not committed.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+CLEARANCE_COOKIE = 'cf_clearance'
+
+
+def _live(cookie: Dict, now: float) -> bool:
+    expires = cookie.get('expires', -1)
+    return expires is None or expires < 0 or expires > now
+
+
+def clearance_cookie(cookies: List[Dict]) -> Optional[Dict]:
+    """The unexpired clearance cookie among cookies, if any."""
+    now = time.time()
+    for cookie in cookies:
+        if cookie.get('name') == CLEARANCE_COOKIE and _live(cookie, now):
+            return cookie
+    return None
+
+
+class BrowserSession:
+    """One profile's saved storage state, shared by every pool of that profile."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: Optional[Dict] = None
+        self._loaded = False
+        # Bumped on every change, so pools can tell their contexts are stale.
+        self.version = 0
+        self.saves = 0
+        self.expiries = 0
+
+    def _load(self) -> Optional[Dict]:
+        if not self._loaded:
+            self._loaded = True
+            try:
+                with open(self.path) as handle:
+                    state = json.load(handle)
+            except FileNotFoundError:
+                state = None
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable browser session {self.path}: {e}")
+                state = None
+            if state is not None:
+                now = time.time()
+                live = [cookie for cookie in state.get('cookies', []) if _live(cookie, now)]
+                if len(live) < len(state.get('cookies', [])):
+                    print(f"Browser session: dropped {len(state['cookies']) - len(live)} expired cookies")
+                state['cookies'] = live
+                if clearance_cookie(live):
+                    print("Browser session: reusing saved Cloudflare clearance")
+            self._state = state
+        return self._state
+
+    def storage_state(self) -> Optional[Dict]:
+        """The saved state for a new context (None if there is none)."""
+        with self._lock:
+            state = self._load()
+            return json.loads(json.dumps(state)) if state else None
+
+    def cookies(self) -> List[Dict]:
+        with self._lock:
+            state = self._load()
+            return list(state['cookies']) if state else []
+
+    def has_clearance(self, context, url: str) -> bool:
+        """Whether the context holds an unexpired clearance cookie for the URL."""
+        try:
+            return clearance_cookie(context.cookies(url)) is not None
+        except Exception:
+            return False
+
+    def clearance_value(self, context) -> Optional[str]:
+        try:
+            cookie = clearance_cookie(context.cookies())
+        except Exception:
+            return None
+        return cookie.get('value') if cookie else None
+
+    def update(self, context, previous: Optional[str]) -> bool:
+        """Save the context's state if it gained a clearance (other than `previous`,
+        the one it had before the page) that the saved state lacks."""
+        try:
+            cookie = clearance_cookie(context.cookies())
+        except Exception:
+            return False
+        if cookie is None or cookie.get('value') == previous:
+            return False
+        with self._lock:
+            saved = clearance_cookie((self._load() or {}).get('cookies', []))
+            if saved is not None and saved.get('value') == cookie.get('value'):
+                return False
+            try:
+                state = context.storage_state()
+            except Exception:
+                return False
+            self._write(state)
+            self.saves += 1
+        print("Browser session: saved new Cloudflare clearance")
+        return True
+
+    def expire(self) -> None:
+        """Forget the saved clearance (the site no longer accepts it)."""
+        with self._lock:
+            state = self._load()
+            if not state or clearance_cookie(state['cookies']) is None:
+                return
+            state = dict(state, cookies=[c for c in state['cookies'] if c.get('name') != CLEARANCE_COOKIE])
+            self._write(state)
+            self.expiries += 1
+        print("Browser session: saved clearance was rejected; refreshing it")
+
+    def _write(self, state: Dict) -> None:
+        self._state = state
+        self.version += 1
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w') as handle:
+            json.dump(state, handle)
+        os.replace(self.path + '.tmp', self.path)
+
+    def print_summary(self) -> None:
+        if self.saves or self.expiries:
+            print(f"Browser session: {self.saves} clearances saved, {self.expiries} expired ({self.path})")
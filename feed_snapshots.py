@@ -0,0 +1,273 @@
+"""
+Static, precompressed race-feed snapshots for the frontend.
+
+Every open browser used to query Supabase for the upcoming feed every 30
+minutes. Instead, the scraper now reads the feed once per change and
+publishes it as a file:
+
+    upcoming.json.gz          today and tomorrow (AEST), refreshed as races
+                              are written or settled; short cache lifetime
+    history/YYYY-MM-DD-<hash>.json.gz
+                              one AEST day of races, written once the day's
+                              results are in; named by content, so it never
+                              changes and is cached ~forever
+    manifest.json.gz          which history file holds each day; short cache
+
+Files are written to a local directory (plain, gzip and, when the optional
+brotli package is installed, brotli) and the gzip copies are uploaded to a
+public Supabase Storage bucket, where the frontend fetches and decompresses
+them with DecompressionStream. Each file is {"version", "generated_at",
+"races"} with races in the same shape as the frontend's races select.
+
+The upcoming snapshot is kept in memory: a full reload of the window at most
+hourly, otherwise only the races the scraper reports as written (mark_dirty)
+are re-read. Backfill or republish history days with:
+
+    python feed_snapshots.py --history-days 90 [--republish]
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from table_stream import stream_pages
+
+try:
+    import brotli
+except ImportError:  # optional; only adds .br copies for static hosts
+    brotli = None
+
+AEST = ZoneInfo("Australia/Sydney")
+
+FEED_COLUMNS = (
+    'id, meeting_name, race_number, race_time, distance_meters, status, active_runner_count, '
+    'top_2_in_top_2, meeting_url, '
+    'runners(id, dog_name, box_number, ghr_odds, sportsbet_odds, is_scratched, starting_price, finishing_position)'
+)
+SNAPSHOT_VERSION = 1
+UPCOMING_DAYS = 2
+# A day's history is published once it is this many days old, so late
+# results have been settled.
+HISTORY_SETTLE_DAYS = 2
+HISTORY_LOOKBACK_DAYS = 7
+FULL_REFRESH_INTERVAL = 3600
+REFRESH_CHUNK_SIZE = 100
+
+# Cache-Control max-age (seconds) for each kind of file.
+UPCOMING_MAX_AGE = 60
+MANIFEST_MAX_AGE = 300
+HISTORY_MAX_AGE = 365 * 24 * 3600
+
+
+def encode(payload: Dict) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _day_bounds(day: date, days: int = 1) -> Tuple[datetime, datetime]:
+    """UTC start and end of `days` AEST calendar days starting at day."""
+    start = datetime(day.year, day.month, day.day, tzinfo=AEST)
+    end = datetime.combine(day + timedelta(days=days), datetime.min.time(), AEST)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def _read_window(client, start: datetime, end: datetime) -> List[Dict]:
+    def window(query):
+        return query.gte('race_time', start.isoformat()).lt('race_time', end.isoformat())
+
+    return [row for page in stream_pages(client, 'races', FEED_COLUMNS, where=window) for row in page]
+
+
+class FeedSnapshots:
+    """Builds, writes and uploads the feed snapshots."""
+
+    def __init__(self, directory: str, bucket: Optional[str] = None,
+                 full_refresh_interval: float = FULL_REFRESH_INTERVAL):
+        self.directory = directory
+        self.bucket = bucket
+        self.full_refresh_interval = full_refresh_interval
+        self._races: Dict[int, Dict] = {}
+        self._dirty = set()
+        self._last_full = 0.0
+        self._manifest: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.raw_bytes = 0
+        self.gzip_bytes = 0
+        self.upload_failures = 0
+
+    def mark_dirty(self, race_ids: Iterable[int]) -> None:
+        """Races that were written or settled, to re-read on the next refresh."""
+        with self._lock:
+            self._dirty.update(race_id for race_id in race_ids if race_id is not None)
+
+    def refresh_upcoming(self, client, now: Optional[float] = None) -> bool:
+        """Re-read what changed and publish upcoming.json; False if nothing did."""
+        now = time.time() if now is None else now
+        start, end = _day_bounds(datetime.fromtimestamp(now, AEST).date(), UPCOMING_DAYS)
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        full = now - self._last_full >= self.full_refresh_interval
+        if not full and not dirty:
+            return False
+        try:
+            if full:
+                self._races = {race['id']: race for race in _read_window(client, start, end)}
+                self._last_full = now
+            else:
+                ids = sorted(dirty)
+                for offset in range(0, len(ids), REFRESH_CHUNK_SIZE):
+                    chunk = ids[offset:offset + REFRESH_CHUNK_SIZE]
+                    response = client.table('races').select(FEED_COLUMNS).in_('id', chunk).execute()
+                    for race in response.data or []:
+                        self._races[race['id']] = race
+        except Exception:
+            self.mark_dirty(dirty)
+            raise
+        self._races = {
+            race_id: race for race_id, race in self._races.items()
+            if start <= _parse_time(race['race_time']) < end
+        }
+        races = sorted(self._races.values(), key=lambda race: race['race_time'], reverse=True)
+        self._publish(client, 'upcoming', races, UPCOMING_MAX_AGE)
+        return True
+
+    def publish_history(self, client, days: int = HISTORY_LOOKBACK_DAYS,
+                        today: Optional[date] = None, republish: bool = False) -> int:
+        """Publish each settled day in the last `days` that isn't published yet."""
+        manifest = self._load_manifest(client)
+        today = today or datetime.now(AEST).date()
+        published = 0
+        for offset in range(days, HISTORY_SETTLE_DAYS - 1, -1):
+            day = (today - timedelta(days=offset)).isoformat()
+            if day in manifest['history'] and not republish:
+                continue
+            races = _read_window(client, *_day_bounds(date.fromisoformat(day)))
+            name = None
+            if races:
+                digest = hashlib.sha256(encode({'races': races})).hexdigest()[:12]
+                name = f'history/{day}-{digest}'
+                if not self._publish(client, name, races, HISTORY_MAX_AGE):
+                    # Left out of the manifest, so it is retried on the next call.
+                    continue
+            previous = (manifest['history'].get(day) or {}).get('file')
+            if previous and previous != name:
+                self._remove(client, previous)
+            manifest['history'][day] = {'races': len(races), 'file': name}
+            published += 1
+        if published:
+            manifest['history'] = dict(sorted(manifest['history'].items()))
+            if not self._write_files('manifest', encode(manifest), client, MANIFEST_MAX_AGE):
+                # Drop the local copy too: the next call starts again from the
+                # bucket's manifest and re-publishes the days it lacks.
+                self._manifest = None
+                self._remove_local('manifest')
+        return published
+
+    def _load_manifest(self, client) -> Dict:
+        if self._manifest is None:
+            path = os.path.join(self.directory, 'manifest.json')
+            manifest = None
+            try:
+                with open(path, 'rb') as handle:
+                    manifest = json.loads(handle.read())
+            except (OSError, ValueError):
+                # Fresh state directory: carry on from what is already published.
+                if self.bucket:
+                    try:
+                        data = client.storage.from_(self.bucket).download('manifest.json.gz')
+                        manifest = json.loads(gzip.decompress(data))
+                    except Exception:
+                        manifest = None
+            self._manifest = manifest or {'version': SNAPSHOT_VERSION, 'history': {}}
+        return self._manifest
+
+    def _publish(self, client, name: str, races: List[Dict], max_age: int) -> bool:
+        payload = {
+            'version': SNAPSHOT_VERSION,
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'races': races,
+        }
+        return self._write_files(name, encode(payload), client, max_age)
+
+    def _write_files(self, name: str, body: bytes, client, max_age: int) -> bool:
+        """Write a file locally and upload it; False if the upload failed."""
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        copies = {'.json': body, '.json.gz': compressed}
+        if brotli is not None:
+            copies['.json.br'] = brotli.compress(body)
+        for suffix, data in copies.items():
+            path = os.path.join(self.directory, name + suffix)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as handle:
+                handle.write(data)
+            os.replace(path + '.tmp', path)
+        self.published += 1
+        self.raw_bytes += len(body)
+        self.gzip_bytes += len(compressed)
+
+        if self.bucket and client is not None:
+            try:
+                client.storage.from_(self.bucket).upload(
+                    name + '.json.gz',
+                    compressed,
+                    {'content-type': 'application/gzip', 'cache-control': str(max_age), 'x-upsert': 'true'},
+                )
+            except Exception as error:
+                self.upload_failures += 1
+                print(f"Feed snapshot upload failed for {name}: {error}")
+                return False
+        return True
+
+    def _remove_local(self, name: str) -> None:
+        for suffix in ('.json', '.json.gz', '.json.br'):
+            try:
+                os.remove(os.path.join(self.directory, name + suffix))
+            except FileNotFoundError:
+                pass
+
+    def _remove(self, client, name: str) -> None:
+        self._remove_local(name)
+        if self.bucket and client is not None:
+            try:
+                client.storage.from_(self.bucket).remove([name + '.json.gz'])
+            except Exception as error:
+                print(f"Feed snapshot removal failed for {name}: {error}")
+
+    def print_summary(self) -> None:
+        if not self.published:
+            return
+        ratio = self.gzip_bytes / self.raw_bytes if self.raw_bytes else 0
+        print(
+            f"Feed snapshots: {self.published} published, "
+            f"{self.raw_bytes / 1024:.0f} KB JSON -> {self.gzip_bytes / 1024:.0f} KB gzip ({ratio:.0%}), "
+            f"{self.upload_failures} upload failures"
+        )
+
+
+def main() -> None:
+    import scraper
+
+    days = HISTORY_LOOKBACK_DAYS
+    if '--history-days' in sys.argv:
+        days = int(sys.argv[sys.argv.index('--history-days') + 1])
+    client = scraper.get_supabase()
+    published = scraper.FEED_SNAPSHOTS.publish_history(client, days, republish='--republish' in sys.argv)
+    print(f"Published {published} history day(s).")
+    scraper.FEED_SNAPSHOTS.refresh_upcoming(client)
+    scraper.FEED_SNAPSHOTS.print_summary()
+
+
+if __name__ == '__main__':
+    main()
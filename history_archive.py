@@ -0,0 +1,211 @@
+"""
+Columnar archive of race history for local analysis.
+
+Supabase rows are the source of truth, but pulling months of history over
+PostgREST as JSON for every analysis is slow. This module keeps a local
+Parquet copy, one file per AEST race day (hive-partitioned, so readers can
+prune by date):
+
+    <archive>/race_date=YYYY-MM-DD/runners.parquet
+
+with one row per runner and its race's columns repeated (a race without
+runners keeps one row with empty runner columns). Writing a day merges by
+race_id, so re-archiving a race replaces its rows.
+
+The scraper archives races as it settles them when HISTORY_ARCHIVE_DIR is
+set; to catch up or backfill from Supabase:
+
+    python history_archive.py                    # from 3 days before the newest archived day
+    python history_archive.py --days 90
+    python history_archive.py --since 2026-01-01 [--dir history_archive]
+
+Read it with pyarrow (or pandas/duckdb/polars):
+
+    import pyarrow.dataset as ds
+    table = ds.dataset('history_archive', partitioning='hive').to_table(
+        filter=ds.field('status') == 'resulted')
+
+Needs pyarrow (pip install pyarrow); it is not a scraper dependency.
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from race_index import AEST, race_date
+from table_stream import stream_pages
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+DEFAULT_DIR = 'history_archive'
+ARCHIVE_COLUMNS = (
+    'id, meeting_name, meeting_url, race_number, race_time, distance_meters, status, '
+    'active_runner_count, top_2_in_top_2, '
+    'runners(id, dog_name, box_number, ghr_odds, sportsbet_odds, is_scratched, starting_price, finishing_position)'
+)
+CHUNK_SIZE = 100
+# Races buffered by export() before they are merged into their day files.
+FLUSH_RACES = 5000
+# Catch-up re-exports this many days before the newest archived day, for
+# results settled late.
+CATCH_UP_DAYS = 3
+
+RACE_FIELDS = [
+    ('race_id', 'id', 'int64'),
+    ('meeting_name', 'meeting_name', 'string'),
+    ('meeting_url', 'meeting_url', 'string'),
+    ('race_number', 'race_number', 'int16'),
+    ('race_time', 'race_time', 'timestamp'),
+    ('distance_meters', 'distance_meters', 'int32'),
+    ('status', 'status', 'string'),
+    ('active_runner_count', 'active_runner_count', 'int16'),
+    ('top_2_in_top_2', 'top_2_in_top_2', 'bool'),
+]
+RUNNER_FIELDS = [
+    ('runner_id', 'id', 'int64'),
+    ('dog_name', 'dog_name', 'string'),
+    ('box_number', 'box_number', 'int16'),
+    ('ghr_odds', 'ghr_odds', 'float64'),
+    ('sportsbet_odds', 'sportsbet_odds', 'float64'),
+    ('starting_price', 'starting_price', 'float64'),
+    ('is_scratched', 'is_scratched', 'bool'),
+    ('finishing_position', 'finishing_position', 'int16'),
+]
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def schema():
+    types = {
+        'int16': pa.int16(), 'int32': pa.int32(), 'int64': pa.int64(),
+        'float64': pa.float64(), 'bool': pa.bool_(), 'string': pa.string(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types[kind]) for name, _, kind in RACE_FIELDS + RUNNER_FIELDS])
+
+
+def _value(value, kind: str):
+    if value is None:
+        return None
+    if kind == 'timestamp':
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    if kind == 'float64':
+        return float(value)
+    return value
+
+
+def _rows_by_day(races: Iterable[Dict]) -> Dict[str, Dict[str, list]]:
+    """Column lists per AEST race day, one entry per runner."""
+    days: Dict[str, Dict[str, list]] = {}
+    for race in races:
+        day = race_date(race.get('race_time'))
+        if day is None:
+            continue
+        columns = days.setdefault(day, {name: [] for name, _, _ in RACE_FIELDS + RUNNER_FIELDS})
+        race_values = [(name, _value(race.get(key), kind)) for name, key, kind in RACE_FIELDS]
+        for runner in race.get('runners') or [None]:
+            for name, value in race_values:
+                columns[name].append(value)
+            for name, key, kind in RUNNER_FIELDS:
+                columns[name].append(_value(runner.get(key), kind) if runner else None)
+    return days
+
+
+def day_path(directory: str, day: str) -> str:
+    return os.path.join(directory, f'race_date={day}', 'runners.parquet')
+
+
+def write_races(directory: str, races: Iterable[Dict]) -> int:
+    """Merge races (ARCHIVE_COLUMNS rows) into their day files; returns rows written."""
+    written = 0
+    for day, columns in _rows_by_day(races).items():
+        table = pa.table(columns, schema=schema())
+        path = day_path(directory, day)
+        if os.path.exists(path):
+            existing = pq.read_table(path, schema=schema())
+            keep = pc.invert(pc.is_in(existing['race_id'], value_set=pc.unique(table['race_id'])))
+            table = pa.concat_tables([existing.filter(keep), table])
+        table = table.sort_by([('race_time', 'ascending'), ('race_id', 'ascending'), ('box_number', 'ascending')])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table, path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+        written += len(columns['race_id'])
+    return written
+
+
+def archive_race_ids(client, directory: str, race_ids: List[int]) -> List[Optional[str]]:
+    """Re-read races by id and merge them into the archive; raises if the request fails.
+
+    Returns one error (or None) per id, matching WriteJournal.drain's send().
+    """
+    response = client.table('races').select(ARCHIVE_COLUMNS).in_('id', race_ids).execute()
+    write_races(directory, response.data or [])
+    return [None] * len(race_ids)
+
+
+def latest_day(directory: str) -> Optional[str]:
+    try:
+        days = [name.split('=', 1)[1] for name in os.listdir(directory) if name.startswith('race_date=')]
+    except FileNotFoundError:
+        return None
+    return max(days) if days else None
+
+
+def export(client, directory: str, since: Optional[str] = None, page_size: int = CHUNK_SIZE,
+           progress: Callable[[str], None] = print) -> int:
+    """Archive every race before today (from a date, if given); returns races archived."""
+    today = datetime.now(AEST).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+
+    def history(query):
+        query = query.lt('race_time', today)
+        return query.gte('race_time', since) if since else query
+
+    buffer: List[Dict] = []
+    races = 0
+    for page in stream_pages(client, 'races', ARCHIVE_COLUMNS, where=history, page_size=page_size):
+        buffer.extend(page)
+        races += len(page)
+        if len(buffer) >= FLUSH_RACES:
+            write_races(directory, buffer)
+            buffer = []
+            progress(f"  {races} races archived...")
+    write_races(directory, buffer)
+    return races
+
+
+def main() -> int:
+    if not available():
+        print("pyarrow is required: pip install pyarrow")
+        return 2
+
+    from scraper import get_supabase
+
+    directory = os.environ.get('HISTORY_ARCHIVE_DIR', DEFAULT_DIR)
+    if '--dir' in sys.argv:
+        directory = sys.argv[sys.argv.index('--dir') + 1]
+    if '--since' in sys.argv:
+        since = sys.argv[sys.argv.index('--since') + 1]
+    elif '--days' in sys.argv:
+        days = int(sys.argv[sys.argv.index('--days') + 1])
+        since = (datetime.now(AEST).date() - timedelta(days=days)).isoformat()
+    else:
+        newest = latest_day(directory)
+        since = (date.fromisoformat(newest) - timedelta(days=CATCH_UP_DAYS)).isoformat() if newest else None
+
+    print(f"Archiving races since {since or 'the beginning'} to {directory}...")
+    races = export(get_supabase(), directory, since)
+    print(f"Done. {races} races archived.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
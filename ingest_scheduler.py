@@ -0,0 +1,276 @@
+"""
+Jump-time-aware ingestion daemon.
+
+Instead of refreshing the whole programme once an hour, every upcoming race
+sits in a priority queue keyed by when it next needs polling. Races close to
+the jump are re-polled every minute or two, distant races rarely, and each
+provider has an hourly request budget that polling never exceeds.
+
+Run with `python ingest_scheduler.py` (or `python scraper.py --daemon`).
+"""
+
+import heapq
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import scraper
+from race_fingerprints import FingerprintStore
+
+# (seconds to jump, seconds between polls); the first matching tier applies.
+POLL_TIERS: List[Tuple[float, float]] = [
+    (10 * 60, 60),
+    (30 * 60, 120),
+    (2 * 3600, 10 * 60),
+    (6 * 3600, 30 * 60),
+]
+DISTANT_POLL_INTERVAL = 60 * 60
+# Stop polling a race this long after its advertised start.
+POST_JUMP_GRACE = 5 * 60
+PROGRAMME_REFRESH_INTERVAL = 10 * 60
+# PuntersEdge only prices the next-to-go window, so it is only worth calling
+# when a race in that window is being polled.
+PUNTERS_EDGE_WINDOW = 30 * 60
+
+POINTSBET_HOURLY_BUDGET = int(os.environ.get("POINTSBET_HOURLY_BUDGET", "240"))
+PUNTERS_EDGE_HOURLY_BUDGET = int(os.environ.get("PUNTERS_EDGE_HOURLY_BUDGET", "6"))
+DAEMON_MAX_RUNTIME = int(os.environ.get("INGEST_DAEMON_MAX_RUNTIME", "3300"))
+
+
+def poll_interval(seconds_to_jump: float) -> float:
+    """How long to wait before polling a race this far from its jump."""
+    for limit, interval in POLL_TIERS:
+        if seconds_to_jump <= limit:
+            return interval
+    return DISTANT_POLL_INTERVAL
+
+
+class RequestBudget:
+    """Token bucket allowing per_hour requests, refilled continuously."""
+
+    def __init__(self, per_hour: int):
+        self.capacity = float(per_hour)
+        self.tokens = float(per_hour)
+        self.rate = per_hour / 3600.0
+        self.updated = time.monotonic()
+        self.spent = 0
+
+    def available(self) -> int:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return int(self.tokens)
+
+    def take(self, count: int = 1) -> bool:
+        if self.available() < count:
+            return False
+        self.tokens -= count
+        self.spent += count
+        return True
+
+
+class RaceScheduler:
+    """Priority queue of race IDs ordered by their next poll time."""
+
+    def __init__(self):
+        self.summaries: Dict[str, Dict] = {}
+        self.race_times: Dict[str, float] = {}
+        self.next_poll: Dict[str, float] = {}
+        # Last known Sportsbet price per race and dog, from PuntersEdge.
+        self.sportsbet_prices: Dict[str, Dict[str, float]] = {}
+        self._heap: List[Tuple[float, float, str]] = []
+
+    def sync(self, summaries: Dict[str, Dict], now: float) -> None:
+        """Track the current programme: new races are due immediately."""
+        for race_id in list(self.summaries):
+            if race_id not in summaries:
+                self._forget(race_id)
+        for race_id, summary in summaries.items():
+            start = scraper._parse_utc(summary.get("race_time"))
+            if not start or start.timestamp() < now - POST_JUMP_GRACE:
+                continue
+            race_time = start.timestamp()
+            rescheduled = race_time != self.race_times.get(race_id)
+            self.summaries[race_id] = summary
+            self.race_times[race_id] = race_time
+            if race_id not in self.next_poll or rescheduled:
+                self._push(race_id, now)
+
+    def _push(self, race_id: str, when: float) -> None:
+        self.next_poll[race_id] = when
+        heapq.heappush(self._heap, (when, self.race_times[race_id], race_id))
+
+    def _forget(self, race_id: str) -> None:
+        # Heap entries for forgotten races are skipped lazily when popped.
+        self.summaries.pop(race_id, None)
+        self.race_times.pop(race_id, None)
+        self.next_poll.pop(race_id, None)
+        self.sportsbet_prices.pop(race_id, None)
+
+    def next_due(self) -> Optional[float]:
+        while self._heap:
+            when, _, race_id = self._heap[0]
+            if self.next_poll.get(race_id) == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: float) -> List[str]:
+        """Remove and return every race due by now, soonest jump first."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, _, race_id = heapq.heappop(self._heap)
+            if self.next_poll.get(race_id) == when:
+                del self.next_poll[race_id]
+                due.append(race_id)
+        due.sort(key=lambda race_id: self.race_times[race_id])
+        return due
+
+    def defer(self, race_ids: List[str], when: float) -> None:
+        """Put races back that could not be polled within the budget."""
+        for race_id in race_ids:
+            if race_id in self.summaries:
+                self._push(race_id, when)
+
+    def carry_sportsbet_prices(self, races: List[Dict]) -> None:
+        """Fill Sportsbet prices a poll lacks from earlier polls, then remember its own.
+
+        PuntersEdge is called far less often than races near the jump are
+        polled, so without this every unenriched poll would write the stored
+        Sportsbet prices back to NULL.
+        """
+        for race in races:
+            race_id = str(race.get("provider_race_id"))
+            if race_id not in self.summaries:
+                continue
+            known = self.sportsbet_prices.setdefault(race_id, {})
+            for runner in race["runners"]:
+                if runner.get("sportsbet_odds") is None:
+                    runner["sportsbet_odds"] = known.get(runner["dog_name"])
+                else:
+                    known[runner["dog_name"]] = runner["sportsbet_odds"]
+
+    def reschedule(self, race_id: str, now: float) -> None:
+        seconds_to_jump = self.race_times[race_id] - now
+        if seconds_to_jump < -POST_JUMP_GRACE:
+            self._forget(race_id)
+            return
+        self._push(race_id, now + poll_interval(max(seconds_to_jump, 0)))
+
+
+def _within_budget(
+    scheduler: RaceScheduler, due: List[str], budget: RequestBudget
+) -> Tuple[List[str], List[str]]:
+    """Split due races into those whose card batches fit the budget and the rest."""
+    selected: List[str] = []
+    for race_id in due:
+        candidate = selected + [race_id]
+        batches = scraper._card_batches({rid: scheduler.summaries[rid] for rid in candidate})
+        if len(batches) > budget.available():
+            break
+        selected = candidate
+    return selected, due[len(selected):]
+
+
+def run_daemon(max_runtime: float = DAEMON_MAX_RUNTIME) -> None:
+    """Poll races by jump proximity until max_runtime seconds have elapsed."""
+    print("=" * 60)
+    print("Greyhound Micro-Field Finder - Ingestion daemon")
+    print(f"Started at: {datetime.now(scraper.AEST).strftime('%Y-%m-%d %I:%M:%S %p AEST')}")
+    print(
+        f"Budgets: PointsBet {POINTSBET_HOURLY_BUDGET}/h, "
+        f"PuntersEdge {PUNTERS_EDGE_HOURLY_BUDGET}/h; max runtime {max_runtime}s"
+    )
+    print("=" * 60)
+
+    started = time.time()
+    scheduler = RaceScheduler()
+    pointsbet_budget = RequestBudget(POINTSBET_HOURLY_BUDGET)
+    punters_edge_budget = RequestBudget(PUNTERS_EDGE_HOURLY_BUDGET)
+    fingerprints = FingerprintStore(
+        os.path.join(scraper.INGEST_STATE_DIR, "race_fingerprints.json")
+    )
+    next_programme_refresh = 0.0
+    totals = {"polls": 0, "written": 0, "failed": 0}
+
+    while time.time() - started < max_runtime:
+        now = time.time()
+        if now >= next_programme_refresh and pointsbet_budget.take():
+            try:
+                scheduler.sync(scraper.fetch_pointsbet_programme(), now)
+                print(f"Programme refreshed: tracking {len(scheduler.summaries)} races")
+                # Polls never prune the fingerprints, so races that left the
+                # programme or started are forgotten here.
+                if fingerprints.retain(scheduler.summaries):
+                    fingerprints.save()
+            except Exception as error:
+                print(f"Programme refresh failed: {error}")
+            next_programme_refresh = now + PROGRAMME_REFRESH_INTERVAL
+
+        due = scheduler.pop_due(now)
+        if due:
+            selected, deferred = _within_budget(scheduler, due, pointsbet_budget)
+            if deferred:
+                print(f"Request budget reached; deferring {len(deferred)} races")
+                scheduler.defer(deferred, now + 60)
+            if selected:
+                subset = {race_id: scheduler.summaries[race_id] for race_id in selected}
+                pointsbet_budget.take(len(scraper._card_batches(subset)))
+                try:
+                    races = scraper.fetch_pointsbet_races(subset)
+                    near_jump = any(
+                        scheduler.race_times[race_id] - now <= PUNTERS_EDGE_WINDOW
+                        for race_id in selected
+                    )
+                    if near_jump and punters_edge_budget.take():
+                        try:
+                            scraper.enrich_sportsbet_prices(
+                                races, scraper.fetch_puntersedge_races()
+                            )
+                        except Exception as error:
+                            print(f"PuntersEdge enrichment failed: {error}")
+                    scheduler.carry_sportsbet_prices(races)
+                    counts = scraper.write_changed_races(races, fingerprints, prune=False)
+                    totals["written"] += counts["written"]
+                    totals["failed"] += counts["failed"]
+                except Exception as error:
+                    print(f"Polling {len(selected)} races failed: {error}")
+                totals["polls"] += len(selected)
+                for race_id in selected:
+                    scheduler.reschedule(race_id, time.time())
+
+        # Only re-reads races written since the last publish (plus an hourly
+        # full refresh), so this is cheap when nothing changed.
+        scraper.publish_feed_snapshots()
+
+        # Nothing scheduled (e.g. the programme was never fetched): look again in a minute.
+        wake_at = min(
+            (value for value in (scheduler.next_due(), next_programme_refresh) if value),
+            default=time.time() + 60,
+        )
+        time.sleep(min(max(wake_at - time.time(), 5), 60))
+
+    print("\n" + "=" * 60)
+    print("Ingestion daemon stopped")
+    print(
+        f"Race polls: {totals['polls']}; written: {totals['written']} "
+        f"({totals['failed']} failed)"
+    )
+    print(
+        f"Requests spent: PointsBet {pointsbet_budget.spent}, "
+        f"PuntersEdge {punters_edge_budget.spent}"
+    )
+    scraper.PROVIDER_HTTP.print_summary()
+    scraper.RESPONSE_CACHE.print_summary()
+    scraper.RESPONSE_CACHE.prune(max_age=2 * 24 * 3600)
+    scraper.WRITE_JOURNAL.print_summary()
+    scraper.get_writer().print_summary()
+    scraper.FEED_SNAPSHOTS.print_summary()
+    scraper.SUPABASE_METRICS.print_summary()
+    scraper.SUPABASE_METRICS.save()
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_daemon()
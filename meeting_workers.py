@@ -0,0 +1,149 @@
+"""
+Parallel meeting scrapes for the backfills.
+
+A meeting scrape spends nearly all of its time waiting on page loads, so the
+backfills run several at once. scrape_meetings() hands meetings to worker
+threads, each with its own browsers (browser pools are per thread, see
+browser_pool.py), and yields every finished meeting back on the calling
+thread, so the database writes stay in one place:
+
+    for url, meta, races, error in scrape_meetings(jobs, scrape_one):
+        ...write races...
+
+At most host_limit scrapes hit one host at a time, however many workers
+there are. Progress and throughput are printed as meetings finish.
+
+SCRAPE_WORKERS sets the default number of workers (1: scrape in the calling
+thread, as before); the backfill scripts also take --workers N.
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from browser_pool import close_browser_pools
+
+SCRAPE_WORKERS = int(os.environ.get("SCRAPE_WORKERS", "1"))
+SCRAPE_HOST_CONCURRENCY = int(os.environ.get("SCRAPE_HOST_CONCURRENCY", "4"))
+
+_host_slots: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+_host_slots_lock = threading.Lock()
+
+
+def host_slot(url: str, limit: int = SCRAPE_HOST_CONCURRENCY) -> threading.BoundedSemaphore:
+    """The process-wide semaphore capping concurrent scrapes of a URL's host."""
+    key = (urlparse(url).netloc, limit)
+    with _host_slots_lock:
+        slot = _host_slots.get(key)
+        if slot is None:
+            slot = _host_slots[key] = threading.BoundedSemaphore(max(limit, 1))
+        return slot
+
+
+def workers_arg(argv: List[str], default: int = SCRAPE_WORKERS) -> Tuple[int, List[str]]:
+    """Take `--workers N` out of argv; returns (workers, remaining args)."""
+    if '--workers' not in argv:
+        return default, list(argv)
+    at = argv.index('--workers')
+    return int(argv[at + 1]), argv[:at] + argv[at + 2:]
+
+
+class _Progress:
+    def __init__(self, total: int, label: str):
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def finished(self, error: Optional[BaseException]) -> None:
+        self.done += 1
+        self.failed += int(error is not None)
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed * 60 if elapsed else 0.0
+        left = (self.total - self.done) / rate if rate else 0.0
+        print(
+            f"  [{self.done}/{self.total}] {self.label} done ({self.failed} failed), "
+            f"{rate:.1f}/min, ~{left:.0f} min left",
+            flush=True,
+        )
+
+    def print_summary(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        print(
+            f"Scraped {self.done} {self.label} in {elapsed / 60:.1f} min "
+            f"({self.done / elapsed * 60 if elapsed else 0.0:.1f}/min, {self.failed} failed)",
+            flush=True,
+        )
+
+
+def scrape_meetings(
+    jobs: Sequence[Tuple[str, Any]],
+    scrape: Callable[[str, Any], Any],
+    workers: int = SCRAPE_WORKERS,
+    host_limit: int = SCRAPE_HOST_CONCURRENCY,
+    label: str = "meetings",
+) -> Iterator[Tuple[str, Any, Any, Optional[Exception]]]:
+    """Run scrape(url, meta) for each (url, meta) job on up to `workers` threads.
+
+    Yields (url, meta, result, error) in completion order on the calling
+    thread; error is the exception the scrape raised, if any (result is then
+    None). Leaving the loop early stops the workers after their current job.
+    """
+    jobs = list(jobs)
+    progress = _Progress(len(jobs), label)
+    workers = max(1, min(workers, len(jobs)))
+
+    if workers == 1:
+        for url, meta in jobs:
+            try:
+                with host_slot(url, host_limit):
+                    result, error = scrape(url, meta), None
+            except Exception as e:
+                result, error = None, e
+            progress.finished(error)
+            yield url, meta, result, error
+        progress.print_summary()
+        return
+
+    print(f"Scraping {len(jobs)} {label} with {workers} workers (at most {host_limit} per host)", flush=True)
+    pending: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+    finished: "queue.Queue[Tuple[str, Any, Any, Optional[Exception]]]" = queue.Queue()
+    stop = threading.Event()
+
+    def work():
+        try:
+            while not stop.is_set():
+                try:
+                    url, meta = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    with host_slot(url, host_limit):
+                        finished.put((url, meta, scrape(url, meta), None))
+                except Exception as e:
+                    finished.put((url, meta, None, e))
+        finally:
+            close_browser_pools()
+
+    threads = [
+        threading.Thread(target=work, name=f"meeting-worker-{n}", daemon=True)
+        for n in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(len(jobs)):
+            item = finished.get()
+            progress.finished(item[3])
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    progress.print_summary()
@@ -1,35 +1,331 @@
 """
 Updated scrape_meeting_results function that:
-1. Clicks through all race navigation buttons to get all races
-2. Skips meetings where all SPs are $0 (invalid betting data)
+1. Reads each race's results from the results page's own JSON (XHR/fetch)
+   responses, so a meeting is usually settled from one navigation
+2. Falls back to clicking the race navigation buttons and parsing the
+   rendered table for races the responses don't cover
+3. Skips meetings where all SPs are $0 (invalid betting data)
+
+Only responses from the results endpoint are read, given as a regex over the
+response URL in RESULTS_API_URL; until it is set, results come from the DOM.
+To find it, record a results page (PAGE_SNAPSHOT_MODE=record):
+every JSON response the page loads is stored with its URL (json/N and
+json-url/N parts). Captured races are cross-checked against the page's race
+navigation and the table it shows before they are trusted over the DOM.
+RESULTS_MODE=dom skips the network capture even when the endpoint is set.
+
+With PAGE_SNAPSHOT_MODE=record each complete scrape is stored in the page
+snapshot cache and can be replayed offline (PAGE_SNAPSHOT_MODE=replay, see page_snapshots.py).
 """
 
-from playwright.sync_api import sync_playwright
+import json
+import os
+from browser_pool import get_browser_pool
+from page_snapshots import PAGE_SNAPSHOTS
+from page_waits import element_text, is_marked_active, wait_for_selector, wait_for_text_change
 from bs4 import BeautifulSoup
 import re
-from typing import List, Dict
+from typing import Any, List, Dict, Optional, Tuple
+
+RESULTS_HOST = 'thegreyhoundrecorder.com.au'
+RESULTS_API_URL = os.environ.get('RESULTS_API_URL')
+RESULTS_MODE = os.environ.get('RESULTS_MODE', 'network' if RESULTS_API_URL else 'dom')
+# How long a race button click may take to produce its results response.
+RACE_RESPONSE_TIMEOUT_MS = 5000
+RESULTS_TABLE = 'table.results-event__table'
+
+# Field names seen for results data, compared lower-case without separators
+# (so finishPosition, finish_position and FinishPosition all match). A bare
+# 'number' is not a race number: on runner objects it is the rug number.
+_RACE_NUMBER_KEYS = ('racenumber', 'raceno', 'racenum', 'eventnumber')
+_PLACE_KEYS = ('finishposition', 'finishingposition', 'placing', 'place', 'position', 'finish')
+_BOX_KEYS = ('boxnumber', 'boxno', 'box', 'trap')
+_NAME_KEYS = ('dogname', 'greyhoundname', 'runnername', 'name', 'dog', 'greyhound', 'runner')
+_SP_KEYS = ('startingprice', 'sp', 'startprice', 'spprice')
+
+
+def _field(obj: Dict, keys) -> Any:
+    normalised = {re.sub(r'[^a-z]', '', str(key).lower()): value for key, value in obj.items()}
+    for key in keys:
+        value = normalised.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _int(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.match(r'\s*(\d+)', value) if isinstance(value, str) else None
+    return int(match.group(1)) if match else None
+
+
+def _price(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r'\$?([\d.]+)', value) if isinstance(value, str) else None
+    try:
+        return float(match.group(1)) if match else None
+    except ValueError:
+        return None
+
+
+def _dog_name(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        value = _field(value, ('name', 'dogname', 'greyhoundname'))
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _is_runner_like(obj: Dict) -> bool:
+    """Has a box and a dog name: a runner, a scratching or a form line, never a race."""
+    return _field(obj, _BOX_KEYS) is not None and _dog_name(_field(obj, _NAME_KEYS)) is not None
+
+
+def _runner_from_json(obj: Dict, race_number: int) -> Optional[Dict]:
+    place = _int(_field(obj, _PLACE_KEYS))
+    box = _int(_field(obj, _BOX_KEYS))
+    name = _dog_name(_field(obj, _NAME_KEYS))
+    if place is None or box is None or name is None:
+        return None
+    return {
+        'race_number': race_number,
+        'dog_name': name,
+        'box_number': box,
+        'finishing_position': place,
+        'starting_price': _price(_field(obj, _SP_KEYS)),
+    }
+
+
+def races_from_payloads(payloads: List[Any], meeting_name: str) -> Dict[int, Dict]:
+    """parse_result_table-shaped races found anywhere in JSON payloads, by race number.
+
+    A race is an object with a race number holding a list of at least two
+    runner objects that each have a finishing position, box and dog name, no
+    two sharing a box or name. Runner-like objects (anything with a box and a
+    name, placed or not) are never searched, so form history inside a
+    scratched runner is not read as a race. The first match for a race number
+    wins.
+    """
+    races: Dict[int, Dict] = {}
+
+    def visit(node: Any) -> None:
+        if isinstance(node, dict):
+            if _is_runner_like(node):
+                return
+            number = _int(_field(node, _RACE_NUMBER_KEYS))
+            for value in node.values():
+                if number and number not in races and isinstance(value, list):
+                    runners = [r for r in (_runner_from_json(item, number) for item in value if isinstance(item, dict)) if r]
+                    boxes = {runner['box_number'] for runner in runners}
+                    names = {runner['dog_name'].lower() for runner in runners}
+                    if len(runners) >= 2 and len(boxes) == len(names) == len(runners):
+                        races[number] = {
+                            'meeting_name': meeting_name,
+                            'race_number': number,
+                            'race_date': None,
+                            'results': runners,
+                        }
+                visit(value)
+        elif isinstance(node, list):
+            for item in node:
+                visit(item)
+
+    for payload in payloads:
+        visit(payload)
+    return races
+
+
+def _is_host_json(response) -> bool:
+    return (
+        RESULTS_HOST in response.url
+        and response.request.resource_type in ('xhr', 'fetch')
+        and 'json' in (response.headers.get('content-type') or '')
+    )
+
+
+def _is_results_url(url: Optional[str]) -> bool:
+    return bool(RESULTS_API_URL and url and re.search(RESULTS_API_URL, url))
+
+
+def _is_results_json(response) -> bool:
+    return _is_host_json(response) and _is_results_url(response.url)
+
+
+def _payload(response, snapshot: Dict[str, str]) -> Any:
+    """A response's JSON, recording its body and URL into snapshot."""
+    try:
+        body = response.text()
+    except Exception:
+        return None
+    n = sum(1 for part in snapshot if part.startswith('json/'))
+    snapshot[f'json/{n}'] = body
+    snapshot[f'json-url/{n}'] = response.url
+    return _json(body)
+
+
+def _json(body: str) -> Any:
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _listed_races(page: BeautifulSoup) -> List[int]:
+    """The race numbers in a results page's race navigation."""
+    return sorted({
+        int(item.get_text(strip=True)) for item in page.select('.meeting-events-nav__item')
+        if item.get_text(strip=True).isdigit()
+    })
+
+
+def _field_signature(race: Dict) -> set:
+    return {(runner['box_number'], re.sub(r'[^a-z0-9]', '', runner['dog_name'].lower())) for runner in race['results']}
+
+
+def _cross_checked(captured: Dict[int, Dict], html: str, meeting_name: str) -> Dict[int, Dict]:
+    """The captured races if they agree with the rendered page, otherwise none.
+
+    Races the navigation doesn't list are dropped, and the results table the
+    page shows must be one of the captured races, box for box and dog for
+    dog; if it isn't, the responses are not this meeting's results.
+    """
+    if not captured:
+        return captured
+    page = BeautifulSoup(html, 'html.parser')
+    listed = _listed_races(page)
+    stray = sorted(set(captured) - set(listed)) if listed else []
+    if stray:
+        print(f"  Ignoring captured races the page doesn't list: {stray}")
+        captured = {race_num: race for race_num, race in captured.items() if race_num in listed}
+    table = page.select_one(RESULTS_TABLE)
+    shown = parse_result_table(table, meeting_name, 0) if table else None
+    if shown is None or not any(_field_signature(race) == _field_signature(shown) for race in captured.values()):
+        print("  Captured races don't match the results table shown; using the page")
+        return {}
+    return captured
+
+
+def _race_from_dom(page, meeting_name: str, race_num: int, snapshot: Dict[str, str],
+                   click: bool = True) -> Optional[Dict]:
+    """Click a race's nav button (unless already shown) and parse the rendered table."""
+    if click:
+        # Click button using robust class + text selector
+        # Re-querying ensures we don't use stale elements
+        selector = f".meeting-events-nav__item:text-is('{race_num}')"
+
+        # Check if it exists/visible
+        if page.is_visible(selector):
+            # Wait for the SPA to swap the table, unless the race is already shown
+            before = element_text(page, RESULTS_TABLE)
+            active = is_marked_active(page.query_selector(selector))
+            page.click(selector)
+            if not active:
+                wait_for_text_change(page, RESULTS_TABLE, before)
+        else:
+            print(f"    Warning: Nav button for Race {race_num} not visible")
+
+    # Get updated content
+    html = page.content()
+    snapshot[f'race/{race_num}'] = html
+    return _race_from_html(html, meeting_name, int(race_num))
+
+
+def _race_from_html(html: str, meeting_name: str, race_num: int) -> Optional[Dict]:
+    table = BeautifulSoup(html, 'html.parser').select_one(RESULTS_TABLE)
+    return parse_result_table(table, meeting_name, race_num) if table else None
+
+
+def _replay_results(results_url: str, meeting_name: str) -> List[Dict]:
+    """scrape_meeting_results_new from the latest recorded snapshot of the results page."""
+    parts = PAGE_SNAPSHOTS.load(results_url)
+    if not parts:
+        return []
+    races: Dict[int, Dict] = {}
+    if RESULTS_MODE == 'network':
+        # Only the results endpoint's responses, as on the live path.
+        payloads = [_json(body) for _, body in sorted(
+            (int(part.split('/', 1)[1]), body) for part, body in parts.items()
+            if part.startswith('json/') and _is_results_url(parts.get('json-url/' + part.split('/', 1)[1]))
+        )]
+        races = _cross_checked(races_from_payloads(payloads, meeting_name), parts.get('page', ''), meeting_name)
+    for part, html in parts.items():
+        if part.startswith('race/'):
+            race_num = int(part.split('/', 1)[1])
+            if race_num not in races:
+                race_data = _race_from_html(html, meeting_name, race_num)
+                if race_data:
+                    races[race_num] = race_data
+
+    listed = _listed_races(BeautifulSoup(parts.get('page', ''), 'html.parser'))
+    if not listed:
+        # Single-race page, as on the live path
+        race_data = min(races.values(), key=lambda race: race['race_number']) if races \
+            else _race_from_html(parts.get('page', ''), meeting_name, 1)
+        return [race_data] if race_data and not all_sps_zero(race_data) else []
+    return [races[race_num] for race_num in listed if race_num in races]
+
 
 def scrape_meeting_results_new(meeting_url: str, meeting_name: str) -> List[Dict]:
     """
     Scrape race results from a specific meeting's results page.
-    Clicks through all race navigation buttons to get results for all races.
+    Takes results from the page's JSON responses where it can, otherwise
+    clicks through the race navigation buttons and parses each table.
     Skips meetings where all Starting Prices are $0.
+    In replay mode (see page_snapshots.py) the recorded page is parsed instead.
     """
-    results = []
-    
     # Convert fields URL to results URL
     # e.g., /form-guides/angle-park/fields/250176/ -> /results/angle-park/250176/
     results_url = meeting_url.replace('/form-guides/', '/results/').replace('/fields/', '/')
     print(f"  [DEBUG] Transformed URL: {results_url}")
     
-    with sync_playwright() as p:
+    if PAGE_SNAPSHOTS.replay:
+        return _replay_results(results_url, meeting_name)
+    snapshot: Dict[str, str] = {}
+    results, complete = _scrape_results_page(results_url, meeting_name, snapshot)
+    # A failed or partial scrape is not recorded, so replay keeps the last good one.
+    if complete and results:
+        PAGE_SNAPSHOTS.record(results_url, snapshot)
+    return results
+
+
+def _scrape_results_page(
+    results_url: str, meeting_name: str, snapshot: Dict[str, str]
+) -> Tuple[List[Dict], bool]:
+    """The live scrape; records the page, its JSON responses and each parsed race DOM into snapshot.
+
+    Returns (results, complete); complete is False if any race or the page failed.
+    """
+    results = []
+    complete = True
+
+    with get_browser_pool("chromium").page() as page:
         try:
-            browser = p.chromium.launch(headless=False)
-            page = browser.new_page()
-            
+            network = RESULTS_MODE == 'network'
+            # While recording, every JSON response is kept (with its URL), so
+            # the results endpoint can be read from a recording.
+            recording = PAGE_SNAPSHOTS.mode == 'record'
+            responses = []
+            if network or recording:
+                # Bodies are read after navigation; reading them inside the
+                # event handler would block Playwright's dispatcher.
+                page.on('response', lambda response: responses.append(response) if _is_host_json(response) else None)
+
             print(f"Navigating to {results_url}...")
             page.goto(results_url, wait_until='networkidle', timeout=30000)
-            page.wait_for_timeout(2000)
+            wait_for_selector(page, f'.meeting-events-nav__item, {RESULTS_TABLE}', 'results page')
+            payloads = [(response.url, _payload(response, snapshot)) for response in list(responses)]
+            snapshot['page'] = page.content()
+
+            captured: Dict[int, Dict] = {}
+            if network:
+                results_payloads = [payload for url, payload in payloads if _is_results_url(url)]
+                captured = _cross_checked(races_from_payloads(results_payloads, meeting_name), snapshot['page'], meeting_name)
+                network = bool(captured)
+                print(f"  Captured {len(captured)} races from {len(results_payloads)} results responses")
             
             # Find race navigation items (DIVs with class meeting-events-nav__item)
             # Confirmed via debug: meeting-events-nav__item
@@ -54,21 +350,17 @@ def scrape_meeting_results_new(meeting_url: str, meeting_name: str) -> List[Dict
             if num_races == 0:
                 print("  No race navigation found. Scraping single page.")
                 # Just scrape current page
-                html = page.content()
-                soup = BeautifulSoup(html, 'html.parser')
-                table = soup.select_one('table.results-event__table')
+                race_data = min(captured.values(), key=lambda race: race['race_number']) if captured \
+                    else _race_from_dom(page, meeting_name, 1, snapshot, click=False)
+                if race_data and not all_sps_zero(race_data):
+                    results.append(race_data)
+                elif all_sps_zero(race_data):
+                    print(f"  Skipping {meeting_name} - all SPs are $0")
                 
-                if table:
-                    race_data = parse_result_table(table, meeting_name, 1)
-                    if race_data and not all_sps_zero(race_data):
-                        results.append(race_data)
-                    elif all_sps_zero(race_data):
-                        print(f"  Skipping {meeting_name} - all SPs are $0")
-                
-                browser.close()
-                return results
+                return results, complete
             
-            # Click through each race
+            # Every race the navigation lists, from the captured responses or,
+            # failing that, the race's own response after a click or its table
             all_races_have_zero_sp = True
             
             for i in range(num_races):
@@ -76,54 +368,61 @@ def scrape_meeting_results_new(meeting_url: str, meeting_name: str) -> List[Dict
                     target_race = valid_race_links[i] 
                     race_num = target_race['number']
                     
-                    print(f"  Processing Race {race_num}...")
-                    
-                    # Click button using robust class + text selector
-                    # Re-querying ensures we don't use stale elements
-                    selector = f".meeting-events-nav__item:text-is('{race_num}')"
-                    
-                    # Check if it exists/visible
-                    if page.is_visible(selector):
-                        page.click(selector)
-                        page.wait_for_timeout(2000) # Wait for SPA update
+                    race_data = captured.get(race_num)
+                    if race_data:
+                        source = 'response'
+                    elif network:
+                        print(f"  Processing Race {race_num}...")
+                        selector = f".meeting-events-nav__item:text-is('{race_num}')"
+                        before = element_text(page, RESULTS_TABLE)
+                        try:
+                            with page.expect_response(_is_results_json, timeout=RACE_RESPONSE_TIMEOUT_MS) as info:
+                                page.click(selector)
+                            clicked = races_from_payloads([_payload(info.value, snapshot)], meeting_name)
+                            if race_num in clicked:
+                                captured[race_num] = clicked[race_num]
+                        except Exception as wait_err:
+                            # The page has no per-race responses; use the DOM from here on.
+                            print(f"    No results response for Race {race_num} ({wait_err}); using the page")
+                            network = False
+                        race_data = captured.get(race_num)
+                        source = 'response'
+                        if not race_data:
+                            if network:
+                                wait_for_text_change(page, RESULTS_TABLE, before)
+                            race_data = _race_from_dom(page, meeting_name, race_num, snapshot, click=False)
+                            source = 'page'
                     else:
-                        print(f"    Warning: Nav button for Race {race_num} not visible")
-                        
-                    # Get updated content
-                    html = page.content()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    table = soup.select_one('table.results-event__table')
-                    if table:
-                        race_data = parse_result_table(table, meeting_name, int(race_num))
-                        if race_data:
-                            # Allow races with $0 SPs (User Request: "Resulted - No SPs")
-                            # if not all_sps_zero(race_data):
-                            all_races_have_zero_sp = False # Treat as valid
-                            results.append(race_data)
-                            print(f"    -> Scraped {len(race_data['results'])} runners")
-                            if all_sps_zero(race_data):
-                                print(f"    -> Note: Race {race_num} has all $0 SPs (Runners found)")
+                        print(f"  Processing Race {race_num}...")
+                        race_data = _race_from_dom(page, meeting_name, race_num, snapshot)
+                        source = 'page'
+
+                    if race_data:
+                        # Allow races with $0 SPs (User Request: "Resulted - No SPs")
+                        # if not all_sps_zero(race_data):
+                        all_races_have_zero_sp = False # Treat as valid
+                        results.append(race_data)
+                        print(f"    -> R{race_num}: {len(race_data['results'])} runners (from {source})")
+                        if all_sps_zero(race_data):
+                            print(f"    -> Note: Race {race_num} has all $0 SPs (Runners found)")
                 
                 except Exception as e:
                     print(f"  Error scraping race {i+1}: {e}")
+                    complete = False
                     continue
                 
 
             
-            browser.close()
-            
             # If ALL races had $0 SPs, return empty (skip this meeting)
             if all_races_have_zero_sp and num_races > 0:
                 print(f"Skipping {meeting_name} - all races have $0 SPs")
-                return []
+                return [], complete
             
         except Exception as e:
             print(f"Error with Playwright for {meeting_name}: {e}")
-            if 'browser' in locals():
-                browser.close()
+            complete = False
     
-    return results
+    return results, complete
 
 
 def parse_result_table(table, meeting_name: str, race_number: int) -> Dict:
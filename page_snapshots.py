@@ -0,0 +1,231 @@
+"""
+Content-addressed cache of rendered pages, with offline replay.
+
+Every page a scraper renders in the browser is recorded: fetch_page's HTML,
+the meeting search pages, and for results pages the first render, each
+race's table after its click and the JSON responses the page loaded. A fetch
+is stored as named parts ('html', 'page', 'race/3', 'json/0', ...) under its
+URL and fetch time; the bodies are gzipped into objects/<sha256>.gz, so a
+page that has not changed since the last fetch costs nothing to store again.
+
+    <directory>/index.sqlite3       (url, part, fetched_at) -> sha256
+    <directory>/objects/ab/abcd...gz
+
+Only scrapes that finished without errors are recorded, so a failed or
+partial scrape never becomes the snapshot replay prefers.
+
+In replay mode the scrapers read the latest snapshot of each URL instead of
+opening a browser (optionally the latest at or before PAGE_SNAPSHOT_AS_OF),
+so a parser fix can be re-run over a month of history in seconds:
+
+    PAGE_SNAPSHOT_MODE=record python backfill_fields.py 30
+    PAGE_SNAPSHOT_MODE=replay python backfill_fields.py 30
+    python backfill_distances.py --replay
+
+PAGE_SNAPSHOT_MODE is off (default), record or replay; PAGE_SNAPSHOT_DIR moves
+the cache (default <INGEST_STATE_DIR>/page_snapshots). Fetches older than
+PAGE_SNAPSHOT_MAX_AGE_DAYS (default 30; 0 keeps everything) are pruned, along
+with the objects only they used, at the end of a recording run.
+"""
+
+import atexit
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+MODES = ('off', 'record', 'replay')
+
+
+class PageSnapshots:
+    """Recorded page fetches, keyed by URL and fetch time."""
+
+    def __init__(self, directory: str, mode: str = 'off', as_of: Optional[float] = None,
+                 max_age_days: float = 30):
+        if mode not in MODES:
+            raise ValueError(f"PAGE_SNAPSHOT_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+        self.directory = directory
+        self.mode = mode
+        self.as_of = as_of
+        self.max_age_days = max_age_days
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.replayed = 0
+        self.missing = 0
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == 'replay'
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(
+                os.path.join(self.directory, 'index.sqlite3'), check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    url TEXT NOT NULL,
+                    part TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (url, fetched_at, part)
+                )
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def _object_path(self, sha: str) -> str:
+        return os.path.join(self.directory, 'objects', sha[:2], sha + '.gz')
+
+    def record(self, url: str, parts: Dict[str, str]) -> None:
+        """Store one complete fetch of a URL (no-op unless recording).
+
+        Never raises: a snapshot that cannot be written is reported and
+        dropped, and the scrape's results are unaffected.
+        """
+        if self.mode != 'record' or not parts:
+            return
+        try:
+            self._record(url, parts)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Could not record snapshot of {url}: {e}")
+
+    def _record(self, url: str, parts: Dict[str, str]) -> None:
+        fetched_at = time.time()
+        rows = []
+        raw = stored = 0
+        for part, text in parts.items():
+            body = text.encode('utf-8')
+            sha = hashlib.sha256(body).hexdigest()
+            path = self._object_path(sha)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                compressed = gzip.compress(body, compresslevel=6, mtime=0)
+                # A temp file of its own: parallel workers may store the same object.
+                handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+                try:
+                    with os.fdopen(handle, 'wb') as temp:
+                        temp.write(compressed)
+                    os.replace(temp_path, path)
+                except BaseException:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                stored += len(compressed)
+            raw += len(body)
+            rows.append((url, part, fetched_at, sha, len(body)))
+        with self._lock:
+            self._connect().executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)", rows)
+            self.recorded += 1
+            self.raw_bytes += raw
+            self.stored_bytes += stored
+
+    def fetches(self, url: str) -> List[float]:
+        """Fetch times recorded for a URL, oldest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT DISTINCT fetched_at FROM snapshots WHERE url = ? ORDER BY fetched_at", (url,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def load(self, url: str) -> Optional[Dict[str, str]]:
+        """The parts of the latest fetch of a URL (at or before as_of), or None."""
+        with self._lock:
+            conn = self._connect()
+            latest = conn.execute(
+                "SELECT MAX(fetched_at) FROM snapshots WHERE url = ? AND fetched_at <= ?",
+                (url, self.as_of if self.as_of is not None else float('inf')),
+            ).fetchone()[0]
+            rows = [] if latest is None else conn.execute(
+                "SELECT part, sha256 FROM snapshots WHERE url = ? AND fetched_at = ?", (url, latest)
+            ).fetchall()
+        if not rows:
+            self.missing += 1
+            print(f"No snapshot of {url}")
+            return None
+        parts = {}
+        for part, sha in rows:
+            with open(self._object_path(sha), 'rb') as handle:
+                parts[part] = gzip.decompress(handle.read()).decode('utf-8')
+        self.replayed += 1
+        print(f"Replaying snapshot of {url} from {datetime.fromtimestamp(latest):%Y-%m-%d %H:%M}")
+        return parts
+
+    def prune(self) -> int:
+        """Forget fetches older than max_age_days and delete objects no fetch uses."""
+        if not self.max_age_days or not os.path.exists(os.path.join(self.directory, 'index.sqlite3')):
+            return 0
+        cutoff = time.time() - self.max_age_days * 24 * 3600
+        with self._lock:
+            conn = self._connect()
+            pruned = conn.execute("DELETE FROM snapshots WHERE fetched_at < ?", (cutoff,)).rowcount
+            used = {row[0] for row in conn.execute("SELECT DISTINCT sha256 FROM snapshots")}
+        if not pruned:
+            return 0
+        removed = 0
+        for root, _, names in os.walk(os.path.join(self.directory, 'objects')):
+            for name in names:
+                path = os.path.join(root, name)
+                # Recent objects may belong to a fetch another run has not indexed yet.
+                if name.endswith('.gz') and name[:-len('.gz')] not in used and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        print(f"Page snapshots: pruned {pruned} parts older than {self.max_age_days:g} days, {removed} objects")
+        return pruned
+
+    def finish(self) -> None:
+        """End of run: prune after recording, then print the totals."""
+        if self.recorded:
+            try:
+                self.prune()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Page snapshots: pruning failed: {e}")
+        self.print_summary()
+
+    def print_summary(self) -> None:
+        if self.recorded:
+            print(
+                f"Page snapshots: recorded {self.recorded} fetches, {self.raw_bytes / 1024 / 1024:.1f} MB rendered, "
+                f"{self.stored_bytes / 1024 / 1024:.1f} MB newly stored ({self.directory})"
+            )
+        if self.replayed or self.missing:
+            print(f"Page snapshots: replayed {self.replayed} fetches, {self.missing} URLs had no snapshot")
+
+
+def _as_of(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed.timestamp()
+
+
+PAGE_SNAPSHOTS = PageSnapshots(
+    os.environ.get(
+        'PAGE_SNAPSHOT_DIR', os.path.join(os.environ.get('INGEST_STATE_DIR', '.ingest_state'), 'page_snapshots')
+    ),
+    mode=os.environ.get('PAGE_SNAPSHOT_MODE', 'off'),
+    as_of=_as_of(os.environ.get('PAGE_SNAPSHOT_AS_OF')),
+    max_age_days=float(os.environ.get('PAGE_SNAPSHOT_MAX_AGE_DAYS', '30')),
+)
+atexit.register(PAGE_SNAPSHOTS.finish)
+
+
+def replay_arg(argv: List[str]) -> List[str]:
+    """Switch to replay mode if argv has --replay; returns the other args."""
+    if '--replay' not in argv:
+        return list(argv)
+    PAGE_SNAPSHOTS.mode = 'replay'
+    return [arg for arg in argv if arg != '--replay']
@@ -0,0 +1,290 @@
+"""
+Event-driven waits for the Playwright scrapers.
+
+The scrapers used to sleep for fixed times (a 3 s "human pause", 2 s after
+every table, 800 ms per scroll step, 2-3 s after every race click) whether
+the page needed them or not. These waits return as soon as the DOM says the
+page is ready:
+
+- wait_for_load: the page's load event.
+- wait_for_dom_quiet: no DOM mutations for a short quiet window (rendering
+  has settled).
+- load_lazy_content: scrolls a lazy-loading list and watches it with a
+  MutationObserver, stopping once the bottom is reached and nothing new
+  appears within the quiet window.
+- wait_for_text_change: after a click, waits for an element's text to differ
+  from what it was before (the results table switching race).
+
+Each kind of wait has an AdaptiveTimeout: it starts at the old fixed delay,
+then tracks how long the wait actually takes (3x the 90th percentile of
+recent waits, within a floor and a ceiling) and doubles after a wait times
+out. Every wait logs its duration; WAITS prints totals at exit.
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# Recent successful durations kept per wait kind.
+HISTORY = 50
+# Successful waits needed before a timeout adapts.
+MIN_SAMPLES = 5
+
+
+class AdaptiveTimeout:
+    """A timeout that follows how long a wait usually takes."""
+
+    def __init__(self, initial_ms: int, floor_ms: int, ceiling_ms: int, factor: float = 3.0):
+        self.initial_ms = initial_ms
+        self.floor_ms = floor_ms
+        self.ceiling_ms = ceiling_ms
+        self.factor = factor
+        self.durations: Deque[float] = deque(maxlen=HISTORY)
+        self.misses_in_row = 0
+
+    def current(self) -> int:
+        if len(self.durations) < MIN_SAMPLES:
+            base = self.initial_ms
+        else:
+            ordered = sorted(self.durations)
+            p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+            base = min(max(p90 * self.factor, self.floor_ms), self.ceiling_ms)
+        return int(min(base * 2 ** self.misses_in_row, self.ceiling_ms))
+
+    def record(self, ms: float, ok: bool) -> None:
+        if ok:
+            self.durations.append(ms)
+            self.misses_in_row = 0
+        else:
+            self.misses_in_row += 1
+
+
+class PageWaits:
+    """Adaptive timeouts and duration totals per kind of wait (shared by all threads)."""
+
+    # kind -> (initial, floor, ceiling) in ms
+    DEFAULTS = {
+        'homepage load': (5000, 1000, 10000),
+        'form guide table': (15000, 5000, 15000),
+        'render settle': (2000, 300, 2000),
+        'lazy races': (20000, 5000, 30000),
+        'results page': (2000, 500, 5000),
+        'results table': (3000, 750, 5000),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timeouts: Dict[str, AdaptiveTimeout] = {}
+        self._totals: Dict[str, list] = {}  # kind -> [waits, total ms, timeouts]
+
+    def timeout(self, kind: str) -> int:
+        with self._lock:
+            return self._timeout(kind).current()
+
+    def _timeout(self, kind: str) -> AdaptiveTimeout:
+        adaptive = self._timeouts.get(kind)
+        if adaptive is None:
+            adaptive = self._timeouts[kind] = AdaptiveTimeout(*self.DEFAULTS.get(kind, (3000, 500, 10000)))
+        return adaptive
+
+    def record(self, kind: str, ms: float, ok: bool, timeout_ms: int, detail: str = '') -> None:
+        with self._lock:
+            self._timeout(kind).record(ms, ok)
+            totals = self._totals.setdefault(kind, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += ms
+            totals[2] += int(not ok)
+        outcome = 'ready' if ok else 'timed out'
+        print(f"    wait {kind}: {ms:.0f}ms, {outcome} (timeout {timeout_ms}ms){detail}")
+
+    def print_summary(self) -> None:
+        with self._lock:
+            totals = sorted(self._totals.items())
+        if not totals:
+            return
+        print("Page waits: " + ", ".join(
+            f"{kind} {waits}x avg {total / waits:.0f}ms ({timeouts} timed out)"
+            for kind, (waits, total, timeouts) in totals
+        ))
+
+
+WAITS = PageWaits()
+atexit.register(WAITS.print_summary)
+
+
+def wait_for_load(page, kind: str = 'homepage load') -> bool:
+    """Wait for the page's load event."""
+    timeout = WAITS.timeout(kind)
+    started = time.perf_counter()
+    try:
+        page.wait_for_load_state('load', timeout=timeout)
+        ok = True
+    except Exception:
+        ok = False
+    WAITS.record(kind, (time.perf_counter() - started) * 1000, ok, timeout)
+    return ok
+
+
+def wait_for_selector(page, selector: str, kind: str) -> bool:
+    """Wait for an element to be attached."""
+    timeout = WAITS.timeout(kind)
+    started = time.perf_counter()
+    try:
+        page.wait_for_selector(selector, timeout=timeout)
+        ok = True
+    except Exception:
+        ok = False
+    WAITS.record(kind, (time.perf_counter() - started) * 1000, ok, timeout)
+    return ok
+
+
+_DOM_QUIET_JS = """
+([quietMs, timeoutMs]) => new Promise(resolve => {
+    let quiet;
+    const done = ok => { observer.disconnect(); clearTimeout(quiet); clearTimeout(deadline); resolve(ok); };
+    const observer = new MutationObserver(() => { clearTimeout(quiet); quiet = setTimeout(() => done(true), quietMs); });
+    observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true, attributes: true});
+    quiet = setTimeout(() => done(true), quietMs);
+    const deadline = setTimeout(() => done(false), timeoutMs);
+})
+"""
+
+
+def wait_for_dom_quiet(page, kind: str = 'render settle', quiet_ms: int = 250) -> bool:
+    """Wait until the DOM has not changed for quiet_ms."""
+    timeout = WAITS.timeout(kind)
+    started = time.perf_counter()
+    try:
+        ok = bool(page.evaluate(_DOM_QUIET_JS, [quiet_ms, timeout]))
+    except Exception:
+        ok = False
+    WAITS.record(kind, (time.perf_counter() - started) * 1000, ok, timeout)
+    return ok
+
+
+# Scrolls a viewport at a time. A step ends as soon as new items are added
+# (MutationObserver); at the bottom, quietMs without new items means the list
+# is complete. Returns the item count and, for steps
+# that loaded items, how long the items took to appear.
+_LAZY_JS = """
+([selector, quietMs, timeoutMs]) => new Promise(resolve => {
+    const count = () => document.querySelectorAll(selector).length;
+    const atBottom = () => window.innerHeight + window.scrollY >= document.body.scrollHeight - 100;
+    const latencies = [];
+    let seen = count(), stepStarted = 0, quiet;
+    const finish = complete => {
+        observer.disconnect(); clearTimeout(quiet); clearTimeout(deadline);
+        window.scrollTo(0, 0);
+        resolve({count: seen, latencies, complete});
+    };
+    const step = () => {
+        clearTimeout(quiet);
+        window.scrollBy(0, window.innerHeight);
+        stepStarted = performance.now();
+        // Above the bottom, move on quickly: late items still restart the scroll.
+        quiet = setTimeout(() => atBottom() ? finish(true) : step(), atBottom() ? quietMs : Math.min(150, quietMs));
+    };
+    const observer = new MutationObserver(() => {
+        const now = count();
+        if (now > seen) {
+            seen = now;
+            latencies.push(performance.now() - stepStarted);
+            step();
+        }
+    });
+    observer.observe(document.body, {childList: true, subtree: true});
+    const deadline = setTimeout(() => finish(false), timeoutMs);
+    step();
+})
+"""
+
+
+def load_lazy_content(page, selector: str, kind: str = 'lazy races') -> int:
+    """Scroll until every lazily loaded `selector` item is in the DOM; returns the count.
+
+    The quiet window is 2.5x the slowest item load seen recently, between 300
+    and 1500ms (800ms until enough loads have been seen).
+    """
+    timeout = WAITS.timeout(kind)
+    quiet_ms = _lazy_quiet_ms()
+    started = time.perf_counter()
+    try:
+        outcome = page.evaluate(_LAZY_JS, [selector, quiet_ms, timeout])
+    except Exception as e:
+        outcome = {'count': 0, 'latencies': [], 'complete': False}
+        print(f"    Lazy loading failed: {e}")
+    _lazy_latencies.extend(outcome['latencies'])
+    WAITS.record(
+        kind, (time.perf_counter() - started) * 1000, outcome['complete'], timeout,
+        f", {outcome['count']} items, quiet window {quiet_ms}ms",
+    )
+    return outcome['count']
+
+
+_lazy_latencies: Deque[float] = deque(maxlen=HISTORY)
+
+
+def _lazy_quiet_ms() -> int:
+    if len(_lazy_latencies) < MIN_SAMPLES:
+        return 800
+    return int(min(max(max(_lazy_latencies) * 2.5, 300), 1500))
+
+
+_TEXT_CHANGE_JS = """
+([selector, before, settleMs, timeoutMs]) => new Promise(resolve => {
+    const text = () => { const el = document.querySelector(selector); return el ? el.innerText : null; };
+    let settle;
+    const done = ok => { observer.disconnect(); clearTimeout(settle); clearTimeout(deadline); resolve(ok); };
+    const check = () => {
+        const now = text();
+        if (now !== null && now !== before) {
+            clearTimeout(settle);
+            settle = setTimeout(() => done(true), settleMs);
+        }
+    };
+    const observer = new MutationObserver(check);
+    observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+    const deadline = setTimeout(() => done(false), timeoutMs);
+    check();
+})
+"""
+
+
+def element_text(page, selector: str) -> Optional[str]:
+    """An element's rendered text, or None if it is not on the page."""
+    try:
+        return page.evaluate(
+            "selector => { const el = document.querySelector(selector); return el ? el.innerText : null; }",
+            selector,
+        )
+    except Exception:
+        return None
+
+
+def wait_for_text_change(page, selector: str, before: Optional[str], kind: str = 'results table',
+                         settle_ms: int = 100) -> bool:
+    """Wait for `selector`'s text to differ from `before`, then for it to hold for settle_ms."""
+    timeout = WAITS.timeout(kind)
+    started = time.perf_counter()
+    try:
+        ok = bool(page.evaluate(_TEXT_CHANGE_JS, [selector, before, settle_ms, timeout]))
+    except Exception:
+        ok = False
+    WAITS.record(kind, (time.perf_counter() - started) * 1000, ok, timeout)
+    return ok
+
+
+_ACTIVE_JS = """
+el => /(^|[-_\\s])(active|selected|current)([-_\\s]|$)/.test(el.className)
+    || el.getAttribute('aria-current') !== null || el.getAttribute('aria-selected') === 'true'
+"""
+
+
+def is_marked_active(element) -> bool:
+    """Whether a nav element is marked as the one shown (clicking it changes nothing)."""
+    try:
+        return bool(element.evaluate(_ACTIVE_JS))
+    except Exception:
+        return False
@@ -0,0 +1,165 @@
+"""
+Typed decoding of the PointsBet and PuntersEdge payloads used by ingestion.
+
+Response bodies are decoded straight from bytes into msgspec Structs that
+declare only the fields the scraper reads; everything else in the payload is
+skipped by the decoder without building intermediate dicts. Fields whose JSON
+type varies between responses are declared as Any.
+
+Decoding is lax (strict=False: 0/1 for booleans, numeric strings for
+numbers), and every meeting group, race card and price race is decoded on its
+own, so one malformed element is skipped rather than failing the whole
+response, as the old dict path did.
+"""
+
+import re
+from typing import Any, List, Optional, Union
+
+import msgspec
+
+
+class _DistanceFields(msgspec.Struct, rename="camel"):
+    """The distance variants seen across PointsBet race responses."""
+    distance: Any = None
+    distance_meters: Any = None
+    race_distance: Any = None
+    race_distance_meters: Any = None
+
+    def distance_metres(self) -> Optional[int]:
+        for value in (
+            self.distance,
+            self.distance_meters,
+            self.race_distance,
+            self.race_distance_meters,
+        ):
+            if isinstance(value, dict):
+                value = value.get("metres") or value.get("meters") or value.get("value")
+            if value is None:
+                continue
+            match = re.search(r"\d+", str(value))
+            if match:
+                return int(match.group())
+        return None
+
+
+class RaceSummary(_DistanceFields, rename="camel"):
+    race_id: Any = None
+    race_number: Any = None
+    advertised_start_date_time_utc: Optional[str] = None
+
+
+class Meeting(msgspec.Struct, rename="camel"):
+    racing_type: Any = None
+    country_code: Optional[str] = None
+    venue: Optional[str] = None
+    name: Optional[str] = None
+    races: Optional[List[RaceSummary]] = None
+
+
+class MeetingGroup(msgspec.Struct, rename="camel"):
+    meetings: Optional[List[Meeting]] = None
+
+
+class Fluctuations(msgspec.Struct, rename="camel"):
+    current: Any = None
+
+
+class Runner(msgspec.Struct, rename="camel"):
+    number: Any = None
+    barrier: Any = None
+    runner_name: Optional[str] = None
+    name: Optional[str] = None
+    # Sent as a bool, and occasionally as 0/1.
+    is_scratched: Any = None
+    fluctuations: Optional[Fluctuations] = None
+
+
+class RaceCard(_DistanceFields, rename="camel"):
+    race_id: Any = None
+    venue: Optional[str] = None
+    number: Any = None
+    race_number: Any = None
+    advertised_start_time_utc: Optional[str] = None
+    advertised_start_date_time_utc: Optional[str] = None
+    runners: Optional[List[Runner]] = None
+
+
+class Bookmaker(msgspec.Struct):
+    key: Any = None
+    win_price: Any = None
+
+
+class PriceRunner(msgspec.Struct):
+    name: Optional[str] = None
+    bookmakers: Optional[List[Bookmaker]] = None
+
+
+class PriceRace(msgspec.Struct):
+    id: Any = None
+    race_id: Any = None
+    venue: Optional[str] = None
+    race_number: Any = None
+    start_time: Optional[str] = None
+    runners: Optional[List[PriceRunner]] = None
+
+
+# The envelopes keep their list elements undecoded (msgspec.Raw) so each one
+# can be decoded, and rejected, separately.
+class MeetingsEnvelope(msgspec.Struct):
+    meetings: Optional[List[msgspec.Raw]] = None
+
+
+class CardsEnvelope(msgspec.Struct, rename="camel"):
+    """A single race card, or a batch wrapped as {"races": [...]}."""
+    race_id: Any = None
+    races: Optional[List[msgspec.Raw]] = None
+
+
+class PriceEnvelope(msgspec.Struct):
+    races: Optional[List[msgspec.Raw]] = None
+    events: Optional[List[msgspec.Raw]] = None
+    data: Optional[List[msgspec.Raw]] = None
+    results: Optional[List[msgspec.Raw]] = None
+
+
+_meetings_decoder = msgspec.json.Decoder(Union[List[msgspec.Raw], MeetingsEnvelope])
+_cards_decoder = msgspec.json.Decoder(Union[List[msgspec.Raw], CardsEnvelope])
+_prices_decoder = msgspec.json.Decoder(Union[List[msgspec.Raw], PriceEnvelope])
+_group_decoder = msgspec.json.Decoder(MeetingGroup, strict=False)
+_card_decoder = msgspec.json.Decoder(RaceCard, strict=False)
+_price_race_decoder = msgspec.json.Decoder(PriceRace, strict=False)
+
+
+def _decode_each(elements: List[msgspec.Raw], decoder: msgspec.json.Decoder, what: str) -> list:
+    decoded = []
+    for element in elements:
+        try:
+            decoded.append(decoder.decode(element))
+        except msgspec.ValidationError as error:
+            print(f"Skipping malformed {what}: {error}")
+    return decoded
+
+
+def decode_meetings(body: bytes) -> List[MeetingGroup]:
+    payload = _meetings_decoder.decode(body)
+    groups = payload if isinstance(payload, list) else payload.meetings or []
+    return _decode_each(groups, _group_decoder, "PointsBet meeting group")
+
+
+def decode_race_cards(body: bytes) -> List[RaceCard]:
+    payload = _cards_decoder.decode(body)
+    if isinstance(payload, list):
+        return _decode_each(payload, _card_decoder, "PointsBet race card")
+    if payload.races is not None:
+        return _decode_each(payload.races, _card_decoder, "PointsBet race card")
+    return _decode_each([msgspec.Raw(body)], _card_decoder, "PointsBet race card") if payload.race_id else []
+
+
+def decode_price_races(body: bytes) -> List[PriceRace]:
+    payload = _prices_decoder.decode(body)
+    if isinstance(payload, list):
+        return _decode_each(payload, _price_race_decoder, "PuntersEdge race")
+    for races in (payload.races, payload.events, payload.data, payload.results):
+        if races is not None:
+            return _decode_each(races, _price_race_decoder, "PuntersEdge race")
+    return []
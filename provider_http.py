@@ -0,0 +1,248 @@
+"""
+Shared HTTP client for the racing provider APIs.
+
+Every provider request goes through a ProviderClient, which keeps one pooled
+keep-alive session per host, retries transient failures with exponential
+backoff (honouring Retry-After), applies per-host timeouts and stops calling a
+host that keeps failing until it has had time to recover.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 429 and gateway errors are worth another attempt; other 4xx responses are not.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class HostPolicy:
+    """Timeouts, retry and circuit-breaker settings for one provider host."""
+    # (connect, read) seconds, passed straight through to requests.
+    timeout: Union[float, Tuple[float, float]] = (10, 45)
+    max_retries: int = 3
+    backoff_base: float = 1.0
+    backoff_max: float = 30.0
+    # Longest Retry-After honoured; a host asking for more is given up on.
+    retry_after_max: float = 120.0
+    # Consecutive failed requests before the host is short-circuited.
+    failure_threshold: int = 5
+    reset_after: float = 60.0
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    failures: int = 0
+    retries: int = 0
+    bytes_received: int = 0
+    latency_ms: float = 0.0
+    statuses: Dict[int, int] = field(default_factory=dict)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Open after repeated failures; allow one trial request after a cool-down."""
+
+    def __init__(self, failure_threshold: int, reset_after: float):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_after:
+                # Half-open: let a single request through to probe the host.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Parse Retry-After as either delay-seconds or an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class ProviderClient:
+    """Pooled, retrying GET client shared by every provider integration."""
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, HostPolicy]] = None,
+        default_policy: Optional[HostPolicy] = None,
+        pool_size: int = 10,
+    ):
+        self.policies = dict(policies or {})
+        self.default_policy = default_policy or HostPolicy()
+        self.pool_size = pool_size
+        self._sessions: Dict[str, requests.Session] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+    def _policy(self, host: str) -> HostPolicy:
+        return self.policies.get(host, self.default_policy)
+
+    def _host_state(self, host: str) -> Tuple[requests.Session, CircuitBreaker, HostStats]:
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                policy = self._policy(host)
+                session = requests.Session()
+                # Retries are handled here rather than by urllib3 so Retry-After,
+                # the circuit breaker and the stats all see every attempt.
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.pool_size, max_retries=0
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+                self._breakers[host] = CircuitBreaker(
+                    policy.failure_threshold, policy.reset_after
+                )
+                self._stats[host] = HostStats()
+            return session, self._breakers[host], self._stats[host]
+
+    def _backoff(self, policy: HostPolicy, attempt: int) -> float:
+        delay = min(policy.backoff_max, policy.backoff_base * (2 ** attempt))
+        # Full jitter keeps concurrent batch fetches from retrying in lockstep.
+        return random.uniform(0, delay)
+
+    def get(self, url: str, params=None, headers=None) -> requests.Response:
+        """GET a URL, retrying transient failures. Raises on a final error."""
+        host = urlsplit(url).hostname or ""
+        policy = self._policy(host)
+        session, breaker, stats = self._host_state(host)
+        path = urlsplit(url).path
+
+        if not breaker.allow():
+            raise CircuitOpenError(
+                f"Circuit open for {host} after {breaker.failures} consecutive failures"
+            )
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            response = None
+            error: Optional[Exception] = None
+            try:
+                response = session.get(
+                    url, params=params, headers=headers or {}, timeout=policy.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self._lock:
+                stats.requests += 1
+                stats.latency_ms += elapsed_ms
+                if response is not None:
+                    stats.bytes_received += len(response.content)
+                    stats.statuses[response.status_code] = (
+                        stats.statuses.get(response.status_code, 0) + 1
+                    )
+
+            retryable = error is not None or response.status_code in RETRY_STATUSES
+            if not retryable:
+                breaker.record_success()
+                print(
+                    f"HTTP {response.status_code} {path}; "
+                    f"bytes={len(response.content)}; {elapsed_ms:.0f}ms"
+                )
+                response.raise_for_status()
+                return response
+
+            retry_after = _retry_after_seconds(response) if response is not None else None
+            # A retry before the host's Retry-After would only be refused again,
+            # so a longer wait than retry_after_max means giving up now.
+            too_long = retry_after is not None and retry_after > policy.retry_after_max
+            if attempt >= policy.max_retries or too_long:
+                breaker.record_failure()
+                with self._lock:
+                    stats.failures += 1
+                if error is not None:
+                    raise error
+                if too_long:
+                    print(f"HTTP {response.status_code} {path}; Retry-After {retry_after:.0f}s, giving up")
+                else:
+                    print(f"HTTP {response.status_code} {path}; giving up after {attempt + 1} attempts")
+                response.raise_for_status()
+
+            delay = self._backoff(policy, attempt)
+            if retry_after is not None:
+                # Always the full Retry-After, even beyond backoff_max.
+                delay = max(delay, retry_after)
+            reason = error or f"HTTP {response.status_code}"
+            print(f"Retrying {path} in {delay:.1f}s ({attempt + 1}/{policy.max_retries}): {reason}")
+            with self._lock:
+                stats.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per-host request counts, bytes and mean latency for the run log."""
+        with self._lock:
+            return {
+                host: {
+                    "requests": stats.requests,
+                    "retries": stats.retries,
+                    "failures": stats.failures,
+                    "bytes": stats.bytes_received,
+                    "avg_ms": round(stats.latency_ms / stats.requests, 1) if stats.requests else 0.0,
+                    "statuses": dict(stats.statuses),
+                }
+                for host, stats in self._stats.items()
+            }
+
+    def print_summary(self) -> None:
+        for host, stats in self.summary().items():
+            print(
+                f"HTTP {host}: {stats['requests']} requests, {stats['retries']} retries, "
+                f"{stats['failures']} failures, {stats['bytes']:,} bytes, "
+                f"avg {stats['avg_ms']}ms"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
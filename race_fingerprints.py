@@ -0,0 +1,117 @@
+"""
+Run-to-run fingerprints of ingested race cards.
+
+Each prepared race is reduced to a hash of the fields the frontend shows
+(start time, distance, status, runners, scratchings and both prices). The
+hashes are kept in a small JSON file between runs so only new or changed
+cards need to be written to Supabase.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Tuple
+
+
+def race_key(race: Dict) -> str:
+    """Stable identity for a race: the provider race ID where there is one."""
+    if race.get("provider_race_id"):
+        return str(race["provider_race_id"])
+    return f"{race['meeting_name']}|{race['race_number']}|{str(race['race_time'])[:10]}"
+
+
+def race_fingerprint(race: Dict) -> str:
+    """Hash the written content of a race card, ignoring runner order."""
+    runners = sorted(
+        (
+            runner["box_number"],
+            runner["dog_name"],
+            runner.get("ghr_odds"),
+            runner.get("sportsbet_odds"),
+            bool(runner.get("is_scratched")),
+        )
+        for runner in race.get("runners") or []
+    )
+    content = [
+        race.get("meeting_name"),
+        race.get("race_number"),
+        race.get("race_time"),
+        race.get("distance_meters"),
+        race.get("status"),
+        race.get("active_runner_count"),
+        runners,
+    ]
+    return hashlib.sha1(json.dumps(content, default=str).encode()).hexdigest()
+
+
+class FingerprintStore:
+    """JSON-file map of race key -> fingerprint of the last successful write."""
+
+    def __init__(self, path: str, max_age: float = 6 * 3600):
+        self.path = path
+        # Rewrite cards periodically even when unchanged, so a row removed or
+        # edited in the database outside this pipeline is eventually restored.
+        self.max_age = max_age
+        self.entries: Dict[str, Dict] = {}
+        try:
+            with open(path) as state_file:
+                self.entries = json.load(state_file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def diff(
+        self, races: List[Dict], prune: bool = True
+    ) -> Tuple[List[Dict], Dict[str, int]]:
+        """Return the races to write plus unchanged/changed/new/removed counts.
+
+        Unchanged cards past max_age are written again and counted as refreshed.
+        Pass prune=False when races is only part of the feed, so races that
+        were simply not polled this time are not treated as removed.
+        """
+        now = time.time()
+        counts = {"unchanged": 0, "changed": 0, "new": 0, "removed": 0, "refreshed": 0}
+        to_write = []
+        seen = set()
+        for race in races:
+            key = race_key(race)
+            seen.add(key)
+            previous = self.entries.get(key)
+            if previous is None:
+                counts["new"] += 1
+                to_write.append(race)
+            elif previous["fingerprint"] != race_fingerprint(race):
+                counts["changed"] += 1
+                to_write.append(race)
+            elif now - previous.get("written_at", 0) > self.max_age:
+                counts["refreshed"] += 1
+                to_write.append(race)
+            else:
+                counts["unchanged"] += 1
+
+        removed = [key for key in self.entries if key not in seen] if prune else []
+        counts["removed"] = len(removed)
+        for key in removed:
+            del self.entries[key]
+        return to_write, counts
+
+    def retain(self, keys: Iterable[str]) -> int:
+        """Forget every race not in keys (e.g. no longer in the programme); returns how many."""
+        keep = set(keys)
+        removed = [key for key in self.entries if key not in keep]
+        for key in removed:
+            del self.entries[key]
+        return len(removed)
+
+    def record(self, race: Dict) -> None:
+        """Remember a race once it has been written successfully."""
+        self.entries[race_key(race)] = {
+            "fingerprint": race_fingerprint(race),
+            "written_at": time.time(),
+        }
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as state_file:
+            json.dump(self.entries, state_file)
+        os.replace(f"{self.path}.tmp", self.path)
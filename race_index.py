@@ -0,0 +1,172 @@
+"""
+Run-scoped index of stored races and their runners.
+
+Ingestion and backfill runs load every race in their date window with one
+ranged select (runners embedded), then resolve identities in memory instead
+of querying Supabase per race. The index is kept current as the run writes,
+so races inserted earlier in the same run are found too.
+
+A race is found by, in order: provider race id, meeting_url + race number,
+or normalised venue + AEST race date + race number.
+"""
+
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from table_stream import PAGE_SIZE, stream_pages
+
+AEST = ZoneInfo("Australia/Sydney")
+
+RACE_COLUMNS = (
+    "id, provider_race_id, meeting_name, meeting_url, race_number, race_time, "
+    "status, active_runner_count"
+)
+RUNNER_COLUMNS = "id, dog_name, box_number"
+
+
+def normalise_name(value: object) -> str:
+    """Normalise venue and runner names for cross-provider matching."""
+    return re.sub(r"[^a-z0-9]", "", str(value or "").lower())
+
+
+def race_date(race_time: Optional[str]) -> Optional[str]:
+    """The AEST calendar date of a race_time (ISO timestamp or YYYY-MM-DD)."""
+    if not race_time:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(race_time).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(AEST).strftime("%Y-%m-%d")
+
+
+class RaceIndex:
+    """In-memory map from race identities to stored race (and runner) ids.
+
+    Entries are dicts with the RACE_COLUMNS fields plus 'runners', a list of
+    {'id', 'dog_name', 'box_number'} or None when the runner ids are unknown
+    (e.g. after a write through the ingest_races RPC).
+    """
+
+    def __init__(self):
+        self.entries: Dict[int, Dict] = {}
+        self._by_provider: Dict[str, int] = {}
+        self._by_url: Dict[Tuple[str, int], int] = {}
+        self._by_natural: Dict[Tuple[str, str, int], int] = {}
+        self._by_venue: Dict[Tuple[str, int], List[int]] = {}
+        # Writer threads record into the index while the run reads from it.
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, client, start: str, end: str, page_size: int = PAGE_SIZE) -> "RaceIndex":
+        """Load races with start <= race_time <= end, a keyset page at a time."""
+        index = cls()
+        pages = stream_pages(
+            client,
+            "races",
+            f"{RACE_COLUMNS}, runners({RUNNER_COLUMNS})",
+            where=lambda query: query.gte("race_time", start).lte("race_time", end),
+            page_size=page_size,
+        )
+        for page in pages:
+            for row in page:
+                index.add(row)
+        print(f"Race index: {len(index)} races loaded ({start} to {end})")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def add(self, row: Dict) -> Dict:
+        """Index a races row. Rows without embedded runners get runners=None."""
+        with self._lock:
+            entry = self.entries.get(row["id"])
+            if entry is None:
+                entry = self.entries[row["id"]] = {"runners": None}
+            runners = row.get("runners")
+            entry.update({key: value for key, value in row.items() if key != "runners"})
+            if runners is not None:
+                entry["runners"] = list(runners)
+            self._index_keys(entry)
+            return entry
+
+    def _index_keys(self, entry: Dict) -> None:
+        race_id = entry["id"]
+        number = int(entry["race_number"])
+        if entry.get("provider_race_id"):
+            self._by_provider[str(entry["provider_race_id"])] = race_id
+        if entry.get("meeting_url"):
+            self._by_url[(entry["meeting_url"], number)] = race_id
+        venue = normalise_name(entry.get("meeting_name"))
+        date = race_date(entry.get("race_time"))
+        if date:
+            self._by_natural[(venue, date, number)] = race_id
+        ids = self._by_venue.setdefault((venue, number), [])
+        if race_id not in ids:
+            ids.append(race_id)
+
+    def find(self, race: Dict) -> Optional[Dict]:
+        """The stored entry for a scraped/provider race dict, if indexed."""
+        number = int(race["race_number"])
+        race_id = None
+        if race.get("provider_race_id"):
+            race_id = self._by_provider.get(str(race["provider_race_id"]))
+        if race_id is None and race.get("meeting_url"):
+            race_id = self._by_url.get((race["meeting_url"], number))
+        if race_id is None:
+            date = race.get("race_date") or race_date(race.get("race_time"))
+            race_id = self._by_natural.get(
+                (normalise_name(race.get("meeting_name")), date, number)
+            )
+        return self.entries.get(race_id) if race_id is not None else None
+
+    def candidates(self, meeting_name: str, race_number: int, meeting_url: Optional[str] = None) -> List[Dict]:
+        """Every indexed race that could be this meeting/number, newest first."""
+        ids = set(self._by_venue.get((normalise_name(meeting_name), int(race_number)), []))
+        if meeting_url and (meeting_url, int(race_number)) in self._by_url:
+            ids.add(self._by_url[(meeting_url, int(race_number))])
+        return sorted(
+            (self.entries[race_id] for race_id in ids),
+            key=lambda entry: entry["race_time"],
+            reverse=True,
+        )
+
+    def record(self, race: Dict, race_id: int, runners: Optional[Iterable[Dict]] = None) -> Dict:
+        """Keep the index current after the run wrote race_id for race."""
+        row = {
+            key: race.get(key)
+            for key in ("provider_race_id", "meeting_name", "meeting_url", "race_number",
+                        "race_time", "status", "active_runner_count")
+            if race.get(key) is not None
+        }
+        row["id"] = race_id
+        with self._lock:
+            entry = self.add(row)
+            if runners is not None:
+                entry["runners"] = [
+                    {key: runner[key] for key in ("id", "dog_name", "box_number")}
+                    for runner in runners
+                ]
+            elif entry["runners"] is not None and race.get("runners") is not None:
+                # ingest_races keeps runner ids per box, so loaded ids stay valid
+                # unless the field itself changed.
+                loaded = {(r["box_number"], r["dog_name"]) for r in entry["runners"]}
+                written = {(r["box_number"], r["dog_name"]) for r in race["runners"]}
+                if loaded != written:
+                    entry["runners"] = None
+            return entry
+
+    def set_runners(self, race_id: int, runners: List[Dict]) -> None:
+        with self._lock:
+            self.entries[race_id]["runners"] = runners
+
+    def missing_runners(self, race_ids: Iterable[int]) -> List[int]:
+        return [race_id for race_id in race_ids if self.entries[race_id]["runners"] is None]
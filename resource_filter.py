@@ -0,0 +1,275 @@
+"""
+Lean page loads for the scrapers.
+
+The scrapers only need a page's HTML, its scripts and the site's own JSON,
+but thegreyhoundrecorder pages also pull in images, fonts, ads and analytics,
+which cost bandwidth and keep `networkidle` waits from settling. A
+ResourceFilter routes every request of a browser context and
+
+- lets through the main document, anything on an allowed domain (the
+  Cloudflare challenge) and Cloudflare's /cdn-cgi/ paths on any host;
+- stubs requests to denied domains (ads, analytics, trackers): scripts get an
+  empty script and beacons an empty 204, so the page doesn't wait or retry;
+- aborts the blocked resource types (images, media and fonts by default);
+- with block_third_party, also stubs every other host that is not first party.
+
+Stylesheets are kept: the lazy-loaded form guide needs real layout to scroll.
+
+Each page's blocked requests, bytes received and load time are printed when
+it closes. What a blocked request would have cost is estimated from sample
+pages: the second page, and every sample_every-th after it, loads unfiltered
+and is measured, and its per-category sizes and load time become the
+baseline (DEFAULT_SIZES until the first sample). Received bytes come from Chromium's network events.
+
+Routing disables Playwright's HTTP cache for the context, so first-party
+scripts are re-fetched per page; the blocked resources outweigh them.
+
+Settings (comma-separated lists extend the defaults):
+    BROWSER_LEAN=0                    turn filtering off
+    BROWSER_BLOCK_TYPES=image,media,font
+    BROWSER_DENY_DOMAINS / BROWSER_ALLOW_DOMAINS
+    BROWSER_BLOCK_THIRD_PARTY=1       block all non-first-party hosts
+    BROWSER_LEAN_SAMPLE_EVERY=25      0 disables unfiltered samples
+"""
+
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+LEAN_ENABLED = os.environ.get("BROWSER_LEAN", "1") != "0"
+
+FIRST_PARTY_DOMAINS = ["thegreyhoundrecorder.com.au"]
+BLOCK_TYPES = ["image", "media", "font"]
+# Cloudflare's challenge widget; /cdn-cgi/ paths are always allowed too.
+ALLOW_DOMAINS = ["challenges.cloudflare.com"]
+DENY_DOMAINS = [
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "googletagservices.com",
+    "google-analytics.com", "googletagmanager.com", "adservice.google.com", "adtrafficquality.google",
+    "facebook.net", "facebook.com", "hotjar.com", "clarity.ms", "scorecardresearch.com",
+    "quantserve.com", "taboola.com", "outbrain.com", "amazon-adsystem.com", "adnxs.com",
+    "criteo.com", "criteo.net", "pubmatic.com", "rubiconproject.com", "casalemedia.com",
+    "openx.net", "moatads.com", "nr-data.net", "ads-twitter.com", "analytics.tiktok.com",
+    "bat.bing.com", "static.cloudflareinsights.com",
+]
+# Assumed sizes of blocked requests (bytes) until a sample page is measured.
+DEFAULT_SIZES = {"image": 30_000, "media": 200_000, "font": 40_000, "ads/analytics": 25_000, "third-party": 20_000}
+
+
+def _env_list(name: str, default: Iterable[str]) -> List[str]:
+    extra = [item.strip() for item in os.environ.get(name, "").split(",") if item.strip()]
+    return list(default) + extra
+
+
+def _matches(host: str, domains: Iterable[str]) -> bool:
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+def _kb(value: float) -> str:
+    return f"{value / 1024:.0f} KB" if value < 1024 * 1024 else f"{value / 1024 / 1024:.1f} MB"
+
+
+class PageLoad:
+    """What one page requested, blocked and received."""
+
+    def __init__(self, sample: bool):
+        self.sample = sample
+        self.blocked: Counter = Counter()
+        self.received = 0
+        # Bytes a sample page received per category the filter would block.
+        self.category_bytes: Counter = Counter()
+        self.category_counts: Counter = Counter()
+        self.load_seconds = 0.0
+        self._navigation_started: Optional[float] = None
+
+
+class ResourceFilter:
+    """Routes a context's requests; one filter per BrowserPool."""
+
+    def __init__(
+        self,
+        block_types: Iterable[str] = BLOCK_TYPES,
+        deny_domains: Iterable[str] = DENY_DOMAINS,
+        allow_domains: Iterable[str] = ALLOW_DOMAINS,
+        first_party: Iterable[str] = FIRST_PARTY_DOMAINS,
+        block_third_party: bool = False,
+        sample_every: int = 25,
+    ):
+        self.block_types = set(block_types)
+        self.deny_domains = list(deny_domains)
+        self.allow_domains = list(allow_domains)
+        self.first_party = list(first_party)
+        self.block_third_party = block_third_party
+        self.sample_every = sample_every
+        self._loads: Dict[int, PageLoad] = {}  # id(context) -> the page it is serving
+        self.pages = 0
+        self.blocked: Counter = Counter()
+        self.received = 0
+        self.saved_estimate = 0.0
+        self.lean_load_seconds: List[float] = []
+        self.sample_load_seconds: List[float] = []
+        self._sample_sizes: Dict[str, List[int]] = {}  # category -> [bytes, requests]
+
+    @classmethod
+    def from_env(cls) -> "ResourceFilter":
+        return cls(
+            block_types=[t.strip() for t in os.environ.get("BROWSER_BLOCK_TYPES", ",".join(BLOCK_TYPES)).split(",") if t.strip()],
+            deny_domains=_env_list("BROWSER_DENY_DOMAINS", DENY_DOMAINS),
+            allow_domains=_env_list("BROWSER_ALLOW_DOMAINS", ALLOW_DOMAINS),
+            block_third_party=os.environ.get("BROWSER_BLOCK_THIRD_PARTY") == "1",
+            sample_every=int(os.environ.get("BROWSER_LEAN_SAMPLE_EVERY", "25")),
+        )
+
+    def classify(self, url: str, resource_type: str, main_navigation: bool = False) -> Optional[str]:
+        """The category a request is blocked under, or None to let it through."""
+        host = (urlparse(url).hostname or "").lower()
+        if main_navigation or "/cdn-cgi/" in url or _matches(host, self.allow_domains):
+            return None
+        if _matches(host, self.deny_domains):
+            return "ads/analytics"
+        if self.block_third_party and host and not _matches(host, self.first_party):
+            return "third-party"
+        if resource_type in self.block_types:
+            return resource_type
+        return None
+
+    def attach(self, context) -> None:
+        """Route every request the context makes through the filter."""
+        key = id(context)
+        context.route("**/*", lambda route: self._route(route, key))
+
+    def _route(self, route, key: int) -> None:
+        request = route.request
+        load = self._loads.get(key)
+        try:
+            main_navigation = request.is_navigation_request() and request.frame.parent_frame is None
+        except Exception:
+            main_navigation = False
+        category = None if load is not None and load.sample else \
+            self.classify(request.url, request.resource_type, main_navigation)
+        if category is None:
+            route.continue_()
+            return
+        if load is not None:
+            load.blocked[category] += 1
+        if request.resource_type == "script":
+            route.fulfill(status=200, content_type="application/javascript", body="")
+        elif request.resource_type in ("xhr", "fetch", "ping", "beacon", "eventsource"):
+            route.fulfill(status=204, body="")
+        elif request.resource_type == "document":
+            route.fulfill(status=200, content_type="text/html", body="")
+        else:
+            route.abort("blockedbyclient")
+
+    def watch(self, page) -> PageLoad:
+        """Start measuring a page from a filtered context; pass the result to finish()."""
+        self.pages += 1
+        # The second page is the first sample, so short runs get a baseline.
+        load = PageLoad(sample=bool(self.sample_every) and (self.pages - 2) % self.sample_every == 0)
+        self._loads[id(page.context)] = load
+
+        def navigation(request):
+            if request.is_navigation_request() and request.frame == page.main_frame:
+                load._navigation_started = time.perf_counter()
+
+        def loaded(_):
+            if load._navigation_started is not None:
+                load.load_seconds += time.perf_counter() - load._navigation_started
+                load._navigation_started = None
+
+        page.on("request", navigation)
+        page.on("load", loaded)
+        self._measure_bytes(page, load)
+        return load
+
+    def _measure_bytes(self, page, load: PageLoad) -> None:
+        try:
+            session = page.context.new_cdp_session(page)
+            session.send("Network.enable")
+        except Exception:
+            # Not Chromium: fall back to declared response sizes.
+            page.on("response", lambda response: setattr(
+                load, "received", load.received + int(response.headers.get("content-length") or 0)))
+            return
+        categories: Dict[str, str] = {}
+
+        def response_received(event):
+            if load.sample:
+                category = self.classify(
+                    event["response"]["url"], event.get("type", "").lower(), event.get("type") == "Document")
+                if category is not None:
+                    categories[event["requestId"]] = category
+
+        def loading_finished(event):
+            size = int(event.get("encodedDataLength") or 0)
+            load.received += size
+            category = categories.pop(event["requestId"], None)
+            if category is not None:
+                load.category_bytes[category] += size
+                load.category_counts[category] += 1
+
+        session.on("Network.responseReceived", response_received)
+        session.on("Network.loadingFinished", loading_finished)
+
+    def _average_size(self, category: str) -> float:
+        measured = self._sample_sizes.get(category)
+        if measured and measured[1]:
+            return measured[0] / measured[1]
+        return DEFAULT_SIZES.get(category, DEFAULT_SIZES["third-party"])
+
+    def _baseline_seconds(self) -> Optional[float]:
+        if not self.sample_load_seconds:
+            return None
+        return sum(self.sample_load_seconds) / len(self.sample_load_seconds)
+
+    def finish(self, load: PageLoad, context) -> Tuple[int, float]:
+        """Record and print a page's numbers; returns (requests blocked, bytes saved estimate)."""
+        self._loads.pop(id(context), None)
+        self.received += load.received
+        if load.sample:
+            for category, size in load.category_bytes.items():
+                totals = self._sample_sizes.setdefault(category, [0, 0])
+                totals[0] += size
+                totals[1] += load.category_counts[category]
+            if load.load_seconds:
+                self.sample_load_seconds.append(load.load_seconds)
+            would_block = sum(load.category_counts.values())
+            print(
+                f"  Page load (unfiltered sample): {_kb(load.received)} received, "
+                f"{would_block} requests ({_kb(sum(load.category_bytes.values()))}) the filter would block, "
+                f"load {load.load_seconds:.1f}s"
+            )
+            return 0, 0.0
+        blocked = sum(load.blocked.values())
+        saved = sum(count * self._average_size(category) for category, count in load.blocked.items())
+        self.blocked.update(load.blocked)
+        self.saved_estimate += saved
+        if load.load_seconds:
+            self.lean_load_seconds.append(load.load_seconds)
+        breakdown = ", ".join(f"{count} {category}" for category, count in load.blocked.most_common())
+        timing = f"load {load.load_seconds:.1f}s"
+        baseline = self._baseline_seconds()
+        if baseline is not None and load.load_seconds:
+            timing += f" (~{baseline - load.load_seconds:.1f}s faster than unfiltered)"
+        print(
+            f"  Page load: blocked {blocked} requests ({breakdown or 'none'}), ~{_kb(saved)} saved, "
+            f"{_kb(load.received)} received, {timing}"
+        )
+        return blocked, saved
+
+    def print_summary(self) -> None:
+        if not self.pages:
+            return
+        lean = self.lean_load_seconds
+        line = (
+            f"Lean page loads: {sum(self.blocked.values())} requests blocked over {self.pages} pages, "
+            f"~{_kb(self.saved_estimate)} saved, {_kb(self.received)} received"
+        )
+        baseline = self._baseline_seconds()
+        if lean and baseline is not None:
+            line += (
+                f"; avg load {sum(lean) / len(lean):.1f}s vs {baseline:.1f}s unfiltered "
+                f"({len(self.sample_load_seconds)} sample pages)"
+            )
+        print(line)
@@ -0,0 +1,182 @@
+"""
+On-disk HTTP response cache for the provider APIs.
+
+Responses are keyed by URL and query parameters. A cached body is reused
+without a request while it is within its TTL; after that it is revalidated
+with If-None-Match / If-Modified-Since when the provider sent an ETag or
+Last-Modified header. If the provider is unreachable, an expired body is still
+served for a per-path grace period (stale_if_error) so a short outage does not
+empty the feed. Paths carrying live prices or scratchings should have none: a
+stale body would be written as current.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlencode, urlsplit
+
+import requests
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidated: int = 0
+    stale_served: int = 0
+    bytes_saved: int = 0
+
+
+class ResponseCache:
+    """File-backed cache in front of a ProviderClient."""
+
+    def __init__(
+        self,
+        directory: str,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = 0.0,
+        stale_if_error: Optional[Dict[str, float]] = None,
+        default_stale_if_error: float = 0.0,
+    ):
+        self.directory = directory
+        # Freshness lifetimes in seconds, keyed by URL path prefix.
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        # How long past its TTL a body may be served when the provider fails,
+        # keyed by URL path prefix like the TTLs.
+        self.stale_if_error = dict(stale_if_error or {})
+        self.default_stale_if_error = default_stale_if_error
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _for_path(url: str, settings: Dict[str, float], default: float) -> float:
+        path = urlsplit(url).path
+        for prefix, value in settings.items():
+            if path.startswith(prefix):
+                return value
+        return default
+
+    def _ttl(self, url: str) -> float:
+        return self._for_path(url, self.ttls, self.default_ttl)
+
+    def _stale_if_error(self, url: str) -> float:
+        return self._for_path(url, self.stale_if_error, self.default_stale_if_error)
+
+    @staticmethod
+    def cache_key(url: str, params=None) -> str:
+        query = urlencode(sorted((params or {}).items()), doseq=True)
+        return hashlib.sha256(f"{url}?{query}".encode()).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return f"{base}.json", f"{base}.body"
+
+    def _load(self, key: str):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, "rb") as body_file:
+                return meta, body_file.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _store(self, key: str, meta: Dict, body: Optional[bytes]) -> None:
+        meta_path, body_path = self._paths(key)
+        # Write to temporary files first so a crash never leaves a torn entry.
+        if body is not None:
+            with open(f"{body_path}.tmp", "wb") as body_file:
+                body_file.write(body)
+            os.replace(f"{body_path}.tmp", body_path)
+        with open(f"{meta_path}.tmp", "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def fetch(self, client, url: str, params=None, headers=None) -> bytes:
+        """Return the response body for a GET, from cache where allowed."""
+        key = self.cache_key(url, params)
+        meta, body = self._load(key)
+        now = time.time()
+        age = now - meta["fetched_at"] if meta else None
+        ttl = self._ttl(url)
+
+        if meta and age < ttl:
+            self._count(hits=1, bytes_saved=len(body))
+            return body
+
+        request_headers = dict(headers or {})
+        if meta and meta.get("etag"):
+            request_headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            request_headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = client.get(url, params=params, headers=request_headers)
+        except requests.RequestException as error:
+            if meta and age < ttl + self._stale_if_error(url):
+                print(
+                    f"Serving cached {urlsplit(url).path} ({age / 60:.0f} min old) "
+                    f"after provider error: {error}"
+                )
+                self._count(stale_served=1, bytes_saved=len(body))
+                return body
+            raise
+
+        if response.status_code == 304 and meta:
+            meta["fetched_at"] = now
+            self._store(key, meta, None)
+            self._count(revalidated=1, bytes_saved=len(body))
+            return body
+
+        body = response.content
+        self._store(
+            key,
+            {
+                "url": url,
+                "params": params or {},
+                "fetched_at": now,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            },
+            body,
+        )
+        self._count(misses=1)
+        return body
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def prune(self, max_age: float) -> int:
+        """Delete entries not refreshed within max_age seconds."""
+        removed = 0
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            meta, _ = self._load(key)
+            if meta and meta.get("fetched_at", 0) >= cutoff:
+                continue
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            removed += 1
+        return removed
+
+    def print_summary(self) -> None:
+        stats = self.stats
+        print(
+            f"HTTP cache: {stats.hits} hits, {stats.revalidated} revalidated, "
+            f"{stats.misses} misses, {stats.stale_served} stale served, "
+            f"{stats.bytes_saved:,} bytes saved"
+        )
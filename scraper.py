@@ -10,13 +10,39 @@ The existing Supabase schema is preserved for frontend compatibility.
 import os
 import sys
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
-from typing import List, Dict, Optional
-import requests
+from typing import List, Dict, Optional, Tuple
 from bs4 import BeautifulSoup
 from supabase import create_client, Client
 
+from pointsbet_models import (
+    MeetingGroup,
+    PriceRace,
+    RaceCard,
+    decode_meetings,
+    decode_price_races,
+    decode_race_cards,
+)
+from browser_pool import get_browser_pool
+from feed_snapshots import FeedSnapshots
+import history_archive
+from page_snapshots import PAGE_SNAPSHOTS
+from page_waits import (
+    element_text, is_marked_active, load_lazy_content, wait_for_dom_quiet, wait_for_load, wait_for_selector,
+    wait_for_text_change,
+)
+from provider_http import HostPolicy, ProviderClient
+from race_fingerprints import FingerprintStore, race_key
+from race_index import RaceIndex, normalise_name, race_date
+from response_cache import ResponseCache
+from supabase_metrics import SupabaseMetrics
+from supabase_writer import SupabaseWriter
+from table_stream import stream_pages
+from strategy_stats import CHUNK_SIZE as STATS_CHUNK_SIZE, refresh_race_stats
+from write_journal import WriteJournal
+
 # Sydney local time, including daylight-saving transitions.
 AEST = ZoneInfo("Australia/Sydney")
 
@@ -25,6 +51,66 @@ AEST = ZoneInfo("Australia/Sydney")
 FORM_GUIDE_URL = "https://www.thegreyhoundrecorder.com.au/form-guides/"
 POINTSBET_BASE_URL = "https://api.au.pointsbet.com"
 PUNTERS_EDGE_BASE_URL = "https://puntersedge.online/api"
+# PointsBet accepts up to 20 race IDs per race-card request. Several batches
+# are kept in flight at once; set POINTSBET_FETCH_CONCURRENCY=1 to fetch them
+# one at a time.
+POINTSBET_CARD_BATCH_SIZE = 20
+POINTSBET_FETCH_CONCURRENCY = int(os.environ.get("POINTSBET_FETCH_CONCURRENCY", "6"))
+# Races per ingest_races RPC call. A full programme is a handful of requests.
+INGEST_CHUNK_SIZE = 100
+# How far back settlement looks for a result that carries no race_date.
+SETTLEMENT_LOOKBACK_DAYS = 7
+# Race ids per runners query when settlement loads the runners it is missing.
+SETTLEMENT_RUNNER_CHUNK_SIZE = 100
+# Supabase writes run on a small worker pool that shares one request rate per
+# project (see supabase_writer).
+SUPABASE_WRITE_WORKERS = int(os.environ.get("SUPABASE_WRITE_WORKERS", "4"))
+SUPABASE_WRITES_PER_SECOND = float(os.environ.get("SUPABASE_WRITES_PER_SECOND", "10"))
+
+# One pooled client for every provider API. PuntersEdge retries are kept low
+# because each attempt counts against the free request allowance.
+PROVIDER_HTTP = ProviderClient(
+    {
+        "api.au.pointsbet.com": HostPolicy(timeout=(10, 45), max_retries=3),
+        "puntersedge.online": HostPolicy(timeout=(10, 30), max_retries=1),
+    },
+    pool_size=max(POINTSBET_FETCH_CONCURRENCY, 4),
+)
+
+# Local state kept between runs (restored by the workflow's cache step).
+INGEST_STATE_DIR = os.environ.get("INGEST_STATE_DIR", ".ingest_state")
+
+# Race cards and PuntersEdge's next-to-go list carry live prices, so they are
+# always revalidated; the meeting programme only changes when races are added
+# or rescheduled. Only the programme is served stale through a provider
+# outage: an old race card or price would be written to Supabase as current
+# (a scratched dog running again).
+RESPONSE_CACHE = ResponseCache(
+    os.path.join(INGEST_STATE_DIR, "http_cache"),
+    ttls={
+        "/api/racing/v4/meetings": 10 * 60,
+        "/api/racing/v3/races": 0,
+        "/api/v1/racing/next-to-go": 0,
+    },
+    stale_if_error={
+        "/api/racing/v4/meetings": 6 * 3600,
+    },
+)
+# Race cards and settlements are journaled locally before they are sent, so a
+# crash or Supabase outage mid-run loses nothing; the next run drains them.
+WRITE_JOURNAL = WriteJournal(os.path.join(INGEST_STATE_DIR, "write_journal.sqlite3"))
+# Bytes, latency and rows of every Supabase request, saved per run for
+# check_egress_usage.py.
+SUPABASE_METRICS = SupabaseMetrics(os.path.join(INGEST_STATE_DIR, "metrics"))
+# Settled races are also merged into a local Parquet archive when this is set
+# (needs pyarrow; see history_archive.py).
+HISTORY_ARCHIVE_DIR = os.environ.get("HISTORY_ARCHIVE_DIR")
+# Static upcoming/history feed files for the frontend (see feed_snapshots.py);
+# FEED_SNAPSHOT_BUCKET= (empty) keeps them local only.
+FEED_SNAPSHOTS = FeedSnapshots(
+    os.environ.get("FEED_SNAPSHOT_DIR", os.path.join(INGEST_STATE_DIR, "feeds")),
+    bucket=os.environ.get("FEED_SNAPSHOT_BUCKET", "feeds") or None,
+)
 
 # Initialize Supabase client
 # Fallback for dev/local scripts if env vars missing
@@ -49,16 +135,35 @@ def get_supabase():
         print("ERROR: SUPABASE_URL and SUPABASE_KEY environment variables must be set")
         sys.exit(1)
         
-    supabase = create_client(url, key)
+    supabase = SUPABASE_METRICS.instrument(create_client(url, key))
     return supabase
 
+
+supabase_writer: Optional[SupabaseWriter] = None
+
+def get_writer() -> SupabaseWriter:
+    """The shared Supabase writer pool, created on first use."""
+    global supabase_writer
+    if supabase_writer is None:
+        client = get_supabase()
+        supabase_writer = SupabaseWriter(
+            client,
+            str(getattr(client, 'supabase_url', '')),
+            workers=SUPABASE_WRITE_WORKERS,
+            requests_per_second=SUPABASE_WRITES_PER_SECOND,
+        )
+    return supabase_writer
+
 # Initialize on module load ONLY if we are running as main, 
 # OR just let it be lazy? 
 # Existing code expects `supabase` variable to exist.
 # We will initialize it immediately but with fallback if missing, 
 # OR we update usage sites. 
 # Updating usage sites is safer.
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if (SUPABASE_URL and SUPABASE_KEY) else None
+supabase = (
+    SUPABASE_METRICS.instrument(create_client(SUPABASE_URL, SUPABASE_KEY))
+    if (SUPABASE_URL and SUPABASE_KEY) else None
+)
 
 
 def _iso_utc(value: datetime) -> str:
@@ -66,11 +171,6 @@ def _iso_utc(value: datetime) -> str:
     return value.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
 
 
-def _normalise_name(value: object) -> str:
-    """Normalise venue and runner names for cross-provider matching."""
-    return re.sub(r"[^a-z0-9]", "", str(value or "").lower())
-
-
 def _parse_utc(value: Optional[str]) -> Optional[datetime]:
     if not value:
         return None
@@ -83,112 +183,151 @@ def _parse_utc(value: Optional[str]) -> Optional[datetime]:
         return None
 
 
-def _api_get(base_url: str, path: str, params=None, headers=None):
-    """Fetch JSON with a bounded timeout and a useful source-specific error."""
-    url = f"{base_url}{path}"
-    response = requests.get(url, params=params, headers=headers or {}, timeout=45)
-    response.raise_for_status()
-    print(f"HTTP {response.status_code} {path}; bytes={len(response.content)}")
-    return response.json()
-
-
-def _extract_distance(race: Dict, summary: Dict) -> Optional[int]:
-    """Handle the distance variants seen across PointsBet race responses."""
-    for source in (race, summary):
-        for key in ("distance", "distanceMeters", "raceDistance", "raceDistanceMeters"):
-            value = source.get(key)
-            if isinstance(value, dict):
-                value = (
-                    value.get("metres")
-                    or value.get("meters")
-                    or value.get("value")
-                )
-            if value is None:
-                continue
-            match = re.search(r"\d+", str(value))
-            if match:
-                return int(match.group())
-    return None
+def _api_get(base_url: str, path: str, params=None, headers=None) -> bytes:
+    """Fetch a raw JSON body through the response cache and provider client.
+
+    Callers decode the bytes with the typed decoders in pointsbet_models.
+    """
+    return RESPONSE_CACHE.fetch(PROVIDER_HTTP, f"{base_url}{path}", params, headers)
+
+
+def _card_batches(summaries: Dict[str, Dict]) -> List[List[str]]:
+    """Pack whole meetings into race-card batches of at most 20 race IDs.
 
+    Keeping a meeting's races together means a batch's URL only changes when
+    one of its own races jumps, so unchanged batches stay cacheable between
+    runs instead of every batch shifting along by one race.
+    """
+    meetings: Dict[tuple, List[str]] = {}
+    for race_id, summary in summaries.items():
+        meeting_key = (summary.get("meeting_name"), str(summary.get("race_time"))[:10])
+        meetings.setdefault(meeting_key, []).append(race_id)
+
+    batches: List[List[str]] = []
+    current: List[str] = []
+    for race_ids in meetings.values():
+        for offset in range(0, len(race_ids), POINTSBET_CARD_BATCH_SIZE):
+            chunk = race_ids[offset:offset + POINTSBET_CARD_BATCH_SIZE]
+            if len(current) + len(chunk) > POINTSBET_CARD_BATCH_SIZE:
+                batches.append(current)
+                current = []
+            current.extend(chunk)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _fetch_pointsbet_cards(
+    batches: List[List[str]], headers: Dict, concurrency: Optional[int] = None
+) -> List[RaceCard]:
+    """Fetch race-card batches, several at once, returned in request order."""
+    if not batches:
+        return []
 
-def fetch_pointsbet_races() -> List[Dict]:
-    """Fetch every upcoming Australian greyhound race for today and tomorrow."""
+    def fetch_batch(batch_ids: List[str]) -> List[RaceCard]:
+        return decode_race_cards(_api_get(
+            POINTSBET_BASE_URL,
+            "/api/racing/v3/races",
+            {"raceIds": ",".join(batch_ids)},
+            headers,
+        ))
+
+    workers = max(1, min(concurrency or POINTSBET_FETCH_CONCURRENCY, len(batches)))
+    # Executor.map yields results in submission order, so the card list matches
+    # the sequential fetch exactly. A failed batch re-raises here as before.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        payloads = list(pool.map(fetch_batch, batches))
+
+    return [card for batch in payloads for card in batch]
+
+
+# Browser-like headers accepted by the public PointsBet racing API.
+POINTSBET_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "en-AU,en;q=0.9",
+    "Origin": "https://pointsbet.com.au",
+    "Referer": "https://pointsbet.com.au/",
+}
+
+
+def fetch_pointsbet_programme() -> Dict[str, Dict]:
+    """Fetch today's and tomorrow's upcoming race summaries, keyed by raceId."""
     now_utc = datetime.now(timezone.utc)
     local_now = now_utc.astimezone(AEST)
     local_start = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
     local_end = local_start + timedelta(days=2)
 
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "application/json, text/plain, */*",
-        "Accept-Language": "en-AU,en;q=0.9",
-        "Origin": "https://pointsbet.com.au",
-        "Referer": "https://pointsbet.com.au/",
-    }
-    payload = _api_get(
+    groups = decode_meetings(_api_get(
         POINTSBET_BASE_URL,
         "/api/racing/v4/meetings",
         {"startDate": _iso_utc(local_start), "endDate": _iso_utc(local_end)},
-        headers,
-    )
-    groups = payload if isinstance(payload, list) else payload.get("meetings", [])
+        POINTSBET_HEADERS,
+    ))
+    return _programme_summaries(groups, now_utc)
 
+
+def _programme_summaries(groups: List[MeetingGroup], now_utc: datetime) -> Dict[str, Dict]:
+    """Australian greyhound race summaries from decoded meeting groups, keyed by raceId."""
     summaries: Dict[str, Dict] = {}
     for group in groups:
-        if not isinstance(group, dict):
-            continue
-        for meeting in group.get("meetings") or []:
-            if meeting.get("racingType") != 4 or meeting.get("countryCode") != "AUS":
+        for meeting in group.meetings or []:
+            if meeting.racing_type != 4 or meeting.country_code != "AUS":
                 continue
-            for race in meeting.get("races") or []:
-                race_id = race.get("raceId")
-                start = race.get("advertisedStartDateTimeUtc")
+            for race in meeting.races or []:
+                start = race.advertised_start_date_time_utc
                 start_dt = _parse_utc(start)
                 # Do not overwrite previously resulted rows. A short grace period
                 # keeps a just-jumped race stable during an hourly run.
-                if not race_id or not start_dt or start_dt < now_utc - timedelta(minutes=20):
+                if not race.race_id or not start_dt or start_dt < now_utc - timedelta(minutes=20):
                     continue
-                summaries[str(race_id)] = {
-                    **race,
-                    "meeting_name": meeting.get("venue") or meeting.get("name"),
-                    "race_number": race.get("raceNumber"),
+                # Only the fields the card builder falls back on are kept.
+                summaries[str(race.race_id)] = {
+                    "meeting_name": meeting.venue or meeting.name,
+                    "race_number": race.race_number,
                     "race_time": start,
+                    "distance_meters": race.distance_metres(),
                 }
+    return summaries
+
+
+def fetch_pointsbet_races(summaries: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+    """Fetch race cards for every upcoming Australian greyhound race.
+
+    Pass a subset of fetch_pointsbet_programme() summaries to refresh only
+    those races; by default the whole two-day programme is fetched.
+    """
+    if summaries is None:
+        summaries = fetch_pointsbet_programme()
 
     race_ids = list(summaries)
     print(f"PointsBet upcoming Australian greyhound races: {len(race_ids)}")
-    cards: List[Dict] = []
-    for offset in range(0, len(race_ids), 20):
-        batch = _api_get(
-            POINTSBET_BASE_URL,
-            "/api/racing/v3/races",
-            {"raceIds": ",".join(race_ids[offset:offset + 20])},
-            headers,
-        )
-        if isinstance(batch, list):
-            cards.extend(batch)
-        elif isinstance(batch, dict) and isinstance(batch.get("races"), list):
-            cards.extend(batch["races"])
-        elif isinstance(batch, dict) and batch.get("raceId"):
-            cards.append(batch)
+    cards = _fetch_pointsbet_cards(_card_batches(summaries), POINTSBET_HEADERS)
+    races = _build_races(cards, summaries)
+    if len(races) != len(race_ids):
+        print(f"WARNING: requested {len(race_ids)} race cards but prepared {len(races)}")
+    return races
+
 
+def _build_races(cards: List[RaceCard], summaries: Dict[str, Dict]) -> List[Dict]:
+    """Race dicts (with runners) from decoded race cards and their programme summaries."""
     races: List[Dict] = []
     for card in cards:
-        summary = summaries.get(str(card.get("raceId")), {})
-        meeting_name = card.get("venue") or summary.get("meeting_name")
-        race_number = card.get("number") or card.get("raceNumber") or summary.get("race_number")
+        summary = summaries.get(str(card.race_id), {})
+        meeting_name = card.venue or summary.get("meeting_name")
+        race_number = card.number or card.race_number or summary.get("race_number")
         race_time = (
-            card.get("advertisedStartTimeUtc")
-            or card.get("advertisedStartDateTimeUtc")
+            card.advertised_start_time_utc
+            or card.advertised_start_date_time_utc
             or summary.get("race_time")
         )
         if not meeting_name or not race_number or not race_time:
-            print(f"Skipping incomplete PointsBet race card: raceId={card.get('raceId')}")
+            print(f"Skipping incomplete PointsBet race card: raceId={card.race_id}")
             continue
 
         runners = []
-        for source_runner in card.get("runners") or []:
-            box = source_runner.get("number") or source_runner.get("barrier")
+        for source_runner in card.runners or []:
+            box = source_runner.number or source_runner.barrier
             try:
                 box = int(box)
             except (TypeError, ValueError):
@@ -197,12 +336,14 @@ def fetch_pointsbet_races() -> List[Dict]:
             # them also keeps the frontend's runner count consistent.
             if not 1 <= box <= 8:
                 continue
-            dog_name = source_runner.get("runnerName") or source_runner.get("name")
+            dog_name = source_runner.runner_name or source_runner.name
             if not dog_name:
                 continue
-            if "vacant" in str(dog_name).lower():
+            if "vacant" in dog_name.lower():
                 continue
-            pointsbet_price = (source_runner.get("fluctuations") or {}).get("current")
+            pointsbet_price = (
+                source_runner.fluctuations.current if source_runner.fluctuations else None
+            )
             try:
                 pointsbet_price = float(pointsbet_price)
             except (TypeError, ValueError):
@@ -214,35 +355,33 @@ def fetch_pointsbet_races() -> List[Dict]:
                 # It now displays the accessible PointsBet fixed-win price.
                 "ghr_odds": pointsbet_price,
                 "sportsbet_odds": None,
-                "is_scratched": bool(source_runner.get("isScratched", False)),
+                "is_scratched": bool(source_runner.is_scratched),
             })
 
         active_count = sum(1 for runner in runners if not runner["is_scratched"])
         races.append({
+            "provider_race_id": str(card.race_id),
             "meeting_name": meeting_name,
-            "meeting_url": (
-                f"{POINTSBET_BASE_URL}/api/racing/v3/races?raceIds={card.get('raceId')}"
-            ),
+            # Reserved for Greyhound Recorder form-guide URLs; PointsBet races
+            # are identified by provider_race_id instead.
+            "meeting_url": None,
             "race_number": int(race_number),
             "race_time": race_time,
-            "distance_meters": _extract_distance(card, summary),
+            "distance_meters": card.distance_metres() or summary.get("distance_meters"),
             "status": "upcoming",
             "active_runner_count": active_count,
             "runners": runners,
         })
-
-    if len(races) != len(race_ids):
-        print(f"WARNING: requested {len(race_ids)} race cards but prepared {len(races)}")
     return races
 
 
-def fetch_puntersedge_races() -> List[Dict]:
+def fetch_puntersedge_races() -> List[PriceRace]:
     """Fetch the maximum supported next-to-go greyhound price window."""
     api_key = os.environ.get("PUNTERS_EDGE_API_KEY")
     if not api_key:
         print("PUNTERS_EDGE_API_KEY is not set; continuing without Sportsbet prices")
         return []
-    payload = _api_get(
+    return decode_price_races(_api_get(
         PUNTERS_EDGE_BASE_URL,
         "/v1/racing/next-to-go",
         {"categories": "greyhound", "num_races": 50},
@@ -251,30 +390,23 @@ def fetch_puntersedge_races() -> List[Dict]:
             "Accept": "application/json",
             "User-Agent": "mutts-greyhound-feed/1.0",
         },
-    )
-    if isinstance(payload, list):
-        return payload
-    if isinstance(payload, dict):
-        for key in ("races", "events", "data", "results"):
-            if isinstance(payload.get(key), list):
-                return payload[key]
-    return []
+    ))
 
 
-def enrich_sportsbet_prices(races: List[Dict], price_races: List[Dict]) -> int:
+def enrich_sportsbet_prices(races: List[Dict], price_races: List[PriceRace]) -> int:
     """Merge only genuine Sportsbet prices into the legacy frontend field."""
     by_race = {}
     for price_race in price_races:
         key = (
-            _normalise_name(price_race.get("venue")),
-            int(price_race.get("race_number") or 0),
+            normalise_name(price_race.venue),
+            int(price_race.race_number or 0),
         )
         by_race.setdefault(key, []).append(price_race)
 
     enriched_runners = 0
     enriched_races = 0
     for race in races:
-        key = (_normalise_name(race["meeting_name"]), int(race["race_number"]))
+        key = (normalise_name(race["meeting_name"]), int(race["race_number"]))
         candidates = by_race.get(key, [])
         if not candidates:
             continue
@@ -282,18 +414,18 @@ def enrich_sportsbet_prices(races: List[Dict], price_races: List[Dict]) -> int:
         price_race = min(
             candidates,
             key=lambda item: abs(
-                ((_parse_utc(item.get("start_time")) or race_time) - race_time).total_seconds()
+                ((_parse_utc(item.start_time) or race_time) - race_time).total_seconds()
             ) if race_time else 0,
         )
 
         prices_by_name = {}
-        for price_runner in price_race.get("runners") or []:
+        for price_runner in price_race.runners or []:
             sportsbet = next(
                 (
-                    bookmaker.get("win_price")
-                    for bookmaker in price_runner.get("bookmakers") or []
-                    if str(bookmaker.get("key", "")).lower() == "sportsbet"
-                    and bookmaker.get("win_price") is not None
+                    bookmaker.win_price
+                    for bookmaker in price_runner.bookmakers or []
+                    if str(bookmaker.key or "").lower() == "sportsbet"
+                    and bookmaker.win_price is not None
                 ),
                 None,
             )
@@ -303,14 +435,17 @@ def enrich_sportsbet_prices(races: List[Dict], price_races: List[Dict]) -> int:
                 sportsbet = float(sportsbet)
             except (TypeError, ValueError):
                 continue
-            prices_by_name[_normalise_name(price_runner.get("name"))] = sportsbet
+            prices_by_name[normalise_name(price_runner.name)] = sportsbet
+
+        if price_race.race_id or price_race.id:
+            race["puntersedge_race_id"] = str(price_race.race_id or price_race.id)
 
         race_enriched = 0
         for runner in race["runners"]:
             # Provider runner numbers are not guaranteed to represent the same
             # box. Match the dog itself so a valid price cannot land on the
             # wrong runner merely because the numbering conventions differ.
-            price = prices_by_name.get(_normalise_name(runner["dog_name"]))
+            price = prices_by_name.get(normalise_name(runner["dog_name"]))
             if price is not None:
                 runner["sportsbet_odds"] = price
                 race_enriched += 1
@@ -328,90 +463,61 @@ def enrich_sportsbet_prices(races: List[Dict], price_races: List[Dict]) -> int:
 
 def fetch_page(url: str) -> Optional[BeautifulSoup]:
     """Fetch and parse a web page using Playwright to bypass WAF"""
+    if PAGE_SNAPSHOTS.replay:
+        parts = PAGE_SNAPSHOTS.load(url)
+        return BeautifulSoup(parts['html'], 'lxml') if parts and 'html' in parts else None
     try:
-        with sync_playwright() as p:
-            # Use the runner's genuine Google Chrome in headed mode.
-            browser = p.chromium.launch(
-                channel='chrome',
-                headless=False,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--window-size=1920,1080',
-                    '--start-maximized'
-                ]
-            )
-            
-            # Create context with realistic attributes
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                locale='en-AU',
-                timezone_id='Australia/Sydney',
-                has_touch=False,
-                is_mobile=False,
-                permissions=['geolocation'],
-                geolocation={'latitude': -33.8688, 'longitude': 151.2093}, # Sydney
-            )
-            
-            page = context.new_page()
+        # The shared pool's genuine-Chrome profile (see browser_pool.py)
+        pool = get_browser_pool("chrome")
+        with pool.page() as page:
             
             # Use Chrome's genuine browser fingerprint rather than overriding native properties.
             
             print(f"Navigating to {url} (Headed Mode)...")
             
+            cleared = False
             try:
-                # 1. Visit homepage first
-                if 'form-guides' in url:
+                # 1. Visit homepage first, staying until it has loaded, unless the
+                # context already holds Cloudflare clearance from an earlier page or run
+                cleared = pool.session is not None and pool.session.has_clearance(page.context, url)
+                if 'form-guides' in url and not cleared:
                     page.goto("https://www.thegreyhoundrecorder.com.au", timeout=45000, wait_until='domcontentloaded')
-                    page.wait_for_timeout(3000) # Human pause
+                    wait_for_load(page, 'homepage load')
                 
                 # 2. Go to target
                 page.goto(url, timeout=60000, wait_until='domcontentloaded')
 
                 # Cloudflare may briefly show a browser-check page before allowing access.
                 # Give it up to 60 seconds to resolve before checking for race content.
-                for attempt in range(12):
-                    if 'checking your browser' not in page.title().lower():
-                        break
-                    print(f"Cloudflare browser check in progress ({attempt + 1}/12)...")
-                    page.wait_for_timeout(5000)
+                if 'checking your browser' in page.title().lower():
+                    if cleared:
+                        # The saved clearance has expired; the check below renews it.
+                        pool.session.expire()
+                    print("Cloudflare browser check in progress...")
+                    try:
+                        page.wait_for_function(
+                            "() => !document.title.toLowerCase().includes('checking your browser')",
+                            timeout=60000,
+                        )
+                    except Exception:
+                        pass
 
                 # 3. Wait for content to load - CRITICAL: Wait for the actual table with runner data
-                # The page uses JavaScript to populate the tables, so we need to wait for them
-                try:
-                    # Wait for the table element that contains runner data
-                    page.wait_for_selector('table.form-guide-event__table', timeout=15000)
-                    # Give extra time for all JavaScript to finish rendering
-                    page.wait_for_timeout(2000)
-                except:
+                # The page uses JavaScript to populate the tables, so we wait for the
+                # table and then for rendering to settle
+                if wait_for_selector(page, 'table.form-guide-event__table', 'form guide table'):
+                    wait_for_dom_quiet(page, 'render settle')
+                else:
                     # Fallback to just wait for body if specific element missing
                     page.wait_for_selector('body', timeout=5000)
                 
-                # 4. Scroll to load all lazy-loaded races
-                # The site loads race events progressively as the user scrolls down.
-                # We scroll incrementally and wait for new content to appear each time.
+                # 4. Load all lazy-loaded races
+                # The site loads race events progressively as the user scrolls down;
+                # each scroll step ends as soon as new events are added to the DOM.
                 if 'fields' in url:
                     print("Scrolling to trigger lazy-loaded races...")
-                    prev_race_count = 0
-                    for scroll_attempt in range(20):  # Up to 20 scroll steps
-                        page.evaluate("window.scrollBy(0, 800)")
-                        page.wait_for_timeout(800)
-                        current_count = page.evaluate("document.querySelectorAll('.form-guide-field-event').length")
-                        if current_count > prev_race_count:
-                            print(f"  Scroll {scroll_attempt+1}: loaded {current_count} races so far...")
-                            prev_race_count = current_count
-                        # Check if we've reached the bottom
-                        at_bottom = page.evaluate(
-                            "(window.innerHeight + window.scrollY) >= document.body.scrollHeight - 100"
-                        )
-                        if at_bottom and current_count == prev_race_count:
-                            print(f"  Reached bottom with {current_count} races total.")
-                            break
-                    # Scroll back to top so page state is consistent
-                    page.evaluate("window.scrollTo(0, 0)")
-                    page.wait_for_timeout(500)
+                    race_count = load_lazy_content(page, '.form-guide-field-event')
+                    print(f"  Reached bottom with {race_count} races total.")
                 
                 print("Content loaded successfully!")
                 
@@ -426,6 +532,8 @@ def fetch_page(url: str) -> Optional[BeautifulSoup]:
                 or 'challenges.cloudflare.com' in content_lower
                 or 'cf-turnstile' in content_lower
             ):
+                if cleared and pool.session is not None:
+                    pool.session.expire()
                 raise RuntimeError(
                     "Cloudflare browser check did not resolve after 60 seconds"
                 )
@@ -433,8 +541,7 @@ def fetch_page(url: str) -> Optional[BeautifulSoup]:
             # Debug: Screenshot if it fails (stored in memory/logs if we could)
             # page.screenshot(path="debug_screenshot.png")
             
-            browser.close()
-            
+            PAGE_SNAPSHOTS.record(url, {'html': content})
             return BeautifulSoup(content, 'lxml')
             
     except Exception as e:
@@ -602,8 +709,6 @@ def scrape_meeting_results(meeting_url: str, meeting_name: str) -> List[Dict]:
     Clicks through all race navigation buttons to get results for all races.
     Skips meetings where all Starting Prices are $0.
     """
-    results = []
-    
     # Convert fields URL to results URL
     # Old format: /form-guides/angle-park/fields/250176/ -> /results/angle-park/250176/
     # New format: /form-guides/sale-20260318/fields/    -> /results/sale/20260318/
@@ -615,16 +720,32 @@ def scrape_meeting_results(meeting_url: str, meeting_name: str) -> List[Dict]:
         date_part = new_fmt_match.group(2)
         results_url = f"https://www.thegreyhoundrecorder.com.au/results/{track_part}/{date_part}/"
     
-    from playwright.sync_api import sync_playwright
+    if PAGE_SNAPSHOTS.replay:
+        return _replay_meeting_results(results_url, meeting_name)
+    snapshot: Dict[str, str] = {}
+    results, complete = _scrape_results_page(results_url, meeting_name, snapshot)
+    # A failed or partial scrape is not recorded, so replay keeps the last good one.
+    if complete and results:
+        PAGE_SNAPSHOTS.record(results_url, snapshot)
+    return results
+
+
+def _scrape_results_page(
+    results_url: str, meeting_name: str, snapshot: Dict[str, str]
+) -> Tuple[List[Dict], bool]:
+    """Click through a results page's races; records each rendered race into snapshot.
+
+    Returns (results, complete); complete is False if any race or the page failed.
+    """
+    results = []
+    complete = True
     
-    with sync_playwright() as p:
+    with get_browser_pool("chromium").page() as page:
         try:
-            browser = p.chromium.launch(headless=False)
-            page = browser.new_page()
-            
             print(f"Navigating to {results_url}...", flush=True)
             page.goto(results_url, wait_until='networkidle', timeout=30000)
-            page.wait_for_timeout(2000)
+            wait_for_selector(page, '.meeting-events-nav__item, table.results-event__table', 'results page')
+            snapshot['page'] = page.content()
             
             # Find all race navigation items
             # Based on inspection, they are divs with class 'meeting-events-nav__item' inside 'nav.meeting-events-nav'
@@ -655,8 +776,7 @@ def scrape_meeting_results(meeting_url: str, meeting_name: str) -> List[Dict]:
                     if race_data:
                         results.append(race_data)
                 
-                browser.close()
-                return results
+                return results, complete
             
             # Click through each race button
             for i in range(num_races):
@@ -682,10 +802,13 @@ def scrape_meeting_results(meeting_url: str, meeting_name: str) -> List[Dict]:
                         # But we need to ensure we are ON race 1.
                         
                         try:
-                            # Force click or just click
+                            # Wait for the table to switch to the clicked race,
+                            # unless the race is already the one shown
+                            before = element_text(page, 'table.results-event__table')
+                            active = is_marked_active(button)
                             button.click(timeout=2000)
-                            # Increase wait time to ensure table loads
-                            page.wait_for_timeout(3000)
+                            if not active:
+                                wait_for_text_change(page, 'table.results-event__table', before)
                         except Exception as click_err:
                             # If click fails (e.g. pointer-events: none), it might be the active one
                             print(f"    Click validation: {click_err} (might be active race)")
@@ -693,6 +816,7 @@ def scrape_meeting_results(meeting_url: str, meeting_name: str) -> List[Dict]:
                         
                         # Get updated content
                         html = page.content()
+                        snapshot[f'race/{race_num}'] = html
                         from bs4 import BeautifulSoup
                         soup = BeautifulSoup(html, 'html.parser')
                         
@@ -709,15 +833,30 @@ def scrape_meeting_results(meeting_url: str, meeting_name: str) -> List[Dict]:
                 
                 except Exception as e:
                     print(f"  Error scraping race {i+1}: {e}")
+                    complete = False
                     continue
             
-            browser.close()
-            
         except Exception as e:
             print(f"Error with Playwright for {meeting_name}: {e}")
-            if 'browser' in locals():
-                browser.close()
+            complete = False
     
+    return results, complete
+
+
+def _replay_meeting_results(results_url: str, meeting_name: str) -> List[Dict]:
+    """scrape_meeting_results from the latest recorded snapshot of the results page."""
+    parts = PAGE_SNAPSHOTS.load(results_url)
+    if not parts:
+        return []
+    races = sorted((int(part.split('/', 1)[1]), html) for part, html in parts.items() if part.startswith('race/'))
+    if not races and 'page' in parts:
+        races = [(1, parts['page'])]
+    results = []
+    for race_num, html in races:
+        table = BeautifulSoup(html, 'html.parser').select_one('table.results-event__table')
+        race_data = parse_result_table(table, meeting_name, race_num) if table else None
+        if race_data:
+            results.append(race_data)
     return results
 
 
@@ -1040,177 +1179,369 @@ def scrape_form_guides() -> List[Dict]:
     return all_races
 
 
-def upsert_race_data(race_data: Dict) -> None:
-    """Upsert race and runner data to Supabase"""
-    try:
-        # Prepare race data (without runners)
-        race_record = {
-            'meeting_name': race_data['meeting_name'],
-            'meeting_url': race_data['meeting_url'],
-            'race_number': race_data['race_number'],
-            'race_time': race_data['race_time'],
-            'distance_meters': race_data.get('distance_meters'),
-            'status': race_data['status'],
-            'active_runner_count': race_data['active_runner_count']
-        }
-        
-        # Upsert race (conflict on meeting_name + race_number + date)
-        # This allows same meeting/race on different dates but prevents duplicates on same date
-        race_datetime = datetime.fromisoformat(race_data['race_time'])
-        race_date_start = race_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
-        race_date_end = race_datetime.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        # Delete existing race with same meeting, race number, and date
-        supabase.table('races').delete().match({
-            'meeting_name': race_data['meeting_name'],
-            'race_number': race_data['race_number']
-        }).gte('race_time', race_date_start.isoformat()).lte('race_time', race_date_end.isoformat()).execute()
-        
-        # Insert the race
-        result = supabase.table('races').insert(race_record).execute()
-        
-        if not result.data:
-            print(f"Error upserting race: {race_data['meeting_name']} R{race_data['race_number']}")
-            return
-        
-        race_id = result.data[0]['id']
-        
-        # Delete existing runners for this race (to handle scratchings)
-        supabase.table('runners').delete().eq('race_id', race_id).execute()
-        
-        # Insert all runners in one request. This preserves the frontend schema
-        # while avoiding thousands of individual HTTP writes per full programme.
-        runner_records = []
-        for runner in race_data['runners']:
-            runner_records.append({
-                'race_id': race_id,
+def _race_payload(race_data: Dict) -> Dict:
+    """Race and runner columns in the shape the ingest_races RPC expects."""
+    return {
+        'provider_race_id': race_data.get('provider_race_id'),
+        'puntersedge_race_id': race_data.get('puntersedge_race_id'),
+        'meeting_name': race_data['meeting_name'],
+        'meeting_url': race_data.get('meeting_url'),
+        'race_number': race_data['race_number'],
+        'race_time': race_data['race_time'],
+        'distance_meters': race_data.get('distance_meters'),
+        'status': race_data['status'],
+        'active_runner_count': race_data['active_runner_count'],
+        'runners': [
+            {
                 'dog_name': runner['dog_name'],
                 'box_number': runner['box_number'],
-                'ghr_odds': runner['ghr_odds'],
-                'sportsbet_odds': runner['sportsbet_odds'],
-                'is_scratched': runner['is_scratched']
-            })
-        if runner_records:
-            supabase.table('runners').insert(runner_records).execute()
-        
-        print(f"Upserted: {race_data['meeting_name']} R{race_data['race_number']}")
-        
-    except Exception as e:
-        print(f"Error upserting race data: {e}")
+                'ghr_odds': runner.get('ghr_odds'),
+                'sportsbet_odds': runner.get('sportsbet_odds'),
+                'is_scratched': runner['is_scratched'],
+            }
+            for runner in race_data['runners']
+        ],
+    }
 
 
-def update_race_results(race_results: Dict):
-    """Update race with results data (SP, finishing positions, top_2_in_top_2)"""
+def _ingest_chunk(client, chunk: List[Dict], index: Optional[RaceIndex] = None) -> List[Dict]:
+    """Send one chunk through the ingest_races RPC; raises if the request fails.
+
+    Returns one status per race, in order:
+    {'ok': bool, 'race_id': int | None, 'result': str, 'error': str | None}.
+    """
+    response = client.rpc(
+        'ingest_races', {'payload': [_race_payload(race) for race in chunk]}
+    ).execute()
+    rows = {row['item_index']: row for row in response.data or []}
+
+    statuses: List[Dict] = []
+    for position, race in enumerate(chunk):
+        row = rows.get(position) or {'race_id': None, 'result': 'error', 'error': 'no status returned'}
+        ok = row['result'] != 'error'
+        if ok:
+            print(f"Upserted: {race['meeting_name']} R{race['race_number']}")
+            if index is not None:
+                index.record(race, row['race_id'])
+        else:
+            print(f"Error upserting race: {race['meeting_name']} R{race['race_number']}: {row['error']}")
+        statuses.append({
+            'ok': ok,
+            'race_id': row['race_id'],
+            'result': row['result'],
+            'error': row['error'],
+        })
+    return statuses
+
+
+def upsert_races_bulk(
+    races: List[Dict],
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    index: Optional[RaceIndex] = None,
+) -> List[Dict]:
+    """Write races and their runners through the ingest_races RPC.
+
+    Each chunk is one PostgREST request. Returns one status per input race, in
+    order (see _ingest_chunk). Written races are recorded in index when one is
+    passed.
+    """
+    client = get_supabase()
+    statuses: List[Dict] = []
+    for offset in range(0, len(races), chunk_size):
+        chunk = races[offset:offset + chunk_size]
+        try:
+            statuses.extend(_ingest_chunk(client, chunk, index))
+        except Exception as e:
+            print(f"Error upserting {len(chunk)} races: {e}")
+            statuses.extend(
+                {'ok': False, 'race_id': None, 'result': 'error', 'error': str(e)}
+                for _ in chunk
+            )
+    return statuses
+
+
+def upsert_race_data(race_data: Dict) -> bool:
+    """Upsert race and runner data to Supabase. Returns True on success."""
+    return upsert_races_bulk([race_data])[0]['ok']
+
+
+def write_changed_races(
+    races: List[Dict], fingerprints: FingerprintStore, prune: bool = True
+) -> Dict[str, int]:
+    """Upsert only races whose card changed since the last successful write."""
+    races_to_write, counts = fingerprints.diff(races, prune=prune)
+    # Cards queued by an earlier run for races that have since started would
+    # write old prices over newer ones, so only this run's cards are sent for those.
+    now = datetime.now(timezone.utc)
+    expired = WRITE_JOURNAL.expire(
+        'ingest', lambda race: (_parse_utc(race.get('race_time')) or now) < now
+    )
+    if expired:
+        print(f"Write journal: dropped {expired} race writes for races that have started")
+    resumed = WRITE_JOURNAL.counts().get('ingest', {}).get('pending', 0)
+    if resumed:
+        print(f"Write journal: resuming {resumed} race writes from an earlier run")
+    WRITE_JOURNAL.append('ingest', ((race_key(race), race) for race in races_to_write))
+    print(f"\n--- Upserting {len(races_to_write)} of {len(races)} races to Supabase ---")
+
+    client = get_supabase()
+
+    def send(chunk: List[Dict]) -> List[Optional[str]]:
+        statuses = _ingest_chunk(client, chunk)
+        FEED_SNAPSHOTS.mark_dirty(status['race_id'] for status in statuses if status['ok'])
+        return [None if status['ok'] else status['error'] for status in statuses]
+
+    written, failed = WRITE_JOURNAL.drain(
+        'ingest',
+        send,
+        INGEST_CHUNK_SIZE,
+        on_written=fingerprints.record,
+        pool=get_writer(),
+    )
+    fingerprints.save()
+    counts["written"] = written
+    counts["failed"] = failed
+    return counts
+
+
+def _settlement_outcome(results: List[Dict]) -> Tuple[str, Optional[bool]]:
+    """Race status and top_2_in_top_2 flag for a set of results."""
+    # Top 2 by SP (lowest odds) - MUST be strictly positive (exclude $0.00 SPs)
+    sorted_by_sp = sorted(
+        [r for r in results if r['starting_price'] is not None and r['starting_price'] > 0],
+        key=lambda x: x['starting_price'],
+    )
+    if len(sorted_by_sp) < 2:
+        # Results without valid SPs (e.g. all $0) are still marked so the race
+        # doesn't stay 'upcoming', but top_2_in_top_2 stays null.
+        return 'Resulted - No SPs', None
+    top_2_favorites = {sorted_by_sp[0]['box_number'], sorted_by_sp[1]['box_number']}
+    sorted_by_position = sorted(results, key=lambda x: x['finishing_position'])
+    top_2_finishers = {sorted_by_position[0]['box_number'], sorted_by_position[1]['box_number']}
+    return 'resulted', top_2_favorites == top_2_finishers
+
+
+def _select_settlement_race(race_results: Dict, candidates: List[Dict]) -> Optional[int]:
+    """Pick the stored race a scraped result belongs to, without further queries.
+
+    Preference: exact meeting_url, then a meeting_url sharing the form-guide
+    meeting id, then name/number. Among several candidates (e.g. today's Taree
+    R1 vs last week's) the one on the result's date, then the one whose field
+    contains the result's runners, wins; otherwise the most recent.
+    """
+    target_url = race_results.get('meeting_url')
+    pool = []
+    if target_url:
+        pool = [c for c in candidates if c.get('meeting_url') == target_url]
+        if not pool:
+            match = re.search(r'/(\d+)/?$', target_url)
+            if match:
+                segment = f"/{match.group(1)}/"
+                pool = [c for c in candidates if segment in (c.get('meeting_url') or '')]
+    if not pool:
+        venue = normalise_name(race_results['meeting_name'])
+        pool = [c for c in candidates if normalise_name(c['meeting_name']) == venue]
+    if not pool:
+        return None
+    if len(pool) == 1:
+        return pool[0]['id']
+
+    if race_results.get('race_date'):
+        on_date = [c for c in pool if race_date(c['race_time']) == race_results['race_date']]
+        if len(on_date) == 1:
+            return on_date[0]['id']
+        pool = on_date or pool
+
+    result_names = {normalise_name(r['dog_name']) for r in race_results['results'] if r['dog_name']}
+    for candidate in pool:
+        field = {normalise_name(r['dog_name']) for r in candidate['runners'] or []}
+        if field & result_names:
+            return candidate['id']
+
+    print(f"    Warning: Could not confirm race ID via runner match. Defaulting to most recent: {pool[0]['id']}", flush=True)
+    return pool[0]['id']
+
+
+def _match_result_runners(race_results: Dict, runners: List[Dict], race_id: int) -> List[Dict]:
+    """Map scraped results onto stored runner ids by normalised name and box."""
+    by_name_and_box = {(normalise_name(r['dog_name']), r['box_number']): r['id'] for r in runners}
+    by_name: Dict[str, List[int]] = {}
+    for runner in runners:
+        by_name.setdefault(normalise_name(runner['dog_name']), []).append(runner['id'])
+
+    updates = []
+    for result in race_results['results']:
+        name = normalise_name(result['dog_name'])
+        runner_id = by_name_and_box.get((name, result['box_number']))
+        if runner_id is None and len(by_name.get(name, [])) == 1:
+            # Reserves can run from a different box than the field listed.
+            runner_id = by_name[name][0]
+        if runner_id is None:
+            print(f"    Runner match failed: {result['dog_name']} (Box {result['box_number']}) on race {race_id}", flush=True)
+            continue
+        updates.append({
+            'id': runner_id,
+            'starting_price': result['starting_price'],
+            'finishing_position': result['finishing_position'],
+        })
+    return updates
+
+
+def _load_settlement_candidates(client, all_results: List[Dict]) -> RaceIndex:
+    """Index the races a batch of results could belong to (two ranged selects)."""
+    index = RaceIndex()
+    columns = 'id, meeting_name, meeting_url, race_number, race_time'
+    race_numbers = sorted({r['race_number'] for r in all_results})
+    urls = sorted({r['meeting_url'] for r in all_results if r.get('meeting_url')})
+    if urls:
+        response = client.table('races').select(columns).in_('meeting_url', urls).in_('race_number', race_numbers).execute()
+        for row in response.data or []:
+            index.add(row)
+    # Name/number candidates also cover the meeting-id URL fallback, since
+    # a meeting's races share its meeting_name. They are always bounded by
+    # date (results without one, e.g. from parse_result_table, are assumed
+    # recent) and streamed, so no page cap can drop a candidate race. Their
+    # runners are loaded separately in settle_race_results.
+    names = sorted({r['meeting_name'] for r in all_results})
+    recent = (datetime.now(AEST) - timedelta(days=SETTLEMENT_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+    earliest = datetime.strptime(min(r.get('race_date') or recent for r in all_results), '%Y-%m-%d')
+    since = (earliest - timedelta(days=1)).strftime('%Y-%m-%d')
+    pages = stream_pages(
+        client,
+        'races',
+        columns,
+        key=('race_time', 'id'),
+        where=lambda query: query.in_('meeting_name', names).in_('race_number', race_numbers).gte('race_time', since),
+    )
+    for page in pages:
+        for row in page:
+            index.add(row)
+    return index
+
+
+def settle_race_results(
+    all_results: List[Dict],
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    index: Optional[RaceIndex] = None,
+) -> int:
+    """Write results (SP, finishing positions, top_2_in_top_2, status) for many races.
+
+    Races and runners are matched in memory, against the run's RaceIndex when
+    one is passed (only runners it doesn't know are fetched), otherwise
+    against candidates fetched once for the whole batch. The writes go through
+    the settle_races RPC, one request per chunk. Returns the number of races
+    settled.
+    """
+    if not all_results:
+        return 0
+    client = get_supabase()
     try:
+        if index is None:
+            index = _load_settlement_candidates(client, all_results)
+        candidates = [
+            index.candidates(r['meeting_name'], r['race_number'], r.get('meeting_url'))
+            for r in all_results
+        ]
+        missing = index.missing_runners({entry['id'] for group in candidates for entry in group})
+        if missing:
+            runners_by_race: Dict[int, List[Dict]] = {race_id: [] for race_id in missing}
+            # Streamed in chunks of ids, so no page cap can leave a race looking runnerless.
+            for offset in range(0, len(missing), SETTLEMENT_RUNNER_CHUNK_SIZE):
+                chunk = missing[offset:offset + SETTLEMENT_RUNNER_CHUNK_SIZE]
+                pages = stream_pages(
+                    client,
+                    'runners',
+                    'id, race_id, dog_name, box_number',
+                    where=lambda query, chunk=chunk: query.in_('race_id', chunk),
+                )
+                for page in pages:
+                    for runner in page:
+                        runners_by_race[runner['race_id']].append(runner)
+            for race_id, runners in runners_by_race.items():
+                index.set_runners(race_id, runners)
+    except Exception as e:
+        print(f"Error loading races for results: {e}")
+        return 0
+
+    payload: List[Dict] = []
+    for race_results, race_candidates in zip(all_results, candidates):
         meeting_name = race_results['meeting_name']
         race_number = race_results['race_number']
-        results = race_results['results']
-        
-        # Find the race in database
-        # There might be multiple races with same meeting_name/number (different dates)
-        # Fix: Select race_time for validation logic
-        client = get_supabase()
-        target_url = race_results.get('meeting_url')
-        
-        # CASE 1: EXACT MATCH BY URL (Preferred/Robust)
-        valid_candidates = []
-        if target_url:
-            race_response = client.table('races').select('id, race_time, status').eq('meeting_url', target_url).eq('race_number', race_number).execute()
-            if race_response.data:
-                valid_candidates = race_response.data
-            else:
-                match = re.search(r'/(\d+)/?$', target_url)
-                if match:
-                    race_id_segment = match.group(1)
-                    race_response = client.table('races').select('id, race_time, status').ilike('meeting_url', f'%/{race_id_segment}/%').eq('race_number', race_number).execute()
-                    valid_candidates = race_response.data
-
-        # CASE 2: FALLBACK TO DATE/NAME (Legacy/Manual)
-        if not valid_candidates:
-            race_response = client.table('races').select('id, race_time').eq('meeting_name', meeting_name).eq('race_number', race_number).order('race_time', desc=True).execute()
-            valid_candidates = race_response.data or []
-        
-        if not valid_candidates:
-             print(f"Race not found in DB: {meeting_name} R{race_number} (URL: {target_url})")
-             return
+        race_id = _select_settlement_race(race_results, race_candidates)
+        if race_id is None:
+            print(f"Race not found in DB: {meeting_name} R{race_number} (URL: {race_results.get('meeting_url')})")
+            continue
+        status, top_2_in_top_2 = _settlement_outcome(race_results['results'])
+        payload.append({
+            'race_id': race_id,
+            'status': status,
+            'top_2_in_top_2': top_2_in_top_2,
+            'runners': _match_result_runners(race_results, index.entries[race_id]['runners'], race_id),
+            # Only used for logging; settle_races ignores unknown keys.
+            'label': f"{meeting_name} R{race_number}",
+        })
 
-        candidates = valid_candidates
-        race_id = None
-        
-        # If only one, use it
-        if len(candidates) == 1:
-            race_id = candidates[0]['id']
-        else:
-            # Multiple candidates (e.g. today's Taree R1 vs last week's Taree R1)
-            # Find the one that actually contains our runners
-            # We check the first valid runner from our results against the candidate race
-            test_runner = next((r for r in results if r['dog_name']), None)
-            
-            if test_runner:
-                for cand in candidates:
-                    cid = cand['id']
-                    # Check if test dog exists in this race
-                    check = client.table('runners').select('id').eq('race_id', cid).ilike('dog_name', test_runner['dog_name']).execute()
-                    if check.data:
-                        race_id = cid
-                        # print(f"    Matched race ID {race_id} for {meeting_name} R{race_number} using dog {test_runner['dog_name']}", flush=True)
-                        break
-            
-            # Fallback: if no match found (maybe all scratched?), just use the most recent one (index 0 due to sort)
-            if not race_id:
-                race_id = candidates[0]['id']
-                print(f"    Warning: Could not confirm race ID via runner match. Defaulting to most recent: {race_id}", flush=True)
-        
-        # Update each runner with SP and finishing position
-        # Update each runner with SP and finishing position
-        for result in results:
-            # Find runner by race_id, dog_name, and box_number
-            # Use ilike for case-insensitive matching (Results often UPPERCASE, Fields often Title Case)
-            runner_response = client.table('runners').select('id').eq('race_id', race_id).ilike('dog_name', result['dog_name']).eq('box_number', result['box_number']).execute()
-            
-            if runner_response.data:
-                runner_id = runner_response.data[0]['id']
-                # print(f"    Updating runner {result['dog_name']}...", flush=True)
-                client.table('runners').update({
-                    'starting_price': result['starting_price'],
-                    'finishing_position': result['finishing_position']
-                }).eq('id', runner_id).execute()
-            else:
-                print(f"    Runner match failed: {result['dog_name']} (Box {result['box_number']}) on race {race_id}", flush=True)
-        
-        # Calculate "Top 2 in Top 2?"
-        # Get top 2 by SP (lowest odds) - MUST be strictly positive (exclude $0.00 SPs)
-        sorted_by_sp = sorted([r for r in results if r['starting_price'] is not None and r['starting_price'] > 0], key=lambda x: x['starting_price'])
-        if len(sorted_by_sp) >= 2:
-            top_2_favorites = {sorted_by_sp[0]['box_number'], sorted_by_sp[1]['box_number']}
-            
-            # Get top 2 finishers
-            sorted_by_position = sorted(results, key=lambda x: x['finishing_position'])
-            if len(sorted_by_position) >= 2:
-                top_2_finishers = {sorted_by_position[0]['box_number'], sorted_by_position[1]['box_number']}
-                
-                # Check if they match
-                top_2_in_top_2 = top_2_favorites == top_2_finishers
-                
-                # Update race with Top 2 in Top 2 and status
-                client.table('races').update({
-                    'top_2_in_top_2': top_2_in_top_2,
-                    'status': 'resulted'
-                }).eq('id', race_id).execute()
-                
-                print(f"Updated results: {meeting_name} R{race_number} - Top 2 in Top 2: {top_2_in_top_2}")
-        else:
-            # Handle case where we have results but valid SPs are missing (e.g. all $0)
-            # We still mark as resulted so it doesn't stay 'upcoming', but top_2_in_top_2 remains null
-            # This ensures it doesn't skew stats but shows we attempted to result it
-            # User Request: "Resulted - No SPs" specific status
-            client.table('races').update({
-                'status': 'Resulted - No SPs'
-            }).eq('id', race_id).execute()
-            print(f"Updated results: {meeting_name} R{race_number} - Resulted - No SPs (skipped Top 2 calc)")
-        
+    WRITE_JOURNAL.append('settle', ((str(race['race_id']), race) for race in payload))
+    settled_ids: List[int] = []
+    settled, _ = WRITE_JOURNAL.drain(
+        'settle', lambda chunk: _settle_chunk(client, chunk), chunk_size,
+        on_written=lambda race: settled_ids.append(race['race_id']), pool=get_writer(),
+    )
+    FEED_SNAPSHOTS.mark_dirty(settled_ids)
+
+    # Strategy stats are derived from the settled rows, so they are refreshed
+    # afterwards; journaled too, so a failed refresh is retried next run.
+    # Sequential: batches for the same day re-sum the same strategy_stats rows.
+    WRITE_JOURNAL.append('stats', ((str(race_id), {'race_id': race_id}) for race_id in settled_ids))
+    WRITE_JOURNAL.drain(
+        'stats', lambda chunk: refresh_race_stats(client, [race['race_id'] for race in chunk]),
+        STATS_CHUNK_SIZE,
+    )
+    if HISTORY_ARCHIVE_DIR and history_archive.available():
+        # Sequential: batches for the same day rewrite the same file.
+        WRITE_JOURNAL.append('archive', ((str(race_id), {'race_id': race_id}) for race_id in settled_ids))
+        WRITE_JOURNAL.drain(
+            'archive',
+            lambda chunk: history_archive.archive_race_ids(
+                client, HISTORY_ARCHIVE_DIR, [race['race_id'] for race in chunk]
+            ),
+            history_archive.CHUNK_SIZE,
+        )
+    return settled
+
+
+def publish_feed_snapshots() -> None:
+    """Refresh the static upcoming feed and publish newly settled history days.
+
+    Snapshots are an optimisation for the frontend (which falls back to
+    querying Supabase), so failures are reported, not raised.
+    """
+    client = get_supabase()
+    try:
+        FEED_SNAPSHOTS.refresh_upcoming(client)
+        FEED_SNAPSHOTS.publish_history(client)
+    except Exception as error:
+        print(f"Feed snapshot publish failed: {error}")
+
+
+def _settle_chunk(client, chunk: List[Dict]) -> List[Optional[str]]:
+    """Send one chunk through the settle_races RPC; raises if the request fails."""
+    try:
+        client.rpc('settle_races', {'payload': chunk}).execute()
     except Exception as e:
-        print(f"Error updating race results: {e}")
+        print(f"Error updating race results for {len(chunk)} races: {e}")
+        raise
+    for race in chunk:
+        if race['status'] == 'resulted':
+            print(f"Updated results: {race['label']} - Top 2 in Top 2: {race['top_2_in_top_2']}")
+        else:
+            print(f"Updated results: {race['label']} - Resulted - No SPs (skipped Top 2 calc)")
+    return [None] * len(chunk)
+
+
+def update_race_results(race_results: Dict):
+    """Update race with results data (SP, finishing positions, top_2_in_top_2)"""
+    settle_race_results([race_results])
 
 
 def main():
@@ -1229,11 +1560,9 @@ def main():
             "No races were scraped. The source may still be showing a Cloudflare challenge."
         )
     
-    print(f"\n--- Upserting {len(all_races)} races to Supabase ---")
-    
-    # Upsert to Supabase
-    for race in all_races:
-        upsert_race_data(race)
+    fingerprints = FingerprintStore(os.path.join(INGEST_STATE_DIR, "race_fingerprints.json"))
+    diff_counts = write_changed_races(all_races, fingerprints)
+    publish_feed_snapshots()
 
     micro_fields = [r for r in all_races if r['active_runner_count'] in [4, 5]]
     priced_races = sum(
@@ -1242,9 +1571,23 @@ def main():
     )
     print("\n" + "=" * 60)
     print("Ingestion complete!")
-    print(f"Total upcoming races stored: {len(all_races)}")
+    print(f"Total upcoming races in feed: {len(all_races)}")
+    print(
+        f"Race cards: {diff_counts['unchanged']} unchanged, {diff_counts['changed']} changed, "
+        f"{diff_counts['new']} new, {diff_counts['removed']} removed, "
+        f"{diff_counts['refreshed']} refreshed"
+    )
+    print(f"Races written: {diff_counts['written']} ({diff_counts['failed']} failed)")
     print(f"Micro-fields (4-5 runners): {len(micro_fields)}")
     print(f"Races with Sportsbet prices: {priced_races}")
+    PROVIDER_HTTP.print_summary()
+    RESPONSE_CACHE.print_summary()
+    RESPONSE_CACHE.prune(max_age=2 * 24 * 3600)
+    WRITE_JOURNAL.print_summary()
+    get_writer().print_summary()
+    FEED_SNAPSHOTS.print_summary()
+    SUPABASE_METRICS.print_summary()
+    SUPABASE_METRICS.save()
     print("=" * 60)
     return
     
@@ -1291,8 +1634,7 @@ def main():
         
         # Update database with results
         print(f"\n--- Updating {len(all_results)} races with results ---")
-        for race_result in all_results:
-            update_race_results(race_result)
+        settle_race_results(all_results)
             
     except Exception as e:
         print(f"Error fetching/updating historical results: {e}")
@@ -1310,4 +1652,11 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if "--daemon" in sys.argv[1:]:
+        # ingest_scheduler imports scraper; point it at this module rather than
+        # running the file a second time with its own clients and state.
+        sys.modules.setdefault("scraper", sys.modules[__name__])
+        from ingest_scheduler import run_daemon
+        run_daemon()
+    else:
+        main()
@@ -0,0 +1,238 @@
+"""
+Precomputed strategy statistics for the frontend's Stats views.
+
+The Stats and 6 Runners Stats tabs used to download every race in the date
+range with all of its runners and work out favourite strike rates, box
+records and pattern hit rates in the browser. This module computes each
+settled race's contribution once, in Python, using the same rules as
+index.html, and stores it through the store_race_strategy_stats RPC (see
+add_strategy_stats.sql), which keeps per-day summary rows in strategy_stats.
+
+The scraper refreshes races as it settles them; run this file directly to
+(re)build the tables from history:
+
+    python strategy_stats.py            # every settled race
+    python strategy_stats.py --days 30  # races from the last 30 days
+"""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from race_index import race_date
+from table_stream import stream_pages
+
+# Field sizes the Stats tab reports on; other races are ignored there.
+FIELD_SIZES = (4, 5, 6, 7, 8)
+SHORT_PRICE = 2.00
+
+RACE_COLUMNS = (
+    'id, meeting_name, race_time, distance_meters, status, active_runner_count, top_2_in_top_2, '
+    'runners(id, box_number, sportsbet_odds, is_scratched, starting_price, finishing_position)'
+)
+CHUNK_SIZE = 100
+
+METRICS = ('races', 'bets', 'wins', 'profit', 'top_2_in_top_2', 'top3_in_top3', 'top3_in_top4', 'top4_in_top4')
+
+
+def _is_resulted(race: Dict) -> bool:
+    return race.get('status') == 'resulted' or race.get('top_2_in_top_2') is not None
+
+
+def _position(runner: Dict) -> int:
+    position = runner.get('finishing_position')
+    return position if isinstance(position, int) else 99
+
+
+def _priced(race: Dict, odds: str) -> List[Dict]:
+    """Unscratched runners with a positive price in the odds column, shortest first."""
+    runners = [r for r in race.get('runners') or [] if not r.get('is_scratched') and (r.get(odds) or 0) > 0]
+    return sorted(runners, key=lambda r: r[odds])
+
+
+def is_blue_opportunity(race: Dict) -> bool:
+    """isRaceBlueOpp from index.html, for a resulted race (prices are SPs)."""
+    count = race.get('active_runner_count') or 0
+    if count < 5 or count > 8:
+        return False
+    runners = _priced(race, 'starting_price')
+    if len(runners) < 2:
+        return False
+    odds1, odds2 = runners[0]['starting_price'], runners[1]['starting_price']
+    rest = runners[2:]
+    box7 = next((r for r in runners if r.get('box_number') == 7), None)
+    if box7 is not None and box7['starting_price'] <= 4.0:
+        return False
+    if odds1 < 2.00 and count <= 5 and (race.get('distance_meters') or 0) > 350:
+        return True
+    if runners[0].get('box_number') == 1 and odds1 < 2.50 and odds2 < 3.50:
+        return True
+    if odds1 < 3.00 and odds2 < 3.00 and all(r['starting_price'] >= 8.00 for r in rest):
+        return True
+    if odds1 <= 1.60 and odds2 < 5.00 and all(r['starting_price'] >= 10.00 for r in rest):
+        return True
+    return False
+
+
+def passes_smart_filter(race: Dict) -> bool:
+    """The Stats tab's Smart Filter (value races), as in renderStats."""
+    runners = _priced(race, 'sportsbet_odds')
+    if len(runners) < 2:
+        return False
+    fav1, fav2 = runners[0], runners[1]
+    if fav1['sportsbet_odds'] >= 2.00:
+        return False
+    if (race.get('active_runner_count') or 0) > 6 and not is_blue_opportunity(race):
+        return False
+    if (race.get('distance_meters') or 0) < 350:
+        return False
+    return fav1.get('box_number') not in (5, 7) and fav2.get('box_number') not in (5, 7)
+
+
+def _pattern_rows(race: Dict) -> Dict[str, Dict]:
+    """6-runner pattern outcomes, as in renderSixRunnersStats."""
+    if race.get('active_runner_count') != 6 or race.get('top_2_in_top_2') is None:
+        return {}
+    runners = _priced(race, 'starting_price')
+    active = [r for r in race.get('runners') or [] if not r.get('is_scratched')]
+
+    def within(dogs: Iterable[Dict], place: int) -> int:
+        return int(all(_position(d) <= place for d in dogs))
+
+    patterns: Dict[str, Dict] = {}
+    if len(active) == 6 and len(runners) == 6:
+        if runners[4]['starting_price'] >= 20 and runners[5]['starting_price'] >= 20 \
+                and all(r['starting_price'] < 14 for r in runners[:4]):
+            patterns['long_tail'] = {
+                'top4_in_top4': within(runners[:4], 4),
+                'top3_in_top3': within(runners[:3], 3),
+                'top3_in_top4': within(runners[:3], 4),
+            }
+        shorts = [r for r in runners if r['starting_price'] < 10]
+        if len(shorts) == 3 and sum(r['starting_price'] >= 12 for r in runners) == 3:
+            patterns['three_short'] = {
+                'top3_in_top3': within(shorts, 3),
+                'top3_in_top4': within(shorts, 4),
+            }
+    if len(runners) >= 5:
+        if runners[3]['starting_price'] / runners[2]['starting_price'] >= 3:
+            patterns['ml_top3_srm'] = {
+                'top3_in_top3': within(runners[:3], 3),
+                'top3_in_top4': within(runners[:3], 4),
+            }
+        if runners[4]['starting_price'] / runners[3]['starting_price'] >= 3:
+            patterns['ml_top4_srm'] = {
+                'top4_in_top4': within(runners[:4], 4),
+                'top3_in_top4': within(runners[:3], 4),
+            }
+    return patterns
+
+
+def race_stat_rows(race: Dict) -> List[Dict]:
+    """A settled race's rows for race_strategy_stats (empty if it isn't settled).
+
+    race needs the RACE_COLUMNS fields, runners included.
+    """
+    day = race_date(race.get('race_time'))
+    if not _is_resulted(race) or day is None:
+        return []
+    base = {
+        'race_id': race['id'],
+        'race_date': day,
+        'meeting_name': race['meeting_name'],
+        'distance_meters': race.get('distance_meters') or 0,
+        'active_runner_count': race['active_runner_count'],
+        'smart': passes_smart_filter(race),
+    }
+    rows: List[Dict] = []
+
+    def add(strategy: str, box_number: int = 0, **metrics) -> None:
+        row = dict(base, strategy=strategy, box_number=box_number)
+        row.update({metric: 0 for metric in METRICS})
+        row.update(metrics)
+        row['profit'] = round(row['profit'], 2)
+        rows.append(row)
+
+    runners = _priced(race, 'starting_price')
+    if race['active_runner_count'] in FIELD_SIZES and runners:
+        # Joint favourites are each backed for $1.
+        favourite_price = runners[0]['starting_price']
+        favourites = [r for r in runners if r['starting_price'] == favourite_price]
+        short = favourite_price < SHORT_PRICE
+        strategies = ('favourite', 'short_favourite') if short else ('favourite',)
+        profits = [
+            r['starting_price'] - 1 if r.get('finishing_position') == 1 else -1
+            for r in favourites
+        ]
+        for strategy in strategies:
+            add(
+                strategy,
+                races=1,
+                bets=len(favourites),
+                wins=int(any(r.get('finishing_position') == 1 for r in favourites)),
+                profit=sum(profits),
+                top_2_in_top_2=int(race.get('top_2_in_top_2') is True),
+            )
+            by_box: Dict[int, Dict] = {}
+            for runner, profit in zip(favourites, profits):
+                box = by_box.setdefault(runner['box_number'], {'bets': 0, 'wins': 0, 'profit': 0.0})
+                box['bets'] += 1
+                box['wins'] += int(runner.get('finishing_position') == 1)
+                box['profit'] += profit
+            for box_number, metrics in by_box.items():
+                add(f"{strategy}_box", box_number, **metrics)
+
+    for strategy, hits in _pattern_rows(race).items():
+        add(strategy, races=1, **hits)
+    return rows
+
+
+def store_race_stats(client, races: List[Dict]) -> int:
+    """Replace the stat rows of these races (RACE_COLUMNS rows) in one RPC call."""
+    rows = [row for race in races for row in race_stat_rows(race)]
+    client.rpc('store_race_strategy_stats', {
+        'race_ids': [race['id'] for race in races],
+        'stat_rows': rows,
+    }).execute()
+    return len(rows)
+
+
+def refresh_race_stats(client, race_ids: List[int]) -> List[Optional[str]]:
+    """Recompute the stats of races by id; raises if a request fails.
+
+    Returns one error (or None) per id, matching WriteJournal.drain's send().
+    """
+    response = client.table('races').select(RACE_COLUMNS).in_('id', race_ids).execute()
+    store_race_stats(client, response.data or [])
+    return [None] * len(race_ids)
+
+
+def rebuild(client, since: Optional[str] = None, page_size: int = CHUNK_SIZE,
+            progress: Callable[[str], None] = print) -> int:
+    """Recompute the stats of every settled race (from a date, if given)."""
+    def settled(query):
+        query = query.or_('status.eq.resulted,top_2_in_top_2.not.is.null')
+        return query.gte('race_time', since) if since else query
+
+    races = 0
+    for page in stream_pages(client, 'races', RACE_COLUMNS, where=settled, page_size=page_size):
+        store_race_stats(client, page)
+        races += len(page)
+        progress(f"  {races} races processed...")
+    return races
+
+
+def main() -> None:
+    from scraper import get_supabase
+
+    since = None
+    if '--days' in sys.argv:
+        days = int(sys.argv[sys.argv.index('--days') + 1])
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d')
+    print(f"Rebuilding strategy stats for races since {since or 'the beginning'}...")
+    races = rebuild(get_supabase(), since)
+    print(f"Done. {races} settled races summarised.")
+
+
+if __name__ == '__main__':
+    main()
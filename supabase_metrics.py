@@ -0,0 +1,196 @@
+"""
+Request accounting for the Supabase client.
+
+instrument(client) hooks the httpx sessions behind a supabase-py client
+(PostgREST and Storage) and records, for every request, the bytes sent and
+received on the wire, the latency, the number of rows PostgREST reports and
+which code issued it. Requests are grouped by caller, resource (table, RPC or
+storage bucket) and query shape: the method plus the query parameters with
+their values reduced to operators, so `race_time=gte.2026-03-18` and
+`race_time=gte.2026-03-19` count as the same query.
+
+Each run writes its totals to <directory>/supabase-<UTC time>-<script>.json;
+check_egress_usage.py reads those files to report measured egress and
+project it over a month. Traffic from the browser is not captured here.
+"""
+
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+# Frames in these files are skipped when looking for the calling code, so
+# the caller is the scraper function, not the helper that sent the request.
+_HELPER_FILES = {'supabase_metrics.py', 'supabase_writer.py', 'table_stream.py', 'write_journal.py'}
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+_CONTENT_RANGE = re.compile(r'^(\d+)-(\d+)/')
+# Metrics files older than this are removed when a run saves its own.
+KEEP_DAYS = 35
+
+
+def _resource(path: str) -> str:
+    """'races', 'rpc/ingest_races' or 'storage/feeds' from a request path."""
+    parts = [part for part in path.split('/') if part]
+    if parts[:2] == ['rest', 'v1']:
+        return '/'.join(parts[2:4]) if parts[2:3] == ['rpc'] else '/'.join(parts[2:3])
+    if parts[:2] == ['storage', 'v1']:
+        rest = parts[2:]
+        if rest[:1] == ['object'] and rest[1:2] == ['public']:
+            rest = rest[1:]
+        return 'storage/' + (rest[1] if len(rest) > 1 else '')
+    return path
+
+
+def query_shape(method: str, query: str) -> str:
+    """Method and query parameters with filter values reduced to operators."""
+    params = []
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key == 'select':
+            params.append('select=' + re.sub(r'\s+', '', value))
+        elif key in ('limit', 'offset', 'order', 'on_conflict', 'columns'):
+            params.append(key)
+        else:
+            operator = value.split('.', 2)
+            params.append(f"{key}={'.'.join(operator[:2]) if operator[0] == 'not' else operator[0]}")
+    return method + (' ?' + '&'.join(sorted(set(params))) if params else '')
+
+
+def _caller() -> str:
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if os.path.dirname(os.path.abspath(filename)) == _REPO_DIR \
+                and os.path.basename(filename) not in _HELPER_FILES:
+            module = os.path.splitext(os.path.basename(filename))[0]
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+def _rows(content_range: Optional[str]) -> int:
+    match = _CONTENT_RANGE.match(content_range or '')
+    return int(match.group(2)) - int(match.group(1)) + 1 if match else 0
+
+
+class SupabaseMetrics:
+    """Per-run request totals, keyed by (caller, resource, shape)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.started_at = datetime.now(timezone.utc)
+        self._totals: Dict[Tuple[str, str, str], Dict] = {}
+        self._lock = threading.Lock()
+        self._saved_path: Optional[str] = None
+        self._registered = False
+
+    def instrument(self, client):
+        """Record every request the client's PostgREST and Storage sessions send."""
+        for name in ('postgrest', 'storage'):
+            try:
+                session = getattr(client, name).session
+            except Exception:
+                continue
+            hooks = session.event_hooks
+            hooks['request'] = hooks.get('request', []) + [self._on_request]
+            hooks['response'] = hooks.get('response', []) + [self._on_response]
+            session.event_hooks = hooks
+        if not self._registered:
+            atexit.register(self.save)
+            self._registered = True
+        return client
+
+    def _on_request(self, request) -> None:
+        request.extensions = dict(request.extensions, metrics_caller=_caller(), metrics_start=time.perf_counter())
+
+    def _on_response(self, response) -> None:
+        response.read()
+        request = response.request
+        started = request.extensions.get('metrics_start', time.perf_counter())
+        headers = sum(len(key) + len(value) + 4 for key, value in request.headers.raw)
+        # Streamed bodies (storage uploads) can't be read back; their length
+        # is in the headers.
+        body = int(request.headers.get('content-length') or 0)
+        self.record(
+            request.extensions.get('metrics_caller', 'unknown'),
+            _resource(request.url.path),
+            query_shape(request.method, request.url.query.decode('ascii', 'replace')),
+            request_bytes=headers + body,
+            response_bytes=response.num_bytes_downloaded,
+            rows=_rows(response.headers.get('content-range')),
+            ms=(time.perf_counter() - started) * 1000,
+            error=response.status_code >= 400,
+        )
+
+    def record(self, caller: str, resource: str, shape: str, request_bytes: int, response_bytes: int,
+               rows: int, ms: float, error: bool = False) -> None:
+        with self._lock:
+            totals = self._totals.setdefault((caller, resource, shape), {
+                'requests': 0, 'errors': 0, 'request_bytes': 0, 'response_bytes': 0,
+                'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            })
+            totals['requests'] += 1
+            totals['errors'] += int(error)
+            totals['request_bytes'] += request_bytes
+            totals['response_bytes'] += response_bytes
+            totals['rows'] += rows
+            totals['total_ms'] += ms
+            totals['max_ms'] = max(totals['max_ms'], ms)
+
+    def entries(self):
+        with self._lock:
+            return [
+                dict(caller=caller, resource=resource, shape=shape, **totals)
+                for (caller, resource, shape), totals in sorted(self._totals.items())
+            ]
+
+    def save(self) -> Optional[str]:
+        """Write this run's totals (rewriting the same file on later calls)."""
+        entries = self.entries()
+        if not entries:
+            return None
+        if self._saved_path is None:
+            script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+            stamp = self.started_at.strftime('%Y%m%dT%H%M%SZ')
+            self._saved_path = os.path.join(self.directory, f"supabase-{stamp}-{script}.json")
+            self._prune()
+        report = {
+            'script': os.path.basename(sys.argv[0] or 'python'),
+            'args': sys.argv[1:],
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'entries': entries,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._saved_path + '.tmp', 'w') as handle:
+            json.dump(report, handle, indent=1)
+        os.replace(self._saved_path + '.tmp', self._saved_path)
+        return self._saved_path
+
+    def _prune(self) -> None:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=KEEP_DAYS)).strftime('%Y%m%dT%H%M%SZ')
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith('supabase-') and name.endswith('.json') and name[9:25] < cutoff:
+                os.remove(os.path.join(self.directory, name))
+
+    def print_summary(self) -> None:
+        entries = self.entries()
+        if not entries:
+            return
+        requests = sum(entry['requests'] for entry in entries)
+        sent = sum(entry['request_bytes'] for entry in entries)
+        received = sum(entry['response_bytes'] for entry in entries)
+        total_ms = sum(entry['total_ms'] for entry in entries)
+        print(
+            f"Supabase: {requests} requests, {sent:,} bytes sent, {received:,} bytes received, "
+            f"avg {total_ms / requests:.0f}ms"
+        )
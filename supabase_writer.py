@@ -0,0 +1,248 @@
+"""
+Parallel, rate-limited writer for Supabase.
+
+Writes are queued to a small pool of worker threads instead of being sent one
+at a time from the thread that produced them. All writers for a Supabase
+project share a token bucket, so adding workers never raises the request rate
+above the project's limit.
+
+Writes that carry a key are coalesced: if a newer write for the same key is
+queued before the older one has started, only the newer one is sent and both
+futures resolve with its result. Writes for one key never run concurrently.
+Keys are only for full-state writes (a whole race card, a whole settlement),
+where the newest write supersedes older ones.
+
+The queue is bounded. When it is full, submit() blocks, which slows the fetch
+stage down to the rate Supabase accepts writes.
+
+`writer.table('races').update({...}).eq('id', 1).execute()` mirrors the
+supabase-py builder but returns a Future instead of the response.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+DEFAULT_WORKERS = 4
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_MAX_PENDING = 64
+
+
+class TokenBucket:
+    """Blocking token bucket: rate tokens per second, up to burst at once."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_project_buckets: Dict[str, TokenBucket] = {}
+_project_buckets_lock = threading.Lock()
+
+
+def project_bucket(project_url: str, rate: float) -> TokenBucket:
+    """The shared token bucket for a Supabase project (created on first use)."""
+    with _project_buckets_lock:
+        bucket = _project_buckets.get(project_url)
+        if bucket is None:
+            bucket = _project_buckets[project_url] = TokenBucket(rate)
+        return bucket
+
+
+class _Task:
+    def __init__(self, key: Any, fn: Callable[[], Any]):
+        self.key = key
+        self.fn = fn
+        self.futures: List[Future] = [Future()]
+
+
+class _DeferredQuery:
+    """Records supabase-py builder calls and replays them on a worker."""
+
+    def __init__(self, writer: "SupabaseWriter", steps: List):
+        self._writer = writer
+        self._steps = steps
+
+    def __getattr__(self, name: str):
+        def step(*args, **kwargs):
+            return _DeferredQuery(self._writer, self._steps + [(name, args, kwargs)])
+        return step
+
+    def execute(self, key: Any = None) -> Future:
+        steps = self._steps
+
+        def run():
+            query = self._writer.client
+            for name, args, kwargs in steps:
+                query = getattr(query, name)(*args, **kwargs)
+            return query.execute()
+
+        return self._writer.submit(run, key=key)
+
+
+class SupabaseWriter:
+    """Bounded worker pool that sends Supabase writes under a shared rate limit."""
+
+    def __init__(
+        self,
+        client,
+        project_url: str,
+        workers: int = DEFAULT_WORKERS,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        self.client = client
+        self.workers = workers
+        self.max_pending = max_pending
+        self.bucket = project_bucket(project_url, requests_per_second)
+        self._cond = threading.Condition()
+        self._order: Deque[Any] = deque()
+        self._pending: Dict[Any, _Task] = {}
+        self._active: Set[Any] = set()
+        self._running = 0
+        self._closed = False
+        self._anonymous = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.started = time.monotonic()
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"supabase-writer-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, fn: Callable[[], Any], key: Any = None) -> Future:
+        """Queue fn() to run on a worker. Blocks while the queue is full."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SupabaseWriter is closed")
+            self._start_workers()
+            self.submitted += 1
+            # Re-checked after every wait: another submit may queue the same
+            # key meanwhile, and joining its task needs no free slot.
+            while not (key is not None and key in self._pending) and len(self._pending) >= self.max_pending:
+                self._cond.wait()
+            if key is not None and key in self._pending:
+                task = self._pending[key]
+                task.fn = fn
+                future: Future = Future()
+                task.futures.append(future)
+                self.coalesced += 1
+                return future
+            if key is None:
+                key = ("anonymous", next(self._anonymous))
+            task = _Task(key, fn)
+            self._pending[key] = task
+            self._order.append(key)
+            self.max_depth = max(self.max_depth, len(self._pending))
+            self._cond.notify_all()
+            return task.futures[0]
+
+    def table(self, name: str) -> _DeferredQuery:
+        return _DeferredQuery(self, [("table", (name,), {})])
+
+    def rpc(self, fn: str, params: Dict, key: Any = None) -> Future:
+        return self.submit(lambda: self.client.rpc(fn, params).execute(), key=key)
+
+    def _next_task(self) -> Optional[_Task]:
+        # Called with the condition held: the oldest task whose key is idle.
+        for key in self._order:
+            if key not in self._active:
+                self._order.remove(key)
+                return self._pending.pop(key)
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    if self._closed and not self._pending:
+                        return
+                    self._cond.wait()
+                    task = self._next_task()
+                self._active.add(task.key)
+                self._running += 1
+                self._cond.notify_all()
+
+            self.bucket.acquire()
+            try:
+                result, error = task.fn(), None
+            except Exception as exc:
+                result, error = None, exc
+
+            with self._cond:
+                self._active.discard(task.key)
+                self._running -= 1
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+            for future in task.futures:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+    @property
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending) + self._running
+
+    def join(self) -> None:
+        """Block until every queued write has finished."""
+        with self._cond:
+            while self._pending or self._running:
+                self._cond.wait()
+
+    def close(self) -> None:
+        self.join()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed,
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "writes_per_second": self.completed / elapsed,
+        }
+
+    def print_summary(self) -> None:
+        stats = self.summary()
+        print(
+            f"Supabase writer: {stats['completed']} writes ({stats['failed']} failed, "
+            f"{stats['coalesced']} coalesced); {stats['writes_per_second']:.1f}/s; "
+            f"queue depth {stats['queue_depth']} (max {stats['max_queue_depth']})"
+        )
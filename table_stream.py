@@ -0,0 +1,98 @@
+"""
+Keyset-paginated streaming reads from Supabase tables.
+
+A plain `select()` returns at most PostgREST's row cap (1000 on Supabase) and
+holds the whole result in memory. These generators instead fetch one page at
+a time, ordered by a unique key, and ask for the next page with
+`key > last seen key`, so every matching row is seen exactly once and memory
+stays constant however large the table grows.
+
+    for race in stream_rows(client, 'races', 'id, meeting_name',
+                            where=lambda q: q.eq('status', 'closed')):
+        ...
+
+Keys are either 'id' or a tuple ending in a unique column, such as
+('race_time', 'id') or ('meeting_url', 'id'). Key columns must be NOT NULL,
+so filter out NULLs in `where` when streaming by a nullable column.
+"""
+
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+PAGE_SIZE = 1000
+
+Key = Union[str, Sequence[str]]
+
+
+def _key_columns(key: Key) -> Tuple[str, ...]:
+    return (key,) if isinstance(key, str) else tuple(key)
+
+
+def _quote(value) -> str:
+    # Values inside or=() filters are double-quoted so ':' ',' '.' in
+    # timestamps and URLs are not read as filter syntax.
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _after(query, columns: Tuple[str, ...], last: Dict):
+    """Restrict query to rows whose key sorts after last."""
+    if len(columns) == 1:
+        return query.gt(columns[0], last[columns[0]])
+    # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), expanded for any length.
+    terms = []
+    for position, column in enumerate(columns):
+        equal = [f"{prior}.eq.{_quote(last[prior])}" for prior in columns[:position]]
+        greater = f"{column}.gt.{_quote(last[column])}"
+        terms.append(f"and({','.join(equal + [greater])})" if equal else greater)
+    return query.or_(",".join(terms))
+
+
+def stream_pages(
+    client,
+    table: str,
+    columns: str = "*",
+    key: Key = "id",
+    where: Optional[Callable] = None,
+    page_size: int = PAGE_SIZE,
+) -> Iterator[List[Dict]]:
+    """Yield successive pages of rows from table, in key order.
+
+    columns is a PostgREST projection (embedded resources allowed); the key
+    columns are added to it if missing. where receives each page's query
+    builder and returns it with server-side filters applied.
+    """
+    key_columns = _key_columns(key)
+    if columns.strip() != "*":
+        selected = {part.strip() for part in columns.split(",")}
+        missing = [column for column in key_columns if column not in selected]
+        if missing:
+            columns = ", ".join(missing + [columns])
+
+    last: Optional[Dict] = None
+    while True:
+        query = client.table(table).select(columns)
+        if where is not None:
+            query = where(query)
+        if last is not None:
+            query = _after(query, key_columns, last)
+        for column in key_columns:
+            query = query.order(column)
+        rows = query.limit(page_size).execute().data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+
+
+def stream_rows(
+    client,
+    table: str,
+    columns: str = "*",
+    key: Key = "id",
+    where: Optional[Callable] = None,
+    page_size: int = PAGE_SIZE,
+) -> Iterator[Dict]:
+    """Yield every matching row of table, one at a time, in key order."""
+    for page in stream_pages(client, table, columns, key, where, page_size):
+        yield from page
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN-based checks that the hot queries use the indexes meant for them.
+
+Runs against a local Postgres that has schema.sql and the add_*.sql
+migrations applied (including add_query_indexes.sql). With --seed, first fills
+an empty database with a synthetic programme large enough for the planner to
+prefer indexes over sequential scans.
+
+Usage:
+    python verify_query_plans.py postgresql://localhost/mutts --seed
+    python verify_query_plans.py            # uses $DATABASE_URL
+
+Needs psycopg2 (pip install psycopg2-binary); it is not a scraper dependency.
+"""
+
+import json
+import os
+import sys
+from typing import Iterable, List, Tuple
+
+# (description, query, acceptable index names)
+CHECKS: List[Tuple[str, str, Tuple[str, ...]]] = [
+    (
+        "ingest_races: match by provider race id",
+        "SELECT id FROM races WHERE provider_race_id = '1000123'",
+        ("idx_races_provider_race_id",),
+    ),
+    (
+        "ingest_races: natural-key fallback",
+        """
+        SELECT id FROM races
+        WHERE meeting_name = 'Venue 7' AND race_number = 5
+          AND (race_time AT TIME ZONE 'Australia/Sydney')::DATE = DATE '2026-03-18'
+          AND provider_race_id IS NULL
+        ORDER BY id DESC LIMIT 1
+        """,
+        ("idx_races_meeting_number_sydney_date",),
+    ),
+    (
+        "settle_race_results: candidates by meeting_url",
+        """
+        SELECT id, meeting_name, meeting_url, race_number, race_time FROM races
+        WHERE meeting_url = ANY (ARRAY['https://example.com/form-guides/venue-7/fields/10007/'])
+          AND race_number = ANY (ARRAY[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+        """,
+        ("idx_races_meeting_url_number",),
+    ),
+    (
+        "settle_race_results: candidates by meeting name",
+        """
+        SELECT id, meeting_name, meeting_url, race_number, race_time FROM races
+        WHERE meeting_name = ANY (ARRAY['Venue 7'])
+          AND race_number = ANY (ARRAY[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+          AND race_time >= '2026-03-17'
+        """,
+        ("races_meeting_name_race_number_race_time_key", "idx_races_meeting_number_sydney_date"),
+    ),
+    (
+        "analyze_closed_races / backfills: races by status in a window",
+        """
+        SELECT id, meeting_name, meeting_url, race_time FROM races
+        WHERE status = 'closed' AND race_time >= '2026-03-01' AND race_time < '2026-03-08'
+        """,
+        ("idx_races_status_time",),
+    ),
+    (
+        "frontend: upcoming feed by race_time range",
+        """
+        SELECT id FROM races
+        WHERE race_time >= '2026-03-18' AND race_time < '2026-03-20'
+        ORDER BY race_time DESC
+        """,
+        ("idx_races_time", "idx_races_time_count", "idx_races_date_status"),
+    ),
+    (
+        "frontend: six-runner history",
+        """
+        SELECT id FROM races
+        WHERE active_runner_count = 6 AND race_time < '2026-03-18' AND race_time >= '2026-02-16'
+          AND top_2_in_top_2 IS NOT NULL
+        ORDER BY race_time DESC
+        """,
+        ("idx_races_settled_count_time",),
+    ),
+    (
+        "frontend / settlement: embedded runners for a page of races",
+        "SELECT id, race_id, dog_name, box_number FROM runners WHERE race_id = ANY (ARRAY[101, 202, 303, 404])",
+        ("idx_runners_race_id", "runners_race_id_box_number_key", "idx_runners_position"),
+    ),
+]
+
+SEED_SQL = """
+INSERT INTO races (
+    provider_race_id, meeting_name, meeting_url, race_number, race_time,
+    status, active_runner_count, top_2_in_top_2
+)
+SELECT
+    CASE WHEN day > 30 THEN (1000000 + day * 1000 + venue * 20 + number)::TEXT END,
+    'Venue ' || venue,
+    'https://example.com/form-guides/venue-' || venue || '/fields/' || (10000 + day * 100 + venue) || '/',
+    number,
+    TIMESTAMPTZ '2026-01-01 08:00+00' + (day || ' days')::INTERVAL + (number * 18 || ' minutes')::INTERVAL,
+    CASE WHEN day > 75 THEN 'upcoming' WHEN (day * venue + number) % 17 = 0 THEN 'closed' ELSE 'resulted' END,
+    4 + (day + venue + number) % 5,
+    CASE WHEN day <= 75 AND (day * venue + number) % 17 <> 0 THEN (number % 3 = 0) END
+FROM generate_series(0, 90) AS day,
+     generate_series(1, 40) AS venue,
+     generate_series(1, 12) AS number
+-- Backfills and in-place updates mean heap order doesn't follow race_time.
+ORDER BY random();
+
+INSERT INTO runners (race_id, dog_name, box_number, is_scratched)
+SELECT id, 'Dog ' || id || '-' || box, box, FALSE
+FROM races, generate_series(1, 8) AS box;
+
+ANALYZE races;
+ANALYZE runners;
+"""
+
+
+def index_names(plan: dict) -> Iterable[str]:
+    if "Index Name" in plan:
+        yield plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from index_names(child)
+
+
+def main() -> int:
+    try:
+        import psycopg2
+    except ImportError:
+        print("psycopg2 is required: pip install psycopg2-binary")
+        return 2
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    dsn = args[0] if args else os.environ.get("DATABASE_URL")
+    if not dsn:
+        print(__doc__)
+        return 2
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    if "--seed" in sys.argv:
+        cur.execute("SELECT count(*) FROM races")
+        if cur.fetchone()[0]:
+            print("--seed needs an empty races table; skipping seed")
+        else:
+            print("Seeding synthetic races and runners...")
+            cur.execute(SEED_SQL)
+
+    failures = 0
+    for description, query, expected in CHECKS:
+        cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        used = sorted(set(index_names(plan[0]["Plan"])))
+        ok = any(name in used for name in expected)
+        failures += not ok
+        print(f"{'PASS' if ok else 'FAIL'}  {description}")
+        print(f"      uses: {', '.join(used) or 'sequential scan'}; expected: {' or '.join(expected)}")
+    conn.close()
+
+    print(f"\n{len(CHECKS) - failures}/{len(CHECKS)} queries use their intended index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
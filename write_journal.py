@@ -0,0 +1,248 @@
+"""
+Crash-safe write-ahead journal for Supabase writes.
+
+Race cards and result settlements are committed to a local SQLite file before
+they are sent, and only removed once Supabase has acknowledged them. If the
+process dies or Supabase is unreachable mid-run, the pending mutations are
+still on disk and the next run drains them first, so writes can be batched
+aggressively without losing any.
+
+Mutations are keyed by (kind, key); queuing a newer mutation for a key that
+is still pending replaces the older one instead of writing both.
+
+Mutations that would do harm if replayed late can be dropped with expire()
+(e.g. race cards for races that have already started).
+
+Only rows the server rejects count towards MAX_ATTEMPTS; a batch that fails
+at the transport level (Supabase down) stays pending as it was. Parked rows
+can be re-queued with `python write_journal.py --requeue [kind]`.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# A mutation the server keeps rejecting is parked after this many attempts so
+# one bad row cannot block the rest of the journal. Parked rows stay on disk.
+MAX_ATTEMPTS = 5
+
+
+@dataclass
+class JournalEntry:
+    seq: int
+    version: int
+    key: str
+    body: Dict
+
+
+class WriteJournal:
+    """SQLite-backed queue of pending mutations, one row per (kind, key)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS mutations (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    body TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    queued_at REAL NOT NULL,
+                    UNIQUE (kind, key)
+                )
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def append(self, kind: str, items: Iterable[Tuple[str, Dict]]) -> int:
+        """Durably queue (key, body) mutations; returns how many were queued."""
+        rows = [(kind, key, json.dumps(body), time.time()) for key, body in items]
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                """
+                INSERT INTO mutations (kind, key, body, queued_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (kind, key) DO UPDATE SET
+                    body = excluded.body,
+                    version = mutations.version + 1,
+                    attempts = 0,
+                    last_error = NULL,
+                    queued_at = excluded.queued_at
+                """,
+                rows,
+            )
+            conn.execute("COMMIT")
+        return len(rows)
+
+    def pending(self, kind: str, limit: int, max_attempts: int = MAX_ATTEMPTS) -> List[JournalEntry]:
+        """The oldest pending mutations of a kind, excluding parked ones."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT seq, version, key, body FROM mutations "
+                "WHERE kind = ? AND attempts < ? ORDER BY seq LIMIT ?",
+                (kind, max_attempts, limit),
+            ).fetchall()
+        return [JournalEntry(seq, version, key, json.loads(body)) for seq, version, key, body in rows]
+
+    def ack(self, entries: Iterable[JournalEntry]) -> None:
+        """Remove acknowledged mutations, unless a newer version was queued meanwhile."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "DELETE FROM mutations WHERE seq = ? AND version = ?",
+                [(entry.seq, entry.version) for entry in entries],
+            )
+            conn.execute("COMMIT")
+
+    def fail(self, entries: Iterable[JournalEntry], errors: Iterable[Optional[str]]) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE mutations SET attempts = attempts + 1, last_error = ? "
+                "WHERE seq = ? AND version = ?",
+                [(error, entry.seq, entry.version) for entry, error in zip(entries, errors)],
+            )
+            conn.execute("COMMIT")
+
+    def requeue(self, kind: Optional[str] = None, max_attempts: int = MAX_ATTEMPTS) -> int:
+        """Make parked mutations (of one kind, or all) pending again; returns how many."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            if kind is None:
+                cursor = conn.execute(
+                    "UPDATE mutations SET attempts = 0 WHERE attempts >= ?", (max_attempts,)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE mutations SET attempts = 0 WHERE kind = ? AND attempts >= ?", (kind, max_attempts)
+                )
+            conn.execute("COMMIT")
+        return cursor.rowcount
+
+    def expire(self, kind: str, is_stale: Callable[[Dict], bool]) -> int:
+        """Drop mutations of a kind (pending or parked) whose body is_stale; returns how many."""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT seq, body FROM mutations WHERE kind = ?", (kind,)).fetchall()
+            stale = [(seq,) for seq, body in rows if is_stale(json.loads(body))]
+            if stale:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("DELETE FROM mutations WHERE seq = ?", stale)
+                conn.execute("COMMIT")
+        return len(stale)
+
+    def counts(self, max_attempts: int = MAX_ATTEMPTS) -> Dict[str, Dict[str, int]]:
+        """{kind: {'pending': n, 'parked': n}} for every kind in the journal."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT kind, SUM(attempts < ?), SUM(attempts >= ?) FROM mutations GROUP BY kind",
+                (max_attempts, max_attempts),
+            ).fetchall()
+        return {kind: {"pending": pending, "parked": parked} for kind, pending, parked in rows}
+
+    def drain(
+        self,
+        kind: str,
+        send: Callable[[List[Dict]], List[Optional[str]]],
+        batch_size: int,
+        on_written: Optional[Callable[[Dict], None]] = None,
+        pool=None,
+    ) -> Tuple[int, int]:
+        """Send pending mutations of a kind in batches until none are left.
+
+        send() returns one error (or None for success) per body, and rejected
+        bodies count an attempt. If send() raises, the backend is probably
+        unavailable: the batch stays pending without counting an attempt and
+        draining stops until the next call. With a pool (anything with
+        submit() returning a Future, and workers), that many batches are in
+        flight at once. on_written runs on the calling thread. Returns
+        (written, failed).
+        """
+        written = failed = 0
+        seen = set()
+        parallel = pool.workers if pool is not None else 1
+        while True:
+            # Entries that failed in this drain are retried next time, not now.
+            limit = batch_size * parallel
+            entries = [entry for entry in self.pending(kind, limit + len(seen)) if entry.seq not in seen]
+            entries = entries[:limit]
+            if not entries:
+                break
+            batches = [entries[offset:offset + batch_size] for offset in range(0, len(entries), batch_size)]
+            if pool is not None:
+                futures = [pool.submit(lambda bodies=[entry.body for entry in batch]: send(bodies)) for batch in batches]
+            unavailable = False
+            for position, batch in enumerate(batches):
+                try:
+                    if pool is not None:
+                        errors = futures[position].result()
+                    else:
+                        errors = send([entry.body for entry in batch])
+                except Exception as error:
+                    print(f"Write journal [{kind}]: {len(batch)} writes left pending: {error}")
+                    failed += len(batch)
+                    unavailable = True
+                    continue
+                done = [entry for entry, error in zip(batch, errors) if error is None]
+                rejected = [(entry, error) for entry, error in zip(batch, errors) if error is not None]
+                self.ack(done)
+                if rejected:
+                    self.fail([entry for entry, _ in rejected], [error for _, error in rejected])
+                for entry in done:
+                    if on_written:
+                        on_written(entry.body)
+                seen.update(entry.seq for entry, _ in rejected)
+                written += len(done)
+                failed += len(rejected)
+            if unavailable:
+                break
+        return written, failed
+
+    def print_summary(self) -> None:
+        for kind, count in sorted(self.counts().items()):
+            print(f"Write journal [{kind}]: {count['pending']} pending, {count['parked']} parked")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def main() -> None:
+    import scraper
+
+    if '--requeue' in sys.argv:
+        at = sys.argv.index('--requeue')
+        kind = sys.argv[at + 1] if len(sys.argv) > at + 1 else None
+        requeued = scraper.WRITE_JOURNAL.requeue(kind)
+        print(f"Re-queued {requeued} parked writes{f' [{kind}]' if kind else ''}.")
+    scraper.WRITE_JOURNAL.print_summary()
+
+
+if __name__ == '__main__':
+    main()